@@ -1,9 +1,20 @@
+import argparse
+import os
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-import re
+import itertools
+import math
+import queue
+import threading
 import time
 from tkinter import font as tkfont
+from farm_core import FarmService
+import farm_io
+from farm_metrics import Metrics
+from farm_server import RemoteService
 
 class AnimatedButton(ttk.Button):
     def __init__(self, *args, **kwargs):
@@ -18,9 +29,615 @@ class AnimatedButton(ttk.Button):
     def on_leave(self, e):
         self.configure(style=self.default_bg)
 
+class NotificationCenter:
+    """Queued toast notifications animated with after() callbacks
+    
+    A small pool of toast windows is reused for every message. Identical
+    messages arriving while one is on screen or waiting are coalesced into
+    a single toast with a repeat count.
+    """
+    FADE_STEPS = 10
+    FADE_INTERVAL_MS = 20
+    
+    def __init__(self, root, colors, pool_size=3, duration_ms=3000):
+        self.root = root
+        self.colors = colors
+        self.pool_size = pool_size
+        self.duration_ms = duration_ms
+        self._idle = []
+        self._visible = []
+        self._queue = deque()
+        self._created = 0
+    
+    def show(self, message, message_type='info'):
+        """Display a message, or queue it if every toast is busy"""
+        key = (message, message_type)
+        for toast in self._visible:
+            if toast['key'] == key:
+                toast['count'] += 1
+                self._render(toast)
+                self._schedule_hide(toast)
+                return
+        for queued in self._queue:
+            if queued['key'] == key:
+                queued['count'] += 1
+                return
+        self._queue.append({'key': key, 'count': 1})
+        self._pump()
+    
+    def _pump(self):
+        while self._queue:
+            toast = self._acquire()
+            if toast is None:
+                return
+            queued = self._queue.popleft()
+            toast['key'] = queued['key']
+            toast['count'] = queued['count']
+            self._visible.append(toast)
+            self._render(toast)
+            self._place_all()
+            toast['window'].attributes('-alpha', 0)
+            toast['window'].deiconify()
+            self._fade_in(toast, 1)
+            self._schedule_hide(toast)
+    
+    def _acquire(self):
+        if self._idle:
+            return self._idle.pop()
+        if self._created >= self.pool_size:
+            return None
+        self._created += 1
+        window = tk.Toplevel(self.root)
+        window.overrideredirect(True)
+        window.withdraw()
+        label = ttk.Label(
+            window,
+            foreground='white',
+            padding=10,
+            font=('Arial', 10, 'bold'),
+            relief='solid',
+            borderwidth=1
+        )
+        label.pack()
+        return {'window': window, 'label': label, 'key': None, 'count': 0, 'fade_job': None, 'hide_job': None}
+    
+    def _render(self, toast):
+        message, message_type = toast['key']
+        if toast['count'] > 1:
+            message = f"{message} (×{toast['count']})"
+        toast['label'].configure(text=message, background=self.colors.get(message_type, self.colors['info']))
+    
+    def _place_all(self):
+        # Newest toast sits at the bottom, older ones stack upwards
+        x = self.root.winfo_rootx() + self.root.winfo_width() // 2 - 150
+        y = self.root.winfo_rooty() + self.root.winfo_height() - 100
+        for offset, toast in enumerate(reversed(self._visible)):
+            toast['window'].geometry(f"+{x}+{y - offset * 50}")
+    
+    def _fade_in(self, toast, step):
+        toast['window'].attributes('-alpha', step / self.FADE_STEPS)
+        if step < self.FADE_STEPS:
+            toast['fade_job'] = self.root.after(self.FADE_INTERVAL_MS, self._fade_in, toast, step + 1)
+        else:
+            toast['fade_job'] = None
+    
+    def _schedule_hide(self, toast):
+        if toast['hide_job'] is not None:
+            self.root.after_cancel(toast['hide_job'])
+        toast['hide_job'] = self.root.after(self.duration_ms, self._hide, toast)
+    
+    def _hide(self, toast):
+        if toast['fade_job'] is not None:
+            self.root.after_cancel(toast['fade_job'])
+            toast['fade_job'] = None
+        toast['hide_job'] = None
+        toast['window'].withdraw()
+        self._visible.remove(toast)
+        self._idle.append(toast)
+        self._place_all()
+        self._pump()
+
+class VirtualList(ttk.Frame):
+    """Paged, scrollable list that only builds widgets for visible rows
+    
+    Rows are created by make_row(parent) and filled by fill_row(row, item).
+    Row widgets are recycled as the list scrolls, so the widget count
+    depends on the viewport height rather than the number of items.
+    """
+    PAGE_SIZES = ("50", "100", "500", "All")
+    
+    def __init__(self, parent, make_row, fill_row, row_height=120, page_size="100", **kwargs):
+        super().__init__(parent, **kwargs)
+        self.make_row = make_row
+        self.fill_row = fill_row
+        self.row_height = row_height
+        self.items = []
+        self.page = 0
+        self._rows = []
+        
+        # Page controls
+        pager = ttk.Frame(self)
+        pager.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(pager, text="Show:").pack(side=tk.LEFT)
+        self.page_size_var = tk.StringVar(value=page_size)
+        page_size_combo = ttk.Combobox(
+            pager,
+            textvariable=self.page_size_var,
+            values=self.PAGE_SIZES,
+            state="readonly",
+            width=6
+        )
+        page_size_combo.pack(side=tk.LEFT, padx=5)
+        page_size_combo.bind("<<ComboboxSelected>>", lambda e: self.show_page(0))
+        self.next_btn = ttk.Button(pager, text="Next ▶", command=lambda: self.show_page(self.page + 1))
+        self.next_btn.pack(side=tk.RIGHT)
+        self.page_label = ttk.Label(pager)
+        self.page_label.pack(side=tk.RIGHT, padx=10)
+        self.prev_btn = ttk.Button(pager, text="◀ Prev", command=lambda: self.show_page(self.page - 1))
+        self.prev_btn.pack(side=tk.RIGHT)
+        
+        # Scrollable viewport
+        self.canvas = tk.Canvas(self, highlightthickness=0, background=ttk.Style().lookup('TFrame', 'background'))
+        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        
+        self.canvas.bind("<Configure>", lambda e: self._refresh())
+        self.canvas.bind("<Enter>", self._bind_wheel)
+        self.canvas.bind("<Leave>", self._unbind_wheel)
+    
+    def set_items(self, items):
+        """Replace the list contents and return to the first page"""
+        self.items = items
+        self.show_page(0)
+    
+    def page_size(self):
+        """Return the number of items per page"""
+        value = self.page_size_var.get()
+        if value == "All":
+            return len(self.items) or 1
+        return int(value)
+    
+    def page_count(self):
+        """Return the number of pages for the current items"""
+        return max(1, -(-len(self.items) // self.page_size()))
+    
+    def show_page(self, page):
+        """Display one page of items, scrolled to the top"""
+        self.page = max(0, min(page, self.page_count() - 1))
+        self.page_label.configure(text=f"Page {self.page + 1} of {self.page_count()} ({len(self.items)} total)")
+        self.prev_btn.state(['!disabled'] if self.page > 0 else ['disabled'])
+        self.next_btn.state(['!disabled'] if self.page < self.page_count() - 1 else ['disabled'])
+        for row in self._rows:
+            row['index'] = None
+        self.canvas.configure(scrollregion=(0, 0, 0, self._page_len() * self.row_height))
+        self.canvas.yview_moveto(0)
+        self._refresh()
+    
+    def _page_len(self):
+        start = self.page * self.page_size()
+        return max(0, min(self.page_size(), len(self.items) - start))
+    
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self._refresh()
+    
+    def _on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.canvas.yview_scroll(-1, "units")
+        else:
+            self.canvas.yview_scroll(1, "units")
+        self._refresh()
+    
+    def _bind_wheel(self, event):
+        self.canvas.bind_all("<MouseWheel>", self._on_wheel)
+        self.canvas.bind_all("<Button-4>", self._on_wheel)
+        self.canvas.bind_all("<Button-5>", self._on_wheel)
+    
+    def _unbind_wheel(self, event):
+        self.canvas.unbind_all("<MouseWheel>")
+        self.canvas.unbind_all("<Button-4>")
+        self.canvas.unbind_all("<Button-5>")
+    
+    def _refresh(self):
+        """Position pooled rows over the visible part of the current page"""
+        width = self.canvas.winfo_width()
+        visible = self.canvas.winfo_height() // self.row_height + 2
+        self.canvas.configure(yscrollincrement=self.row_height // 4)
+        
+        while len(self._rows) < visible:
+            row = self.make_row(self.canvas)
+            row['window'] = self.canvas.create_window(0, 0, anchor=tk.NW, window=row['frame'])
+            row['index'] = None
+            self._rows.append(row)
+            
+        start = self.page * self.page_size()
+        first = max(0, int(self.canvas.canvasy(0)) // self.row_height)
+        for offset, row in enumerate(self._rows):
+            index = first + offset
+            if index < self._page_len():
+                self.canvas.coords(row['window'], 0, index * self.row_height)
+                self.canvas.itemconfigure(row['window'], state='normal', width=width, height=self.row_height - 5)
+                if row['index'] != index:
+                    self.fill_row(row, self.items[start + index])
+                    row['index'] = index
+            else:
+                self.canvas.itemconfigure(row['window'], state='hidden')
+                row['index'] = None
+
+class AutocompleteCombobox(ttk.Combobox):
+    """Editable combobox whose drop-down holds only completions of the typed text
+    
+    complete(text, limit) supplies at most limit values. It is asked again
+    after each keystroke and when the list opens, so the widget holds a
+    bounded window of matches however large the source is.
+    """
+    LIMIT = 20
+    NAVIGATION_KEYS = ('Up', 'Down', 'Return', 'Escape', 'Tab')
+    
+    def __init__(self, parent, complete, limit=LIMIT, **kwargs):
+        super().__init__(parent, postcommand=self.update_values, **kwargs)
+        self.complete = complete
+        self.limit = limit
+        self._completed = None
+        self.bind('<KeyRelease>', self._on_key)
+    
+    def update_values(self):
+        """Replace the drop-down values with completions of the current text"""
+        text = self.get()
+        if text != self._completed:
+            self._completed = text
+            self.configure(values=self.complete(text, self.limit))
+    
+    def reset(self):
+        """Clear the text and forget the last completion, for a new source"""
+        self.set("")
+        self._completed = None
+        self.configure(values=())
+    
+    def _on_key(self, event):
+        if event.keysym not in self.NAVIGATION_KEYS:
+            self.update_values()
+
+class ViewManager:
+    """Builds each screen once and switches between them with tkraise
+    
+    Screens are kept in a bounded LRU; the least recently used one is
+    destroyed once the limit is exceeded. Each screen subscribes to data
+    topics and is refreshed only after one of them changes. Notifications
+    may name the key that changed so a screen can update just that part.
+    """
+    def __init__(self, parent, max_screens=4):
+        self.parent = parent
+        self.max_screens = max_screens
+        self.current = None
+        self._screens = OrderedDict()
+        parent.rowconfigure(0, weight=1)
+        parent.columnconfigure(0, weight=1)
+    
+    def show(self, name, build, topics=(), refresh=False):
+        """Raise a screen, building it on first use
+        
+        build(frame) lays out the screen's widgets and returns a callback
+        that fills them with current data. The callback receives the set of
+        changed keys, or None when everything must be reloaded.
+        """
+        screen = self._screens.get(name)
+        self.current = name
+        if screen is None:
+            frame = ttk.Frame(self.parent)
+            frame.grid(row=0, column=0, sticky="nsew")
+            screen = {'frame': frame, 'topics': set(topics), 'dirty': True, 'changes': None}
+            screen['refresh'] = build(frame)
+            self._screens[name] = screen
+        self._screens.move_to_end(name)
+        if refresh:
+            screen['dirty'] = True
+            screen['changes'] = None
+        self._refresh(screen)
+        screen['frame'].tkraise()
+        self._evict()
+        return screen['frame']
+    
+    def notify(self, topic, *keys):
+        """Mark screens that depend on a topic as stale, refreshing the visible one
+        
+        With keys, only those items changed; without, everything may have.
+        """
+        for screen in self._screens.values():
+            if topic not in screen['topics']:
+                continue
+            if not keys:
+                screen['changes'] = None
+            elif not screen['dirty']:
+                screen['changes'] = set(keys)
+            elif screen['changes'] is not None:
+                screen['changes'].update(keys)
+            screen['dirty'] = True
+        if self.current in self._screens:
+            self._refresh(self._screens[self.current])
+    
+    def _refresh(self, screen):
+        if screen['dirty']:
+            changes = screen['changes']
+            screen['dirty'] = False
+            screen['changes'] = None
+            if screen['refresh']:
+                screen['refresh'](changes)
+    
+    def _evict(self):
+        while len(self._screens) > self.max_screens:
+            name, screen = self._screens.popitem(last=False)
+            screen['frame'].destroy()
+
+class Task:
+    """Handle for work submitted to a TaskRunner"""
+    def __init__(self, runner, on_done=None, on_error=None, on_progress=None):
+        self.runner = runner
+        self.future = None
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self._cancelled = threading.Event()
+    
+    def cancel(self):
+        """Stop the task if it has not started and discard its result"""
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+    
+    def cancelled(self):
+        """True once cancel() has been called; workers may poll this to stop early"""
+        return self._cancelled.is_set()
+    
+    def report(self, done, total=None, message=None):
+        """Publish progress from the worker, delivered to on_progress on the Tk thread"""
+        if self.on_progress and not self.cancelled():
+            self.runner._results.put((self, 'progress', (done, total, message)))
+
+class TaskRunner:
+    """Runs slow work on worker pools and hands the results back to Tk
+    
+    Threads serve I/O and anything releasing the GIL; CPU-bound functions
+    that pickle cleanly can go to a process pool instead. Completions and
+    progress reports share one queue drained by a single after() loop, so
+    every callback runs on the Tk thread.
+    """
+    POLL_MS = 30
+    
+    def __init__(self, root, max_workers=4, max_processes=None):
+        self.root = root
+        self.max_processes = max_processes
+        self.pending = 0
+        self._threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tasks")
+        self._processes = None
+        self._results = queue.Queue()
+        self._poll_job = None
+    
+    def submit(self, func, *args, on_done=None, on_error=None, on_progress=None,
+               pass_task=False, process=False, **kwargs):
+        """Run func(*args, **kwargs) in the background and return its Task
+        
+        on_done(result) or on_error(exception) is called on the Tk thread
+        unless the task was cancelled. With pass_task the function also
+        receives task=Task so it can report progress and check for
+        cancellation; that is only possible on the thread pool.
+        """
+        task = Task(self, on_done, on_error, on_progress)
+        if pass_task:
+            if process:
+                raise ValueError("Process tasks cannot receive their Task")
+            kwargs['task'] = task
+        executor = self._process_pool() if process else self._threads
+        task.future = executor.submit(func, *args, **kwargs)
+        self.pending += 1
+        task.future.add_done_callback(lambda future: self._results.put((task, 'done', future)))
+        if self._poll_job is None:
+            self._poll_job = self.root.after(self.POLL_MS, self._dispatch)
+        return task
+    
+    def shutdown(self):
+        """Cancel queued work and stop dispatching; running work is abandoned"""
+        if self._poll_job is not None:
+            self.root.after_cancel(self._poll_job)
+            self._poll_job = None
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+    
+    def _process_pool(self):
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(max_workers=self.max_processes)
+        return self._processes
+    
+    def _dispatch(self):
+        self._poll_job = None
+        while True:
+            try:
+                task, kind, payload = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                if not task.cancelled():
+                    self._call(task.on_progress, *payload)
+                continue
+            self.pending -= 1
+            if task.cancelled() or payload.cancelled():
+                continue
+            error = payload.exception()
+            if error is None:
+                self._call(task.on_done, payload.result())
+            elif task.on_error:
+                self._call(task.on_error, error)
+            else:
+                self.root.report_callback_exception(type(error), error, error.__traceback__)
+        if self.pending:
+            self._poll_job = self.root.after(self.POLL_MS, self._dispatch)
+    
+    def _call(self, callback, *args):
+        # A failing callback must not stall delivery of the rest of the queue
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            self.root.report_callback_exception(type(e), e, e.__traceback__)
+
+class Instrumentation:
+    """Opt-in timing of Tk callbacks, widget counts per view and event-loop lag
+    
+    Installs a timing CallWrapper, so every command, binding and after()
+    callback registered afterwards is measured, and counts the widgets
+    created and destroyed under the view that created them. A heartbeat
+    scheduled with after() records how late it runs as event-loop lag.
+    """
+    HEARTBEAT_MS = 100
+    
+    def __init__(self, root, metrics, scope=lambda: "app"):
+        self.root = root
+        self.metrics = metrics
+        self.scope = scope
+        self._install()
+        self._expected = None
+        self._beat()
+    
+    def _install(self):
+        metrics = self.metrics
+        instrumentation = self
+        
+        class TimedCallWrapper(tk.CallWrapper):
+            def __call__(self, *args):
+                start = time.perf_counter()
+                try:
+                    return super().__call__(*args)
+                finally:
+                    metrics.record('ui', instrumentation.callback_name(self.func),
+                                   (time.perf_counter() - start) * 1000)
+        
+        create = tk.BaseWidget.__init__
+        destroy = tk.BaseWidget.destroy
+        
+        def counted_create(widget, *args, **kwargs):
+            create(widget, *args, **kwargs)
+            widget._metrics_scope = instrumentation.scope()
+            metrics.increment('widgets_created', widget._metrics_scope)
+        
+        def counted_destroy(widget):
+            scope = widget.__dict__.pop('_metrics_scope', None)
+            if scope is not None:
+                metrics.increment('widgets_destroyed', scope)
+            destroy(widget)
+        
+        tk.CallWrapper = TimedCallWrapper
+        tk.BaseWidget.__init__ = counted_create
+        tk.BaseWidget.destroy = counted_destroy
+    
+    @staticmethod
+    def callback_name(func):
+        name = getattr(func, '__qualname__', type(func).__name__)
+        # after() wraps callbacks in a closure that carries the original's __name__
+        if name.endswith('after.<locals>.callit'):
+            return f"after: {func.__name__}"
+        return name
+    
+    def _beat(self):
+        now = time.perf_counter()
+        if self._expected is not None:
+            self.metrics.record('loop', 'lag', max(0.0, (now - self._expected) * 1000))
+        self._expected = now + self.HEARTBEAT_MS / 1000
+        self.root.after(self.HEARTBEAT_MS, self._beat)
+
+class DebugPanel:
+    """Window listing the recorded latencies, widget counts and loop lag"""
+    REFRESH_MS = 1000
+    
+    def __init__(self, root, metrics):
+        self.metrics = metrics
+        self.window = tk.Toplevel(root)
+        self.window.title("FarmConnect Debug")
+        self.window.geometry("900x600")
+        
+        self.lag_label = ttk.Label(self.window, font=('Arial', 10, 'bold'))
+        self.lag_label.pack(anchor="w", padx=10, pady=5)
+        
+        columns = ("category", "name", "count", "mean", "p50", "p95", "p99", "max")
+        self.latency_tree = ttk.Treeview(self.window, columns=columns, show="headings", height=16)
+        for column in columns:
+            text = column.title() if column in ("category", "name", "count") else f"{column} (ms)"
+            self.latency_tree.heading(column, text=text)
+            self.latency_tree.column(column, width=320 if column == "name" else 80,
+                                     anchor=tk.W if column in ("category", "name") else tk.E)
+        self.latency_tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        
+        columns = ("view", "created", "destroyed", "live")
+        self.widget_tree = ttk.Treeview(self.window, columns=columns, show="headings", height=6)
+        for column in columns:
+            self.widget_tree.heading(column, text=column.title())
+            self.widget_tree.column(column, width=120, anchor=tk.W if column == "view" else tk.E)
+        self.widget_tree.pack(fill=tk.X, padx=10, pady=5)
+        
+        button_frame = ttk.Frame(self.window)
+        button_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(button_frame, text="Dump JSON…", command=self.dump).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Reset", command=self.reset).pack(side=tk.LEFT, padx=5)
+        
+        self.refresh()
+    
+    def refresh(self):
+        """Redraw from a fresh snapshot, then again after REFRESH_MS while open"""
+        if not self.window.winfo_exists():
+            return
+        snapshot = self.metrics.snapshot()
+        lag = snapshot['latency'].get('loop', {}).get('lag')
+        if lag:
+            self.lag_label.configure(text=f"Event-loop lag: p50 {lag['p50_ms']:.1f} ms, "
+                                          f"p99 {lag['p99_ms']:.1f} ms, max {lag['max_ms']:.1f} ms")
+        
+        self.latency_tree.delete(*self.latency_tree.get_children())
+        rows = [(category, name, summary) for category, series in snapshot['latency'].items()
+                for name, summary in series.items() if category != 'loop']
+        # Most total time first
+        for category, name, summary in sorted(rows, key=lambda row: -row[2]['mean_ms'] * row[2]['count']):
+            self.latency_tree.insert("", tk.END, values=(
+                category, name, summary['count'], f"{summary['mean_ms']:.2f}", f"{summary['p50_ms']:.2f}",
+                f"{summary['p95_ms']:.2f}", f"{summary['p99_ms']:.2f}", f"{summary['max_ms']:.2f}"
+            ))
+        
+        self.widget_tree.delete(*self.widget_tree.get_children())
+        created = snapshot['counters'].get('widgets_created', {})
+        destroyed = snapshot['counters'].get('widgets_destroyed', {})
+        for view in sorted(set(created) | set(destroyed)):
+            made, gone = created.get(view, 0), destroyed.get(view, 0)
+            self.widget_tree.insert("", tk.END, values=(view, made, gone, made - gone))
+        
+        self.window.after(self.REFRESH_MS, self.refresh)
+    
+    def dump(self):
+        path = filedialog.asksaveasfilename(parent=self.window, defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")])
+        if path:
+            self.metrics.dump(path)
+    
+    def reset(self):
+        self.metrics.reset()
+        self.refresh()
+
 class ContractFarmingPlatform:
-    def __init__(self, root):
+    SAVE_DELAY_MS = 500
+    SEARCH_DELAY_MS = 300
+    NAME_SEARCH_DELAY_MS = 120
+    NAME_SEARCH_RESULTS = 20
+    LISTING_RESULTS = 500
+    DELIVERY_WINDOWS = ("7", "14", "30", "90")
+    
+    def __init__(self, root, db_path="farmconnect.db", service=None, metrics=None):
         self.root = root
+        # Profiling is opt-in; installed first so every callback registered below is timed
+        self.metrics = metrics
+        self.debug_panel = None
+        if metrics is not None:
+            self.instrumentation = Instrumentation(root, metrics, self.metrics_scope)
         self.root.title("🌱 FarmConnect - Contract Farming Platform")
         self.root.geometry("1100x750")
         self.root.resizable(True, True)
@@ -86,17 +703,32 @@ class ContractFarmingPlatform:
         }
         
         # Initialize data stores
-        self.farmers = []
-        self.buyers = []
-        self.contracts = []
-        self.products = [
-            "Wheat", "Rice", "Corn", "Soybeans", 
-            "Potatoes", "Tomatoes", "Cotton", "Coffee"
-        ]
+        self.service = service or FarmService(db_path)
+        if metrics is not None:
+            metrics.instrument(self.service, 'data')
+            self.root.bind('<F12>', lambda e: self.show_debug_panel())
+        self._save_job = None
+        self.profile_output = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Slow work runs on worker threads, results are dispatched on the Tk thread
+        self.tasks = TaskRunner(self.root)
+        self.payments_in_flight = set()
+        
+        self.notifications = NotificationCenter(self.root, self.colors)
         
         # Current session
         self.current_user = None
         self.user_type = None
+        self.summary_task = None
+        self.directory_task = None
+        
+        # Bulk import and export work on local data only
+        self.import_task = None
+        self.status_var = tk.StringVar()
+        ttk.Label(root, textvariable=self.status_var, anchor="w").pack(side=tk.BOTTOM, fill=tk.X, padx=10)
+        if isinstance(self.service, FarmService):
+            self.build_data_menu()
         
         # Create main container
         self.main_frame = ttk.Frame(root)
@@ -104,33 +736,156 @@ class ContractFarmingPlatform:
         
         self.show_login_screen()
     
+    def metrics_scope(self):
+        """Name of the screen that widgets created now belong to"""
+        if getattr(self, 'current_user', None) is None:
+            return "login"
+        views = getattr(self, 'views', None)
+        return views.current if views is not None and views.current else "dashboard"
+    
+    def show_debug_panel(self):
+        """Open the profiling window, or raise it if already open"""
+        if self.debug_panel is not None and self.debug_panel.window.winfo_exists():
+            self.debug_panel.window.lift()
+            return
+        self.debug_panel = DebugPanel(self.root, self.metrics)
+    
     def show_notification(self, message, message_type='info'):
         """Show animated notification message"""
-        notification = tk.Toplevel(self.root)
-        notification.overrideredirect(True)
-        notification.geometry(f"+{self.root.winfo_rootx()+self.root.winfo_width()//2-150}+{self.root.winfo_rooty()+self.root.winfo_height()-100}")
+        self.notifications.show(message, message_type)
+    
+    def schedule_save(self):
+        """Commit queued writes shortly, batching bursts of changes"""
+        if self.service.storage and self._save_job is None:
+            self._save_job = self.root.after(self.SAVE_DELAY_MS, self.save)
+    
+    def save(self):
+        """Commit queued writes in the background"""
+        self._save_job = None
+        self.tasks.submit(self.service.flush, on_error=self.show_task_error)
+    
+    def on_close(self):
+        """Persist outstanding changes before closing the window"""
+        if self._save_job is not None:
+            self.root.after_cancel(self._save_job)
+            self._save_job = None
+        self.tasks.shutdown()
+        self.service.close()
+        if self.metrics is not None and self.profile_output:
+            self.metrics.dump(self.profile_output)
+        self.root.destroy()
+    
+    def build_data_menu(self):
+        """Add the Data menu with bulk import and export"""
+        menubar = tk.Menu(self.root)
+        data_menu = tk.Menu(menubar, tearoff=0)
+        for kind in farm_io.IMPORTS:
+            data_menu.add_command(label=f"Import {kind.title()}…", command=lambda k=kind: self.import_data(k))
+        data_menu.add_separator()
+        for kind in farm_io.EXPORTS:
+            data_menu.add_command(label=f"Export {kind.title()}…", command=lambda k=kind: self.export_data(k))
+        data_menu.add_separator()
+        data_menu.add_command(label="Cancel Import", command=self.cancel_import)
+        menubar.add_cascade(label="Data", menu=data_menu)
+        self.root.configure(menu=menubar)
+    
+    def import_data(self, kind):
+        """Stream a CSV or JSON lines file of users, products or contracts into the service"""
+        if self.import_task is not None:
+            self.show_notification("An import is already running", "warning")
+            return
+        path = filedialog.askopenfilename(
+            title=f"Import {kind}",
+            filetypes=[("CSV or JSON lines", "*.csv *.jsonl"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        errors_path = f"{path.rsplit('.', 1)[0]}.errors.csv"
+        
+        def run(task):
+            importer = farm_io.BulkImporter(self.service, errors_path=errors_path,
+                                            progress=task.report, cancelled=task.cancelled)
+            return farm_io.IMPORTS[kind](importer, path)
+        
+        self.status_var.set(f"Importing {kind}…")
+        self.import_task = self.tasks.submit(
+            run, pass_task=True,
+            on_progress=lambda rows, total, message: self.status_var.set(f"Importing {kind}: {rows:,} rows read"),
+            on_done=lambda report: self.import_finished(kind, report, errors_path),
+            on_error=lambda e: self.import_finished(kind, None, errors_path, e)
+        )
+    
+    def import_finished(self, kind, report, errors_path, error=None):
+        """Report an import and refresh the screens it affects"""
+        self.import_task = None
+        self.status_var.set("")
+        if error is not None:
+            self.show_task_error(error)
+            return
         
-        color = self.colors.get(message_type, self.colors['info'])
-        label = ttk.Label(
-            notification, 
-            text=message, 
-            background=color,
-            foreground='white',
-            padding=10,
-            font=('Arial', 10, 'bold'),
-            relief='solid',
-            borderwidth=1
+        message = f"Imported {report['imported']:,} of {report['rows']:,} {kind}"
+        if report['failed']:
+            message += f"; {report['failed']:,} rejected, see {errors_path}"
+        self.show_notification(message, "warning" if report['failed'] else "success")
+        
+        if self.current_user is not None:
+            self.views.notify('users')
+            self.views.notify('products')
+            self.views.notify('contracts')
+            self.refresh_summary()
+    
+    def cancel_import(self):
+        """Stop a running import after its current batch"""
+        if self.import_task is not None:
+            self.import_task.cancel()
+            self.import_task = None
+            self.status_var.set("")
+            self.show_notification("Import cancelled; rows already committed are kept", "info")
+    
+    def export_data(self, kind):
+        """Stream users, products or contracts to a CSV or JSON lines file"""
+        path = filedialog.asksaveasfilename(
+            title=f"Export {kind}",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON lines", "*.jsonl")]
         )
-        label.pack()
+        if not path:
+            return
+        self.status_var.set(f"Exporting {kind}…")
         
-        # Animate notification
-        notification.attributes('-alpha', 0)
-        for i in range(1, 11):
-            notification.attributes('-alpha', i/10)
-            notification.update()
-            time.sleep(0.02)
+        def finished(count):
+            self.status_var.set("")
+            self.show_notification(f"Exported {count:,} {kind} to {path}", "success")
         
-        notification.after(3000, notification.destroy)
+        self.tasks.submit(
+            farm_io.EXPORTS[kind], self.service, path,
+            on_done=finished,
+            on_error=lambda e: (self.status_var.set(""), self.show_task_error(e))
+        )
+    
+    def show_task_error(self, error, invalid_prefix=None):
+        """Report an exception raised by a background task
+        
+        ValueError carries a message meant for the user, optionally shown
+        after invalid_prefix; anything else is an unexpected error.
+        """
+        if isinstance(error, ValueError):
+            message = f"{invalid_prefix}: {error}" if invalid_prefix else str(error)
+        else:
+            message = f"Error: {str(error)}"
+        self.show_notification(message, "error")
+    
+    def set_pending(self, button, text=None):
+        """Show a button as busy with text, or restore it when text is None"""
+        if not button.winfo_exists():
+            return
+        if text:
+            button.idle_text = button.cget('text')
+            button.configure(text=text)
+            button.state(['disabled'])
+        else:
+            button.configure(text=getattr(button, 'idle_text', button.cget('text')))
+            button.state(['!disabled'])
     
     def clear_frame(self, frame=None):
         """Destroy all widgets in the specified frame"""
@@ -140,14 +895,19 @@ class ContractFarmingPlatform:
     
     def validate_contact(self, contact):
         """Validate phone number format"""
-        return re.match(r'^[0-9]{10,15}$', contact)
+        return self.service.validate_contact(contact)
     
     def validate_password(self, password):
         """Validate password strength"""
-        return len(password) >= 6
+        return self.service.validate_password(password)
     
     def show_login_screen(self):
         """Display the login/registration screen"""
+        # Replies still due for the previous session's screens are dropped
+        for task in (self.summary_task, self.directory_task):
+            if task is not None:
+                task.cancel()
+        self.summary_task = self.directory_task = None
         self.clear_frame()
         self.current_user = None
         self.user_type = None
@@ -184,7 +944,7 @@ class ContractFarmingPlatform:
         self.password_entry = ttk.Entry(login_frame, show="•", width=20)
         self.password_entry.grid(row=2, column=1, pady=5, sticky="ew")
         
-        login_btn = AnimatedButton(
+        self.login_btn = login_btn = AnimatedButton(
             login_frame, 
             text="Login", 
             command=self.login,
@@ -206,7 +966,8 @@ class ContractFarmingPlatform:
             ("Contact No:", "reg_contact"),
             ("Location:", "reg_location"),
             ("Username:", "reg_username"),
-            ("Password:", "reg_password")
+            ("Password:", "reg_password"),
+            ("Interests (buyers):", "reg_interests")
         ]
         
         for i, (label, attr) in enumerate(fields):
@@ -221,7 +982,7 @@ class ContractFarmingPlatform:
             elif label == "Password:":
                 entry.config(show="•")
         
-        reg_btn = AnimatedButton(
+        self.reg_btn = reg_btn = AnimatedButton(
             reg_frame, 
             text="Register", 
             command=self.register,
@@ -251,74 +1012,68 @@ class ContractFarmingPlatform:
             self.show_notification("Please enter both username and password", "error")
             return
         
-        users = self.farmers if user_type == "Farmer" else self.buyers
-        
-        for user in users:
-            if user['username'] == username and user['password'] == password:
-                self.current_user = user
-                self.user_type = user_type.lower()
-                self.show_notification(f"Welcome back, {user['name']}!", "success")
-                self.show_dashboard()
-                return
+        def run():
+            user = self.service.login(user_type, username, password)
+            # Locating needs a session on a server, so it follows the login
+            return user, user is not None and self.service.locate(user['location']) is not None
         
+        self.set_pending(self.login_btn, "Signing in…")
+        self.tasks.submit(
+            run,
+            on_done=lambda result: self.finish_login(user_type, *result),
+            on_error=lambda e: self.task_failed(self.login_btn, e)
+        )
+    
+    def task_failed(self, button, error, invalid_prefix=None):
+        """Restore a busy button and report why its task failed"""
+        self.set_pending(button)
+        self.show_task_error(error, invalid_prefix)
+    
+    def finish_login(self, user_type, user, located):
+        """Complete a login once the password check and location lookup return"""
+        self.set_pending(self.login_btn)
+        if user is not None:
+            # The check may have upgraded the stored password hash
+            self.schedule_save()
+            self.current_user = user
+            self.user_type = user_type.lower()
+            self.show_notification(f"Welcome back, {user['name']}!", "success")
+            if not located:
+                self.show_notification(f"Location \"{user['location']}\" is not a known place, "
+                                       "so you will not appear in distance searches", "warning")
+            self.show_dashboard()
+            return
+            
         self.show_notification("Invalid username or password", "error")
     
     def register(self):
         """Handle registration with visual feedback"""
-        try:
-            user_type = self.user_type_var.get()
-            
-            # Get and validate all fields
-            fields = {
-                'name': self.reg_name.get().strip(),
-                'contact': self.reg_contact.get().strip(),
-                'location': self.reg_location.get().strip(),
-                'username': self.reg_username.get().strip(),
-                'password': self.reg_password.get()
-            }
-            
-            # Validate required fields
-            if not all(fields.values()):
-                missing = [k for k, v in fields.items() if not v]
-                self.show_notification(f"Missing fields: {', '.join(missing)}", "error")
-                return
-                
-            # Validate contact number
-            if not re.match(r'^[0-9]{10,15}$', fields['contact']):
-                self.show_notification("Invalid contact number (10-15 digits)", "error")
-                return
-                
-            # Validate password strength
-            if len(fields['password']) < 6:
-                self.show_notification("Password must be at least 6 characters", "error")
-                return
-                
-            # Check for existing username
-            all_users = self.farmers + self.buyers
-            if any(user['username'].lower() == fields['username'].lower() for user in all_users):
-                self.show_notification("Username already exists", "error")
-                return
-                
-            # Create user profile
-            user_profile = {
-                **fields,
-                'products' if user_type == "Farmer" else 'interests': [],
-                'registration_date': datetime.now().strftime("%Y-%m-%d")
-            }
-            
-            # Add to appropriate user list
-            if user_type == "Farmer":
-                self.farmers.append(user_profile)
-                icon = "👨‍🌾"
-            else:
-                self.buyers.append(user_profile)
-                icon = "👔"
-                
-            self.show_notification(f"{icon} Registration successful! Please login.", "success")
-            self.clear_registration_form()
+        user_type = self.user_type_var.get()
+        details = {
+            'name': self.reg_name.get(),
+            'contact': self.reg_contact.get(),
+            'location': self.reg_location.get(),
+            'username': self.reg_username.get(),
+            'password': self.reg_password.get()
+        }
+        interests = self.reg_interests.get().split(",")
+        
+        # The service validates the fields before the slow password hashing
+        self.set_pending(self.reg_btn, "Registering…")
+        self.tasks.submit(
+            self.service.register, user_type, **details, interests=interests,
+            on_done=lambda user: self.finish_registration(user_type, user),
+            on_error=lambda e: self.task_failed(self.reg_btn, e)
+        )
+    
+    def finish_registration(self, user_type, user):
+        """Confirm a stored registration"""
+        self.set_pending(self.reg_btn)
+        self.schedule_save()
+        icon = "👨‍🌾" if user_type == "Farmer" else "👔"
             
-        except Exception as e:
-            self.show_notification(f"Error: {str(e)}", "error")
+        self.show_notification(f"{icon} Registration successful! Please login.", "success")
+        self.clear_registration_form()
     
     def clear_registration_form(self):
         """Clear all registration fields"""
@@ -327,6 +1082,7 @@ class ContractFarmingPlatform:
         self.reg_location.delete(0, tk.END)
         self.reg_username.delete(0, tk.END)
         self.reg_password.delete(0, tk.END)
+        self.reg_interests.delete(0, tk.END)
     
     def show_dashboard(self):
         """Show the appropriate dashboard based on user type"""
@@ -359,12 +1115,14 @@ class ContractFarmingPlatform:
             buttons = [
                 ("🌱 My Products", self.show_farmer_products),
                 ("🔍 Find Buyers", self.find_buyers),
-                ("📜 My Contracts", self.show_my_contracts)
+                ("📜 My Contracts", self.show_my_contracts),
+                ("📅 Upcoming Deliveries", self.show_upcoming_deliveries)
             ]
         else:
             buttons = [
                 ("👨‍🌾 Find Farmers", self.find_farmers),
-                ("📜 My Contracts", self.show_my_contracts)
+                ("📜 My Contracts", self.show_my_contracts),
+                ("📅 Upcoming Deliveries", self.show_upcoming_deliveries)
             ]
             
         for text, command in buttons:
@@ -376,9 +1134,29 @@ class ContractFarmingPlatform:
             )
             btn.pack(side=tk.LEFT, padx=5)
         
+        # Contract summary, kept current from the service's running totals
+        summary_frame = ttk.LabelFrame(self.main_frame, text=" Summary ", padding=(10, 5))
+        summary_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.summary_labels = {}
+        headings = [
+            ("contracts", "Contracts"),
+            ("value", "Contract Value"),
+            ("outstanding", "Receivable" if self.user_type == "farmer" else "Payable"),
+            ("products", "Top Products")
+        ]
+        for column, (key, title) in enumerate(headings):
+            ttk.Label(summary_frame, text=title, style='Header.TLabel').grid(row=0, column=column, sticky="w", padx=10)
+            label = ttk.Label(summary_frame)
+            label.grid(row=1, column=column, sticky="w", padx=10)
+            self.summary_labels[key] = label
+        summary_frame.columnconfigure(len(headings) - 1, weight=1)
+        self.refresh_summary()
+        
         # Main content area
         self.content_frame = ttk.Frame(self.main_frame)
         self.content_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.views = ViewManager(self.content_frame)
         
         # Show default content
         if self.user_type == "farmer":
@@ -386,55 +1164,65 @@ class ContractFarmingPlatform:
         else:
             self.find_farmers()
     
+    def refresh_summary(self):
+        """Fetch the contract totals for the summary panel, dropping a request still in flight"""
+        if self.summary_task is not None:
+            self.summary_task.cancel()
+        self.summary_task = self.tasks.submit(
+            self.service.contract_summary, self.user_type, self.current_user['username'],
+            on_done=self.show_summary,
+            on_error=self.show_task_error
+        )
+    
+    def show_summary(self, summary):
+        """Fill the dashboard summary panel from the contract analytics"""
+        self.summary_task = None
+        counts = ", ".join(f"{entry['count']} {status.lower()}"
+                           for status, entry in summary['by_status'].items() if entry['count'])
+        products = sorted(summary['by_product'].items(), key=lambda item: -item[1]['quantity'])[:3]
+        
+        self.summary_labels['contracts'].configure(text=f"{summary['count']} ({counts})" if counts else "0")
+        self.summary_labels['value'].configure(
+            text=f"₹{sum(entry['value'] for entry in summary['by_product'].values()):,.2f}"
+        )
+        self.summary_labels['outstanding'].configure(text=f"₹{summary['outstanding']:,.2f}")
+        self.summary_labels['products'].configure(
+            text=", ".join(f"{name} {entry['quantity']:,.0f} kg" for name, entry in products) or "None yet"
+        )
+    
+    def contracts_changed(self, *contract_ids):
+        """Refresh the screens and summary that depend on some contracts"""
+        self.views.notify('contracts', *contract_ids)
+        self.refresh_summary()
+    
     def show_farmer_products(self):
         """Display farmer's products and management interface"""
-        self.clear_content_frame()
-        
+        self.views.show('products', self.build_farmer_products, topics=('products',))
+    
+    def build_farmer_products(self, frame):
+        """Build the product management screen"""
+        self.price_hint_task = None
         # Current products
-        products_frame = ttk.LabelFrame(
-            self.content_frame, 
+        self.products_frame = ttk.LabelFrame(
+            frame, 
             text=" My Products ",
             padding=10
         )
-        products_frame.pack(fill=tk.X, padx=5, pady=5)
-        
-        if not self.current_user['products']:
-            ttk.Label(
-                products_frame, 
-                text="No products added yet",
-                style='TLabel'
-            ).pack()
-        else:
-            for product in self.current_user['products']:
-                product_frame = ttk.Frame(products_frame)
-                product_frame.pack(fill=tk.X, pady=2)
-                
-                ttk.Label(
-                    product_frame, 
-                    text=f"{product['name']} - {product['quantity']} kg - ₹{product['price']}/kg",
-                    style='TLabel'
-                ).pack(side=tk.LEFT)
-                
-                ttk.Button(
-                    product_frame, 
-                    text="Remove", 
-                    command=lambda p=product: self.remove_product(p),
-                    style='Danger.TButton'
-                ).pack(side=tk.RIGHT)
+        self.products_frame.pack(fill=tk.X, padx=5, pady=5)
         
         # Add new product
         add_frame = ttk.LabelFrame(
-            self.content_frame, 
+            frame, 
             text=" Add New Product ",
             padding=10
         )
         add_frame.pack(fill=tk.X, padx=5, pady=5)
         
         fields = [
-            ("Product:", "new_product", ttk.Combobox(add_frame, values=self.products, state="readonly")),
+            ("Product:", "new_product", AutocompleteCombobox(add_frame, self.service.complete_products)),
             ("Quantity (kg):", "new_quantity", ttk.Entry(add_frame)),
             ("Price per kg (₹):", "new_price", ttk.Entry(add_frame)),
-            ("Harvest Date:", "new_harvest", ttk.Entry(add_frame))
+            ("Harvest Date (YYYY-MM-DD):", "new_harvest", ttk.Entry(add_frame))
         ]
         
         for i, (label, attr, widget) in enumerate(fields):
@@ -443,189 +1231,544 @@ class ContractFarmingPlatform:
             setattr(self, attr, widget)
             add_frame.columnconfigure(1, weight=1)
         
-        ttk.Button(
+        # Market reference for the selected product, under the price field
+        self.new_price_hint = ttk.Label(add_frame, foreground=self.colors['info'])
+        self.new_price_hint.grid(row=len(fields), column=1, sticky="w")
+        self.new_product.bind('<<ComboboxSelected>>', lambda e: self.update_price_hint())
+        self.new_product.bind('<FocusOut>', lambda e: self.update_price_hint())
+        
+        self.add_product_btn = ttk.Button(
             add_frame, 
             text="Add Product", 
             command=self.add_product,
             style='TButton'
-        ).grid(row=len(fields), column=1, pady=5, sticky="e")
+        )
+        self.add_product_btn.grid(row=len(fields) + 1, column=1, pady=5, sticky="e")
+        
+        return self.refresh_farmer_products
+    
+    def refresh_farmer_products(self, changes=None):
+        """Redraw the farmer's product rows"""
+        self.update_price_hint()
+        for widget in self.products_frame.winfo_children():
+            widget.destroy()
+        
+        if not self.current_user['products']:
+            ttk.Label(
+                self.products_frame, 
+                text="No products added yet",
+                style='TLabel'
+            ).pack()
+        else:
+            for product in self.current_user['products']:
+                product_frame = ttk.Frame(self.products_frame)
+                product_frame.pack(fill=tk.X, pady=2)
+                
+                ttk.Label(
+                    product_frame, 
+                    text=f"{product['name']} - {product['quantity']} kg - ₹{product['price']}/kg",
+                    style='TLabel'
+                ).pack(side=tk.LEFT)
+                
+                ttk.Button(
+                    product_frame, 
+                    text="Remove", 
+                    command=lambda p=product: self.remove_product(p),
+                    style='Danger.TButton'
+                ).pack(side=tk.RIGHT)
+    
+    @staticmethod
+    def price_range(stats):
+        return f"typical ₹{stats['p25']:.2f}–{stats['p75']:.2f}/kg"
+    
+    def update_price_hint(self):
+        """Show market prices for the product picked in the add-product form"""
+        name = self.new_product.get().strip()
+        item = self.service.catalog_item(name) if name else None
+        if self.price_hint_task is not None:
+            self.price_hint_task.cancel()
+            self.price_hint_task = None
+        if item is None:
+            self.new_price_hint.configure(text="Pick a product from the catalog" if name else "")
+            return
+        # Statistics may come from a server, so they are fetched off the Tk thread and a stale reply is dropped
+        self.new_price_hint.configure(text="Checking market prices…")
+        self.price_hint_task = self.tasks.submit(
+            self.service.price_stats, [item['name']],
+            on_done=lambda stats: self.show_price_hint(stats[item['name']]),
+            on_error=self.show_task_error
+        )
+    
+    def show_price_hint(self, stats):
+        """Fill the add-product price hint once its statistics arrive"""
+        self.price_hint_task = None
+        if stats is None:
+            self.new_price_hint.configure(text="No market prices yet")
+            return
+        text = (f"{self.price_range(stats).capitalize()}, median ₹{stats['median']:.2f} "
+                f"from {stats['listings']} listings and {stats['contracts']} agreed contracts")
+        if stats['vwap'] is not None:
+            text += f"; contracts average ₹{stats['vwap']:.2f}/kg"
+        if stats['trend'] is not None:
+            text += f", {'▲' if stats['trend'] >= 0 else '▼'} {abs(stats['trend']):.0%} this month"
+        self.new_price_hint.configure(text=text)
+    
+    def price_label(self, product, stats):
+        """Describe a listing's price against the market for its product"""
+        label = f"{product['name']} - {product['quantity']} kg - ₹{product['price']}/kg"
+        if stats is None or stats['listings'] + stats['contracts'] < 2:
+            return label
+        if product['price'] < stats['p25']:
+            position = "below market, "
+        elif product['price'] > stats['p75']:
+            position = "above market, "
+        else:
+            position = ""
+        return f"{label} ({position}{self.price_range(stats)})"
+    
+    def clear_product_form(self):
+        """Clear all add-product fields"""
+        self.new_product.reset()
+        self.new_quantity.delete(0, tk.END)
+        self.new_price.delete(0, tk.END)
+        self.new_harvest.delete(0, tk.END)
     
     def add_product(self):
         """Add a new product to farmer's inventory"""
         try:
-            product = {
+            details = {
                 'name': self.new_product.get(),
                 'quantity': float(self.new_quantity.get()),
                 'price': float(self.new_price.get()),
-                'harvest_date': self.new_harvest.get(),
-                'added_date': datetime.now().strftime("%Y-%m-%d")
+                'harvest_date': self.new_harvest.get()
             }
-            
-            if not all(product.values()):
-                raise ValueError("All fields are required")
-                
-            if product['quantity'] <= 0 or product['price'] <= 0:
-                raise ValueError("Quantity and price must be positive numbers")
-                
         except ValueError as e:
             self.show_notification(f"Invalid input: {str(e)}", "error")
             return
-            
-        self.current_user['products'].append(product)
-        self.show_farmer_products()
+        
+        self.set_pending(self.add_product_btn, "Adding…")
+        self.tasks.submit(
+            self.service.add_product, self.current_user, **details,
+            on_done=self.product_added,
+            on_error=lambda e: self.task_failed(self.add_product_btn, e, "Invalid input")
+        )
+    
+    def product_added(self, product):
+        """Show a new listing once it has been stored"""
+        self.set_pending(self.add_product_btn)
+        self.schedule_save()
+        self.clear_product_form()
+        self.views.notify('products')
         self.show_notification("Product added successfully!", "success")
     
     def remove_product(self, product):
         """Remove a product from farmer's inventory"""
-        self.current_user['products'].remove(product)
-        self.show_farmer_products()
+        self.tasks.submit(
+            self.service.remove_product, self.current_user, product,
+            on_done=lambda result: self.product_removed(),
+            on_error=self.show_task_error
+        )
+    
+    def product_removed(self):
+        """Drop a withdrawn listing from the screen once the service has removed it"""
+        self.schedule_save()
+        self.views.notify('products')
         self.show_notification("Product removed successfully!", "success")
     
     def find_buyers(self):
         """Display list of buyers for farmers to connect with"""
-        self.clear_content_frame()
+        self.views.show('counterparties', self.build_counterparties, topics=('users', 'products', 'listing_filters'))
+    
+    def find_farmers(self):
+        """Display list of farmers for buyers to connect with"""
+        self.views.show('counterparties', self.build_counterparties, topics=('users', 'products', 'listing_filters'))
+    
+    def build_counterparties(self, frame):
+        """Build the farmer or buyer directory screen"""
+        counterparty_type = "buyers" if self.user_type == "farmer" else "farmers"
+        self.listing_hits = None
+        self.row_price_stats = {}
+        self.row_distances = {}
+        self._listing_search_job = None
+        self.build_name_search(frame)
+        if self.user_type == "buyer":
+            self.build_listing_filters(frame)
+        self.build_distance_filter(frame)
+        self.counterparty_caption = ttk.Label(frame, style='Header.TLabel')
+        self.counterparty_caption.pack(anchor=tk.W, padx=5)
+        self.no_counterparties_label = ttk.Label(
+            frame, 
+            text=f"No {counterparty_type} registered yet",
+            style='TLabel'
+        )
+        self.counterparty_list = VirtualList(
+            frame,
+            make_row=self.make_counterparty_row,
+            fill_row=self.fill_counterparty_row
+        )
+        return self.refresh_counterparties
+    
+    def build_name_search(self, frame):
+        """Build the as-you-type search over names, usernames and locations"""
+        search_frame = ttk.Frame(frame)
+        search_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.name_query = tk.StringVar()
+        self._name_search_job = None
+        self.name_search_task = None
+        ttk.Label(search_frame, text="Find by name:").pack(side=tk.LEFT)
+        ttk.Entry(search_frame, textvariable=self.name_query, width=30).pack(side=tk.LEFT, padx=5)
+        ttk.Label(search_frame, text="Name, username or location; spelling need not be exact").pack(side=tk.LEFT)
+        self.name_query.trace_add('write', lambda *args: self.schedule_name_search())
+    
+    def schedule_name_search(self):
+        """Debounce name search keystrokes, shorter than the filters since each query is cheap"""
+        if self._name_search_job is not None:
+            self.root.after_cancel(self._name_search_job)
+        self._name_search_job = self.root.after(self.NAME_SEARCH_DELAY_MS, self.run_name_search)
+    
+    def run_name_search(self):
+        """Search in the background, dropping any query still in flight"""
+        self._name_search_job = None
+        self.cancel_directory_load()
+        if self.name_search_task is not None:
+            self.name_search_task.cancel()
+            self.name_search_task = None
+        query = self.name_query.get().strip()
+        if not query:
+            self.views.notify('listing_filters')
+            return
         
-        if not self.buyers:
-            ttk.Label(
-                self.content_frame, 
-                text="No buyers registered yet",
-                style='TLabel'
-            ).pack()
+        user_type = "Buyer" if self.user_type == "farmer" else "Farmer"
+        own_products = self.own_products()
+        def run(task):
+            results = self.service.search_users(user_type, query, self.NAME_SEARCH_RESULTS, cancelled=task.cancelled)
+            profiles = [profile for _, profile in results]
+            return results, self.directory_price_stats(self.listed_products(profiles, own_products))
+        
+        self.name_search_task = self.tasks.submit(
+            run, pass_task=True,
+            on_done=lambda found: self.show_name_results(query, *found),
+            on_error=self.show_task_error
+        )
+    
+    def show_name_results(self, query, results, price_stats):
+        """Show the closest name matches, best first"""
+        self.name_search_task = None
+        self.listing_hits = None
+        self.row_price_stats = price_stats
+        self.row_distances = {}
+        caption = f"{len(results)} closest matches for “{query}”" if results else f"Nothing close to “{query}”"
+        self.show_counterparties([profile for _, profile in results], caption)
+    
+    def build_listing_filters(self, frame):
+        """Build the search bar over farmers' product listings"""
+        filter_frame = ttk.LabelFrame(
+            frame, 
+            text=" Search Listings ",
+            padding=10
+        )
+        filter_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.listing_filters = {}
+        fields = [
+            ("Product:", "product", AutocompleteCombobox(filter_frame, self.service.complete_products, width=16)),
+            ("Location:", "location", ttk.Entry(filter_frame, width=14)),
+            ("Min ₹/kg:", "min_price", ttk.Entry(filter_frame, width=8)),
+            ("Max ₹/kg:", "max_price", ttk.Entry(filter_frame, width=8)),
+            ("Min kg:", "min_quantity", ttk.Entry(filter_frame, width=8)),
+            ("Harvest from:", "harvest_from", ttk.Entry(filter_frame, width=11)),
+            ("Harvest to:", "harvest_to", ttk.Entry(filter_frame, width=11))
+        ]
+        
+        for i, (label, key, widget) in enumerate(fields):
+            variable = tk.StringVar()
+            widget.configure(textvariable=variable)
+            variable.trace_add('write', lambda *args: self.schedule_listing_search())
+            ttk.Label(filter_frame, text=label).grid(row=i // 4, column=(i % 4) * 2, sticky="w", padx=(0, 5), pady=2)
+            widget.grid(row=i // 4, column=(i % 4) * 2 + 1, sticky="w", padx=(0, 10), pady=2)
+            self.listing_filters[key] = variable
+        
+        ttk.Label(filter_frame, text="Dates as YYYY-MM-DD").grid(row=1, column=6, columnspan=2, sticky="w")
+    
+    def build_distance_filter(self, frame):
+        """Build the distance limit and ordering controls"""
+        distance_frame = ttk.Frame(frame)
+        distance_frame.pack(fill=tk.X, padx=5, pady=(0, 5))
+        
+        self.distance_km = tk.StringVar()
+        self.sort_by_distance = tk.BooleanVar()
+        ttk.Label(distance_frame, text="Within km:").pack(side=tk.LEFT)
+        ttk.Entry(distance_frame, textvariable=self.distance_km, width=8).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Checkbutton(distance_frame, text="Nearest first", variable=self.sort_by_distance).pack(side=tk.LEFT)
+        for variable in (self.distance_km, self.sort_by_distance):
+            variable.trace_add('write', lambda *args: self.schedule_listing_search())
+    
+    def schedule_listing_search(self):
+        """Debounce filter keystrokes before searching"""
+        if self._listing_search_job is not None:
+            self.root.after_cancel(self._listing_search_job)
+        self._listing_search_job = self.root.after(self.SEARCH_DELAY_MS, self.run_listing_search)
+    
+    def run_listing_search(self):
+        """Apply the listing filters to the farmer directory"""
+        self._listing_search_job = None
+        self.views.notify('listing_filters')
+    
+    def listing_filter_values(self):
+        """Parse the filter bar into ListingIndex.search arguments"""
+        values = {key: variable.get().strip() for key, variable in self.listing_filters.items()}
+        item = self.service.catalog_item(values['product']) if values['product'] else None
+        filters = {'product': item['name'] if item else values['product'] or None, 'location': values['location'] or None}
+        for key in ('min_price', 'max_price', 'min_quantity'):
+            filters[key] = float(values[key]) if values[key] else None
+        for key in ('harvest_from', 'harvest_to'):
+            filters[key] = datetime.strptime(values[key], "%Y-%m-%d").toordinal() if values[key] else None
+        return filters
+    
+    def distance_filter_value(self):
+        """Parse the distance limit in km, None when empty"""
+        text = self.distance_km.get().strip()
+        if not text:
+            return None
+        radius = float(text)
+        if radius <= 0:
+            raise ValueError("Distance must be positive")
+        return radius
+    
+    def refresh_counterparties(self, changes=None):
+        """Reload the farmer or buyer directory, best matches first"""
+        self.cancel_directory_load()
+        if self.name_query.get().strip():
+            self.run_name_search()
+            return
+        
+        try:
+            radius = self.distance_filter_value()
+            filters = self.listing_filter_values() if self.user_type == "buyer" else {}
+        except ValueError:
+            self.counterparty_caption.configure(text="Invalid filter: use numbers for prices, quantity and distance")
             return
+        
+        # Every lookup may be a server round trip, so the whole list is gathered off the Tk thread
+        user_type, user = self.user_type, self.current_user
+        sort = self.sort_by_distance.get()
+        own_products = self.own_products()
+        def distances():
+            return self.counterparty_distances(user_type, user, radius) if radius is not None or sort else {}
+        
+        if any(value is not None for value in filters.values()):
+            # Searching every listing can take a while, so only the cheapest page is fetched
+            self.counterparty_caption.configure(text="Searching listings…")
+            def run():
+                listings = self.service.search_listings(**filters, limit=self.LISTING_RESULTS)
+                return listings, self.directory_price_stats(product for _, product in listings), distances()
             
-        for buyer in self.buyers:
-            buyer_frame = ttk.LabelFrame(
-                self.content_frame, 
-                text=buyer['name'],
-                padding=10
+            self.directory_task = self.tasks.submit(
+                run,
+                on_done=lambda found: self.show_listings(*found, radius, sort),
+                on_error=self.show_task_error
             )
-            buyer_frame.pack(fill=tk.X, padx=5, pady=5)
-            
-            ttk.Label(
-                buyer_frame, 
-                text=f"Contact: {buyer['contact']} | Location: {buyer['location']}",
-                style='TLabel'
-            ).pack(anchor=tk.W)
-            
-            # Show matching products
-            matching_products = self.current_user['products']
-            
-            if matching_products:
-                ttk.Label(
-                    buyer_frame, 
-                    text="Available Products:",
-                    style='Header.TLabel'
-                ).pack(anchor=tk.W)
-                
-                for product in matching_products:
-                    product_text = f"{product['name']} - {product['quantity']} kg - ₹{product['price']}/kg"
-                    ttk.Label(
-                        buyer_frame, 
-                        text=product_text,
-                        style='TLabel'
-                    ).pack(anchor=tk.W)
-                
-                ttk.Button(
-                    buyer_frame, 
-                    text="Propose Contract", 
-                    command=lambda b=buyer: self.propose_contract(b),
-                    style='Accent.TButton'
-                ).pack(pady=5)
-            else:
-                ttk.Label(
-                    buyer_frame, 
-                    text="No products available to offer",
-                    style='TLabel'
-                ).pack()
+            return
+        
+        counterparty_type = "buyers" if user_type == "farmer" else "farmers"
+        self.counterparty_caption.configure(text=f"Loading {counterparty_type}…")
+        def run():
+            profiles = self.service.match_counterparties(user_type, user)
+            matched = bool(profiles)
+            if not matched:
+                profiles = self.service.directory("Buyer" if user_type == "farmer" else "Farmer")
+            price_stats = self.directory_price_stats(self.listed_products(profiles, own_products))
+            return profiles, matched, price_stats, distances()
+        
+        self.directory_task = self.tasks.submit(
+            run,
+            on_done=lambda found: self.show_directory(*found, radius, sort),
+            on_error=self.show_task_error
+        )
     
-    def find_farmers(self):
-        """Display list of farmers for buyers to connect with"""
-        self.clear_content_frame()
+    def cancel_directory_load(self):
+        """Drop a directory load or listing search still in flight so its results are never shown"""
+        if self.directory_task is not None:
+            self.directory_task.cancel()
+            self.directory_task = None
+    
+    def own_products(self):
+        """Copy of a farmer's listings, which their directory rows offer; None for a buyer"""
+        return list(self.current_user['products']) if self.user_type == "farmer" else None
+    
+    @staticmethod
+    def listed_products(profiles, own_products):
+        """Products the directory rows list: the farmer's own, else each farmer's listings"""
+        if own_products is not None:
+            return own_products
+        return [product for profile in profiles for product in profile['products']]
+    
+    def directory_price_stats(self, products):
+        """Price statistics for products the directory rows will list
+        
+        Fetched on the worker thread together with the profiles, so rows
+        recycled while scrolling only read the result.
+        """
+        names = {product['name'] for product in products}
+        return self.service.price_stats(names) if names else {}
+    
+    def counterparty_distances(self, user_type, user, radius):
+        """Map counterparties within radius to their distance in km, None if the user cannot be located"""
+        if self.service.locate(user['location']) is None:
+            return None
+        return {profile['username']: distance for distance, profile in
+                self.service.nearby_counterparties(user_type, user, radius)}
+    
+    def show_directory(self, profiles, matched, price_stats, distances, radius, sort):
+        """Show the best matches, or everyone when nothing matches"""
+        self.directory_task = None
+        self.listing_hits = None
+        self.row_price_stats = price_stats
+        if self.user_type == "farmer":
+            counterparty_type, basis = "buyers", "your products"
+        else:
+            counterparty_type, basis = "farmers", "your interests"
         
-        if not self.farmers:
-            ttk.Label(
-                self.content_frame, 
-                text="No farmers registered yet",
-                style='TLabel'
-            ).pack()
+        if matched:
+            caption = f"Top {len(profiles)} {counterparty_type} matching {basis}"
+        else:
+            caption = f"All registered {counterparty_type}"
+        self.show_within(profiles, caption, distances, radius, sort)
+    
+    def show_listings(self, listings, price_stats, distances, radius, sort):
+        """Show the farmers behind a finished listing search"""
+        self.directory_task = None
+        self.row_price_stats = price_stats
+        profiles = self.group_listings(listings)
+        if len(listings) == self.LISTING_RESULTS:
+            caption = f"The {len(listings)} cheapest matching listings, from {len(profiles)} farmers"
+        else:
+            caption = f"{len(listings)} listings from {len(profiles)} farmers match your search"
+        self.show_within(profiles, caption, distances, radius, sort)
+    
+    def show_within(self, profiles, caption, distances, radius, sort):
+        """Apply the distance controls, then show the profiles"""
+        self.row_distances = distances or {}
+        if radius is not None or sort:
+            profiles, caption = self.apply_distance(profiles, caption, distances, radius, sort)
+        self.show_counterparties(profiles, caption)
+    
+    def show_counterparties(self, profiles, caption):
+        """Fill the directory list, or show the empty message"""
+        self.counterparty_caption.configure(text=caption)
+        
+        if not profiles:
+            self.counterparty_list.pack_forget()
+            self.no_counterparties_label.pack()
             return
-            
-        for farmer in self.farmers:
-            farmer_frame = ttk.LabelFrame(
-                self.content_frame, 
-                text=farmer['name'],
-                padding=10
+        
+        self.no_counterparties_label.pack_forget()
+        self.counterparty_list.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.counterparty_list.set_items(profiles)
+    
+    def group_listings(self, listings):
+        """Collect search hits per farmer, returning the farmers in result order"""
+        self.listing_hits = {}
+        farmers = []
+        for farmer, product in listings:
+            key = farmer['username']
+            if key not in self.listing_hits:
+                self.listing_hits[key] = []
+                farmers.append(farmer)
+            self.listing_hits[key].append(product)
+        return farmers
+    
+    @staticmethod
+    def apply_distance(profiles, caption, distances, radius, sort):
+        """Limit profiles to the distance filter and order them nearest first if asked"""
+        if distances is None:
+            return profiles, f"{caption} (your location is not in the gazetteer, so distances are unknown)"
+        
+        if radius is not None:
+            profiles = [profile for profile in profiles if profile['username'] in distances]
+            caption += f", {len(profiles)} within {radius:g} km"
+        if sort:
+            profiles = sorted(profiles, key=lambda profile: distances.get(profile['username'], math.inf))
+            caption += ", nearest first"
+        return profiles, caption
+    
+    def make_counterparty_row(self, parent):
+        """Build one reusable counterparty card"""
+        frame = ttk.LabelFrame(parent, padding=10)
+        contact = ttk.Label(frame, style='TLabel')
+        contact.pack(anchor=tk.W)
+        products = ttk.Label(frame, style='TLabel', wraplength=900)
+        products.pack(anchor=tk.W)
+        button = ttk.Button(frame, text="Propose Contract", style='Accent.TButton')
+        button.pack(pady=5)
+        return {'frame': frame, 'contact': contact, 'products': products, 'button': button}
+    
+    def fill_counterparty_row(self, row, profile):
+        """Show a farmer or buyer in a recycled counterparty card"""
+        row['frame'].configure(text=profile['name'])
+        contact_text = f"Contact: {profile['contact']} | Location: {profile['location']}"
+        if profile['username'] in self.row_distances:
+            contact_text += f" ({self.row_distances[profile['username']]:.0f} km away)"
+        
+        # Farmers offer their own products, the buyer's interests first
+        if self.user_type == "farmer":
+            interests = set(profile['interests'])
+            products = sorted(self.current_user['products'], key=lambda p: p['name'] not in interests)
+            if interests:
+                contact_text += f" | Interested in: {', '.join(profile['interests'])}"
+        elif self.listing_hits is not None:
+            products = self.listing_hits[profile['username']]
+        else:
+            products = profile['products']
+        row['contact'].configure(text=contact_text)
+        if products:
+            product_text = "; ".join(self.price_label(p, self.row_price_stats.get(p['name'])) for p in products)
+            row['products'].configure(text=f"Available Products: {product_text}")
+            row['button'].configure(command=lambda c=profile: self.propose_contract(c))
+            row['button'].state(['!disabled'])
+        else:
+            row['products'].configure(
+                text="No products available to offer" if self.user_type == "farmer" else "No products available"
             )
-            farmer_frame.pack(fill=tk.X, padx=5, pady=5)
-            
-            ttk.Label(
-                farmer_frame, 
-                text=f"Contact: {farmer['contact']} | Location: {farmer['location']}",
-                style='TLabel'
-            ).pack(anchor=tk.W)
-            
-            if farmer['products']:
-                ttk.Label(
-                    farmer_frame, 
-                    text="Available Products:",
-                    style='Header.TLabel'
-                ).pack(anchor=tk.W)
-                
-                for product in farmer['products']:
-                    product_text = f"{product['name']} - {product['quantity']} kg - ₹{product['price']}/kg"
-                    ttk.Label(
-                        farmer_frame, 
-                        text=product_text,
-                        style='TLabel'
-                    ).pack(anchor=tk.W)
-                
-                ttk.Button(
-                    farmer_frame, 
-                    text="Propose Contract", 
-                    command=lambda f=farmer: self.propose_contract(f),
-                    style='Accent.TButton'
-                ).pack(pady=5)
-            else:
-                ttk.Label(
-                    farmer_frame, 
-                    text="No products available",
-                    style='TLabel'
-                ).pack()
+            row['button'].state(['disabled'])
     
     def propose_contract(self, counterparty):
         """Show contract proposal form"""
-        self.clear_content_frame()
-        
+        self.proposal_counterparty = counterparty
+        self.views.show('proposal', self.build_contract_proposal, refresh=True)
+    
+    def build_contract_proposal(self, frame):
+        """Build the contract proposal form"""
         contract_frame = ttk.LabelFrame(
-            self.content_frame, 
+            frame, 
             text=" Contract Proposal ",
             padding=15
         )
         contract_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
         # Counterparty info
-        ttk.Label(
+        self.proposal_header = ttk.Label(
             contract_frame, 
-            text=f"Contract with: {counterparty['name']} ({'Buyer' if self.user_type == 'farmer' else 'Farmer'})",
             style='Header.TLabel'
-        ).grid(row=0, column=0, columnspan=2, pady=5, sticky="w")
+        )
+        self.proposal_header.grid(row=0, column=0, columnspan=2, pady=5, sticky="w")
+        
+        self.no_proposal_products = ttk.Label(
+            contract_frame, 
+            text="No products available for contract",
+            style='TLabel'
+        )
+        self.no_proposal_products.grid(row=1, column=0, columnspan=2)
         
         # Product selection
-        products = self.current_user['products'] if self.user_type == "farmer" else counterparty['products']
+        self.proposal_form = ttk.Frame(contract_frame)
+        self.proposal_form.grid(row=1, column=0, columnspan=2, sticky="nsew")
         
-        if not products:
-            ttk.Label(
-                contract_frame, 
-                text="No products available for contract",
-                style='TLabel'
-            ).grid(row=1, column=0, columnspan=2)
-            return
-            
-        ttk.Label(contract_frame, text="Select Product:").grid(row=1, column=0, sticky="w", pady=5)
-        self.contract_product = ttk.Combobox(
-            contract_frame, 
-            state="readonly",
-            values=[f"{p['name']} - {p['quantity']} kg" for p in products]
+        ttk.Label(self.proposal_form, text="Select Product:").grid(row=1, column=0, sticky="w", pady=5)
+        self.contract_product = AutocompleteCombobox(
+            self.proposal_form, 
+            self.complete_proposal_products
         )
         self.contract_product.grid(row=1, column=1, sticky="ew", pady=5)
         
@@ -633,16 +1776,16 @@ class ContractFarmingPlatform:
         fields = [
             ("Quantity (kg):", "contract_quantity"),
             ("Price per kg (₹):", "contract_price"),
-            ("Delivery Date:", "contract_delivery"),
+            ("Delivery Date (YYYY-MM-DD):", "contract_delivery"),
             ("Payment Terms:", "contract_payment")
         ]
         
         for i, (label, attr) in enumerate(fields, start=2):
-            ttk.Label(contract_frame, text=label).grid(row=i, column=0, sticky="w", pady=5)
+            ttk.Label(self.proposal_form, text=label).grid(row=i, column=0, sticky="w", pady=5)
             
             if label == "Payment Terms:":
                 widget = ttk.Combobox(
-                    contract_frame, 
+                    self.proposal_form, 
                     values=[
                         "50% advance, 50% on delivery", 
                         "100% on delivery", 
@@ -651,106 +1794,121 @@ class ContractFarmingPlatform:
                     state="readonly"
                 )
             else:
-                widget = ttk.Entry(contract_frame)
+                widget = ttk.Entry(self.proposal_form)
                 
             widget.grid(row=i, column=1, sticky="ew", pady=5)
             setattr(self, attr, widget)
         
         contract_frame.columnconfigure(1, weight=1)
+        self.proposal_form.columnconfigure(1, weight=1)
         
-        ttk.Button(
-            contract_frame, 
+        self.proposal_submit = ttk.Button(
+            self.proposal_form, 
             text="Submit Proposal", 
-            command=lambda: self.create_contract(counterparty),
+            command=lambda: self.create_contract(self.proposal_counterparty),
             style='Accent.TButton'
-        ).grid(row=len(fields)+2, column=1, pady=10, sticky="e")
+        )
+        self.proposal_submit.grid(row=len(fields)+2, column=1, pady=10, sticky="e")
+        
+        return self.refresh_contract_proposal
+    
+    def refresh_contract_proposal(self, changes=None):
+        """Reset the proposal form for the selected counterparty"""
+        counterparty = self.proposal_counterparty
+        self.proposal_header.configure(
+            text=f"Contract with: {counterparty['name']} ({'Buyer' if self.user_type == 'farmer' else 'Farmer'})"
+        )
+        
+        products = self.current_user['products'] if self.user_type == "farmer" else counterparty['products']
+        
+        if not products:
+            self.proposal_form.grid_remove()
+            self.no_proposal_products.grid()
+            return
+        
+        self.no_proposal_products.grid_remove()
+        self.proposal_form.grid()
+        self.proposal_products = {
+            f"{p['name']} - {p['quantity']} kg - ₹{p['price']}/kg (#{p['id']})": p for p in products
+        }
+        self.contract_product.reset()
+        self.contract_payment.set("")
+        for entry in (self.contract_quantity, self.contract_price, self.contract_delivery):
+            entry.delete(0, tk.END)
+    
+    def complete_proposal_products(self, text, limit):
+        """Listings on the proposal form whose label contains the typed text"""
+        text = text.strip().casefold()
+        return list(itertools.islice((label for label in self.proposal_products if text in label.casefold()), limit))
     
     def create_contract(self, counterparty):
         """Create a new contract agreement"""
         try:
             # Get selected product
-            product_idx = self.contract_product.current()
-            if product_idx == -1:
+            product = self.proposal_products.get(self.contract_product.get())
+            if product is None:
                 raise ValueError("Please select a product")
-                
-            # Get product details
-            if self.user_type == "farmer":
-                product = self.current_user['products'][product_idx]
-            else:
-                product = counterparty['products'][product_idx]
             
-            # Validate contract details
-            quantity = float(self.contract_quantity.get())
-            price = float(self.contract_price.get())
-            delivery_date = self.contract_delivery.get()
-            payment_terms = self.contract_payment.get()
-            
-            if quantity <= 0 or price <= 0:
-                raise ValueError("Quantity and price must be positive numbers")
-                
-            if not delivery_date or not payment_terms:
-                raise ValueError("All fields are required")
-                
-            if quantity > product['quantity']:
-                raise ValueError(f"Quantity cannot exceed available {product['quantity']} kg")
+            terms = {
+                'quantity': float(self.contract_quantity.get()),
+                'price': float(self.contract_price.get()),
+                'delivery_date': self.contract_delivery.get(),
+                'payment_terms': self.contract_payment.get()
+            }
                 
         except ValueError as e:
             self.show_notification(f"Invalid input: {str(e)}", "error")
             return
-            
-        # Create contract
-        contract = {
-            'id': len(self.contracts) + 1,
-            'farmer': self.current_user['username'] if self.user_type == "farmer" else counterparty['username'],
-            'buyer': counterparty['username'] if self.user_type == "farmer" else self.current_user['username'],
-            'product': product['name'],
-            'quantity': quantity,
-            'price': price,
-            'total_value': quantity * price,
-            'delivery_date': delivery_date,
-            'payment_terms': payment_terms,
-            'status': 'Pending',
-            'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'updated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
         
-        self.contracts.append(contract)
+        self.set_pending(self.proposal_submit, "Submitting…")
+        self.tasks.submit(
+            self.store_contract, self.user_type, self.current_user, counterparty, product, terms,
+            on_done=self.contract_created,
+            on_error=lambda e: self.task_failed(self.proposal_submit, e, "Invalid input")
+        )
+    
+    def store_contract(self, user_type, user, counterparty, product, terms):
+        """Create and commit a contract; runs on a worker thread"""
+        contract = self.service.create_contract(user_type, user, counterparty, product, **terms)
+        self.service.flush()
+        return contract
+    
+    def contract_created(self, contract):
+        """Show the new contract once it has been stored"""
+        self.set_pending(self.proposal_submit)
+        self.contracts_changed(contract['id'])
         self.show_notification("Contract proposal created successfully!", "success")
         self.show_my_contracts()
     
     def show_my_contracts(self):
         """Display user's contracts"""
-        self.clear_content_frame()
-        
+        self.views.show('contracts', self.build_my_contracts, topics=('contracts',))
+    
+    def build_my_contracts(self, frame):
+        """Build the contracts table and its actions"""
         contracts_frame = ttk.LabelFrame(
-            self.content_frame, 
+            frame, 
             text=" My Contracts ",
             padding=10
         )
         contracts_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        # Get user's contracts
-        if self.user_type == "farmer":
-            user_contracts = [c for c in self.contracts if c['farmer'] == self.current_user['username']]
-        else:
-            user_contracts = [c for c in self.contracts if c['buyer'] == self.current_user['username']]
+        self.no_contracts_label = ttk.Label(
+            contracts_frame, 
+            text="No contracts found",
+            style='TLabel'
+        )
+        self.contracts_table = ttk.Frame(contracts_frame)
         
-        if not user_contracts:
-            ttk.Label(
-                contracts_frame, 
-                text="No contracts found",
-                style='TLabel'
-            ).pack()
-            return
-            
         # Create treeview
         columns = ("id", "product", "quantity", "price", "total", "status", "counterparty", "delivery")
         tree = ttk.Treeview(
-            contracts_frame, 
+            self.contracts_table, 
             columns=columns, 
             show="headings",
-            selectmode="browse"
+            selectmode="extended"
         )
+        self.contracts_tree = tree
         
         # Configure columns
         tree.heading("id", text="ID")
@@ -771,31 +1929,18 @@ class ContractFarmingPlatform:
         tree.column("counterparty", width=120)
         tree.column("delivery", width=100)
         
-        # Add data
-        for contract in user_contracts:
-            counterparty = contract['buyer'] if self.user_type == "farmer" else contract['farmer']
-            tree.insert("", tk.END, values=(
-                contract['id'],
-                contract['product'],
-                contract['quantity'],
-                f"₹{contract['price']}",
-                f"₹{contract['total_value']}",
-                contract['status'],
-                counterparty,
-                contract['delivery_date']
-            ), tags=(contract['status'],))
-            
-            # Configure tag colors for status
-            tree.tag_configure(contract['status'], foreground=self.status_colors.get(contract['status'], 'black'))
+        # Configure tag colors for status
+        for status, color in self.status_colors.items():
+            tree.tag_configure(status, foreground=color)
         
         # Add scrollbar
-        scrollbar = ttk.Scrollbar(contracts_frame, orient=tk.VERTICAL, command=tree.yview)
+        scrollbar = ttk.Scrollbar(self.contracts_table, orient=tk.VERTICAL, command=tree.yview)
         tree.configure(yscroll=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         tree.pack(fill=tk.BOTH, expand=True)
         
         # Action buttons
-        action_frame = ttk.Frame(contracts_frame)
+        action_frame = ttk.Frame(self.contracts_table)
         action_frame.pack(fill=tk.X, pady=10)
         
         ttk.Button(
@@ -833,6 +1978,156 @@ class ContractFarmingPlatform:
                 command=lambda: self.make_payment(tree),
                 style='Accent.TButton'
             ).pack(side=tk.LEFT, padx=5)
+        
+        return self.refresh_my_contracts
+    
+    def refresh_my_contracts(self, changes=None):
+        """Sync the contracts table, touching only the rows that changed"""
+        tree = self.contracts_tree
+        if changes is None:
+            tree.delete(*tree.get_children())
+            self.contract_items = {}
+            self.contract_versions = {}
+            for contract in self.service.contracts_for(self.user_type, self.current_user['username']):
+                self.contract_items[contract['id']] = tree.insert(
+                    "", tk.END, values=self.contract_row(contract), tags=(contract['status'],)
+                )
+                self.contract_versions[contract['id']] = contract['version']
+        else:
+            party = 'farmer' if self.user_type == "farmer" else 'buyer'
+            changes = sorted(changes)
+            for contract_id, contract in zip(changes, self.service.get_contracts(changes)):
+                item = self.contract_items.get(contract_id)
+                if contract is None or contract[party] != self.current_user['username']:
+                    if item is not None:
+                        tree.delete(item)
+                        del self.contract_items[contract_id]
+                        del self.contract_versions[contract_id]
+                    continue
+                if item is not None:
+                    tree.item(item, values=self.contract_row(contract), tags=(contract['status'],))
+                else:
+                    self.contract_items[contract_id] = tree.insert(
+                        "", tk.END, values=self.contract_row(contract), tags=(contract['status'],)
+                    )
+                self.contract_versions[contract_id] = contract['version']
+        
+        if not self.contract_items:
+            self.contracts_table.pack_forget()
+            self.no_contracts_label.pack()
+        else:
+            self.no_contracts_label.pack_forget()
+            self.contracts_table.pack(fill=tk.BOTH, expand=True)
+    
+    def contract_row(self, contract):
+        """Format a contract as a contracts table row"""
+        counterparty = contract['buyer'] if self.user_type == "farmer" else contract['farmer']
+        return (
+            contract['id'],
+            contract['product'],
+            contract['quantity'],
+            f"₹{contract['price']}",
+            f"₹{contract['total_value']}",
+            contract['status'],
+            counterparty,
+            contract['delivery_date']
+        )
+    
+    def show_upcoming_deliveries(self):
+        """Display open contracts due for delivery soon"""
+        self.views.show('deliveries', self.build_upcoming_deliveries, topics=('contracts',))
+    
+    def build_upcoming_deliveries(self, frame):
+        """Build the upcoming deliveries table and its window selector"""
+        deliveries_frame = ttk.LabelFrame(
+            frame, 
+            text=" Upcoming Deliveries ",
+            padding=10
+        )
+        deliveries_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        window_frame = ttk.Frame(deliveries_frame)
+        window_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Label(window_frame, text="Due within:").pack(side=tk.LEFT)
+        self.delivery_window = ttk.Combobox(
+            window_frame, 
+            values=self.DELIVERY_WINDOWS, 
+            state="readonly",
+            width=5
+        )
+        self.delivery_window.set("14")
+        self.delivery_window.pack(side=tk.LEFT, padx=5)
+        self.delivery_window.bind("<<ComboboxSelected>>", lambda e: self.refresh_upcoming_deliveries())
+        ttk.Label(window_frame, text="days").pack(side=tk.LEFT)
+        
+        self.no_deliveries_label = ttk.Label(deliveries_frame, text="No deliveries due in this period")
+        self.deliveries_table = ttk.Frame(deliveries_frame)
+        
+        columns = ("delivery", "due", "id", "product", "quantity", "counterparty", "status")
+        tree = ttk.Treeview(
+            self.deliveries_table, 
+            columns=columns, 
+            show="headings",
+            selectmode="browse"
+        )
+        self.deliveries_tree = tree
+        
+        tree.heading("delivery", text="Delivery Date")
+        tree.heading("due", text="Due")
+        tree.heading("id", text="ID")
+        tree.heading("product", text="Product")
+        tree.heading("quantity", text="Qty (kg)")
+        tree.heading("counterparty", text="Counterparty")
+        tree.heading("status", text="Status")
+        
+        tree.column("delivery", width=100)
+        tree.column("due", width=80)
+        tree.column("id", width=50, anchor=tk.CENTER)
+        tree.column("product", width=100)
+        tree.column("quantity", width=80, anchor=tk.E)
+        tree.column("counterparty", width=120)
+        tree.column("status", width=100)
+        
+        for status, color in self.status_colors.items():
+            tree.tag_configure(status, foreground=color)
+        
+        scrollbar = ttk.Scrollbar(self.deliveries_table, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscroll=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Button(
+            self.deliveries_table, 
+            text="View Details", 
+            command=lambda: self.view_contract_details(tree),
+            style='TButton'
+        ).pack(anchor="w", pady=10)
+        
+        return self.refresh_upcoming_deliveries
+    
+    def refresh_upcoming_deliveries(self, changes=None):
+        """Reload the contracts due within the selected window"""
+        tree = self.deliveries_tree
+        tree.delete(*tree.get_children())
+        today = datetime.now().date().toordinal()
+        contracts = self.service.upcoming_deliveries(
+            self.user_type, self.current_user['username'], int(self.delivery_window.get())
+        )
+        for contract in contracts:
+            days = contract.delivery_ordinal - today
+            due = "Today" if days == 0 else "Tomorrow" if days == 1 else f"In {days} days"
+            counterparty = contract['buyer'] if self.user_type == "farmer" else contract['farmer']
+            tree.insert("", tk.END, values=(
+                contract['delivery_date'], due, contract['id'], contract['product'],
+                contract['quantity'], counterparty, contract['status']
+            ), tags=(contract['status'],))
+        
+        if not contracts:
+            self.deliveries_table.pack_forget()
+            self.no_deliveries_label.pack()
+        else:
+            self.no_deliveries_label.pack_forget()
+            self.deliveries_table.pack(fill=tk.BOTH, expand=True)
     
     def view_contract_details(self, tree):
         """Show detailed view of selected contract"""
@@ -843,7 +2138,7 @@ class ContractFarmingPlatform:
             
         item = tree.item(selected)
         contract_id = item['values'][0]
-        contract = next((c for c in self.contracts if c['id'] == contract_id), None)
+        contract = self.service.get_contract(contract_id)
         
         if not contract:
             return
@@ -894,55 +2189,96 @@ class ContractFarmingPlatform:
             style='TButton'
         ).pack(pady=10)
     
+    def selected_contracts(self, tree):
+        """Return (contract id, version on screen) for every selected row"""
+        contract_ids = [tree.item(item)['values'][0] for item in tree.selection()]
+        return [(contract_id, self.contract_versions.get(contract_id)) for contract_id in contract_ids]
+    
     def update_contract_status(self, tree, status):
-        """Update the status of the selected contract"""
-        selected = tree.focus()
+        """Move every selected contract to a new status in one batch"""
+        selected = self.selected_contracts(tree)
         if not selected:
             self.show_notification("Please select a contract first", "warning")
             return
-            
-        item = tree.item(selected)
-        contract_id = item['values'][0]
-        
-        for contract in self.contracts:
-            if contract['id'] == contract_id:
-                contract['status'] = status
-                contract['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                break
         
-        self.show_my_contracts()
-        self.show_notification(f"Contract status updated to {status}", "success")
+        # Only apply the change to the versions of the contracts on screen
+        self.tasks.submit(
+            self.service.update_contract_statuses, selected, status,
+            on_done=lambda result: self.contracts_updated(status, *result),
+            on_error=lambda e: self.contracts_failed([contract_id for contract_id, _ in selected], e)
+        )
+    
+    def contracts_updated(self, status, updated, failed):
+        """Refresh the rows a batch touched and summarise it in one notification"""
+        self.contracts_changed(*[contract['id'] for contract in updated], *[contract_id for contract_id, _ in failed])
+        
+        if status == "Paid":
+            self.payments_in_flight.difference_update(contract['id'] for contract in updated)
+            self.payments_in_flight.difference_update(contract_id for contract_id, _ in failed)
+        
+        count = f"{len(updated)} contract{'s' if len(updated) != 1 else ''}"
+        done = {
+            'Accepted': f"Accepted {count}",
+            'Rejected': f"Rejected {count}",
+            'Delivered': f"Marked {count} as delivered",
+            'Paid': f"Paid ₹{sum(contract['total_value'] for contract in updated)} for {count}"
+        }[status]
+        if not failed:
+            self.show_notification(done, "success")
+        elif not updated:
+            self.show_notification(failed[0][1] if len(failed) == 1 else
+                                   f"None of {len(failed)} contracts changed: {failed[0][1]}", "error")
+        else:
+            self.show_notification(f"{done}; skipped {len(failed)}: {failed[0][1]}", "warning")
+    
+    def contracts_failed(self, contract_ids, error):
+        """Report a batch that could not be applied"""
+        self.payments_in_flight.difference_update(contract_ids)
+        self.show_task_error(error)
+        self.contracts_changed(*contract_ids)
     
     def make_payment(self, tree):
-        """Simulate payment processing for the selected contract"""
-        selected = tree.focus()
+        """Simulate payment processing for every selected contract in one batch"""
+        selected = self.selected_contracts(tree)
         if not selected:
             self.show_notification("Please select a contract first", "warning")
             return
-            
-        item = tree.item(selected)
-        contract_id = item['values'][0]
-        contract = next((c for c in self.contracts if c['id'] == contract_id), None)
         
-        if not contract:
+        selected = [(contract_id, version) for contract_id, version in selected
+                    if contract_id not in self.payments_in_flight]
+        if not selected:
+            self.show_notification("Payment is already being processed", "warning")
             return
-            
-        # Simulate payment processing
+        
+        contract_ids = [contract_id for contract_id, _ in selected]
+        self.payments_in_flight.update(contract_ids)
         self.show_notification(
-            f"Payment of ₹{contract['total_value']} processed successfully!",
-            "success"
+            f"Processing {len(selected)} payment{'s' if len(selected) != 1 else ''}…", "info"
+        )
+        self.tasks.submit(
+            self.service.make_payments, selected,
+            on_done=lambda result: self.contracts_updated("Paid", *result),
+            on_error=lambda e: self.contracts_failed(contract_ids, e)
         )
-        
-        contract['status'] = "Paid"
-        contract['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.show_my_contracts()
-    
-    def clear_content_frame(self):
-        """Clear the content frame"""
-        for widget in self.content_frame.winfo_children():
-            widget.destroy()
 
 if __name__ == "__main__":
+    # Arguments come first so --help and bad values need no display
+    parser = argparse.ArgumentParser(description="FarmConnect contract farming platform")
+    parser.add_argument('--db', default="farmconnect.db", help="SQLite file for local data")
+    parser.add_argument('--server', metavar="HOST:PORT", help="use a FarmConnect server instead of a local file")
+    parser.add_argument('--profile', action='store_true', default=bool(os.environ.get('FARMCONNECT_PROFILE')),
+                        help="time callbacks and data operations; F12 opens the debug panel")
+    parser.add_argument('--profile-output', metavar="PATH", default="farmconnect-profile.json",
+                        help="JSON file the profile is written to on exit")
+    args = parser.parse_args()
+    
+    service = None
+    if args.server:
+        host, _, port = args.server.rpartition(":")
+        if not port.isdigit():
+            parser.error(f"--server must be HOST:PORT, got {args.server!r}")
+        service = RemoteService(host or "127.0.0.1", int(port))
+    
     root = tk.Tk()
     
     # Set window icon and title
@@ -955,5 +2291,8 @@ if __name__ == "__main__":
     default_font = tkfont.nametofont("TkDefaultFont")
     default_font.configure(size=10)
     
-    app = ContractFarmingPlatform(root)
-    root.mainloop()
\ No newline at end of file
+    app = ContractFarmingPlatform(root, db_path=args.db, service=service,
+                                  metrics=Metrics() if args.profile else None)
+    if args.profile:
+        app.profile_output = args.profile_output
+    root.mainloop()
@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from farm_core import DEFAULT_PRODUCTS, Contract, FarmService, Product
+
+LOCATIONS = [
+    "Pune", "Nashik", "Nagpur", "Indore", "Bhopal", "Ludhiana", "Amritsar", "Karnal",
+    "Guntur", "Warangal", "Mysuru", "Hubli", "Coimbatore", "Madurai", "Patna", "Lucknow"
+]
+PAYMENT_TERMS = ["50% advance, 50% on delivery", "100% on delivery", "30% advance, 70% on delivery"]
+STATUS_WEIGHTS = {'Pending': 4, 'Accepted': 3, 'Rejected': 1, 'Delivered': 2, 'Paid': 2}
+# The transitions that lead from Pending to each status
+STATUS_PATHS = {'Pending': (), 'Accepted': ('Accepted',), 'Rejected': ('Rejected',),
+                'Delivered': ('Accepted', 'Delivered'), 'Paid': ('Accepted', 'Delivered', 'Paid')}
+
+class DatasetGenerator:
+    """Seeded synthetic farmers, buyers, products and contracts"""
+    def __init__(self, seed=42):
+        self.rng = random.Random(seed)
+        self.farmers = []
+        self.buyers = []
+        self.credentials = None
+    
+    def contact(self):
+        return "".join(self.rng.choice("0123456789") for _ in range(10))
+    
+    def harvest_date(self):
+        return (date(2025, 1, 1) + timedelta(days=self.rng.randrange(365))).isoformat()
+    
+    def populate(self, service, farmers, products_per_farmer, buyers, contracts):
+        """Register users, list products and propose contracts through the service"""
+        # Derive the shared password hash once; per-user key derivation would dominate setup.
+        # Login benchmarks clear the verification cache so the shared hash is not a cache hit
+        if self.credentials is None:
+            self.credentials = service.hasher.hash("password")
+        for i in range(len(self.farmers), farmers):
+            farmer = service.register(
+                "Farmer", f"Farmer {i}", self.contact(), self.rng.choice(LOCATIONS),
+                f"farmer{i}", "password", credentials=self.credentials
+            )
+            for name in self.rng.sample(DEFAULT_PRODUCTS, min(products_per_farmer, len(DEFAULT_PRODUCTS))):
+                service.add_product(
+                    farmer, name,
+                    quantity=float(self.rng.randrange(100, 5000, 50)),
+                    price=float(self.rng.randrange(10, 80)),
+                    harvest_date=self.harvest_date()
+                )
+            self.farmers.append(farmer)
+            
+        for i in range(len(self.buyers), buyers):
+            self.buyers.append(service.register(
+                "Buyer", f"Buyer {i}", self.contact(), self.rng.choice(LOCATIONS),
+                f"buyer{i}", "password", interests=self.rng.sample(DEFAULT_PRODUCTS, 3),
+                credentials=self.credentials
+            ))
+            
+        statuses = list(STATUS_WEIGHTS)
+        weights = list(STATUS_WEIGHTS.values())
+        for _ in range(len(service.contracts), contracts):
+            farmer = self.rng.choice(self.farmers)
+            if not farmer['products']:
+                continue
+            product = self.rng.choice(farmer['products'])
+            contract = service.create_contract(
+                "buyer", self.rng.choice(self.buyers), farmer, product,
+                quantity=float(self.rng.randrange(1, int(product['quantity']) + 1)),
+                price=product['price'],
+                delivery_date=self.harvest_date(),
+                payment_terms=self.rng.choice(PAYMENT_TERMS)
+            )
+            for status in STATUS_PATHS[self.rng.choices(statuses, weights)[0]]:
+                service.update_contract_status(contract['id'], status)
+
+def measure(operation, repeat):
+    """Run operation repeat times and summarise the timings in milliseconds"""
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        operation(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'runs': repeat,
+        'mean_ms': statistics.fmean(timings),
+        'median_ms': statistics.median(timings),
+        'p95_ms': timings[min(repeat - 1, int(repeat * 0.95))],
+        'min_ms': timings[0],
+        'max_ms': timings[-1]
+    }
+
+def core_operations(service, generator, scale):
+    """Headless timings of each user-facing operation's data path"""
+    rng = random.Random(scale)
+    farmer = generator.farmers[0]
+    buyer = generator.buyers[0]
+    product = farmer['products'][0]
+    pending = [contract['id'] for contract in service.contracts if contract['status'] == 'Pending']
+    
+    def login(i):
+        service.hasher.clear_cache()
+        return service.login("Farmer", f"farmer{rng.randrange(scale)}", "password")
+    
+    def create_contract(i):
+        return service.create_contract("buyer", buyer, farmer, product, 1.0, product['price'], "2025-12-01",
+                                       PAYMENT_TERMS[0])
+    
+    def accept_contract(i):
+        # Only a Pending contract can be accepted, so each run takes a fresh one
+        contract_id = pending.pop() if pending else create_contract(i)['id']
+        service.update_contract_status(contract_id, 'Accepted')
+        
+    return {
+        'login': login,
+        'register': lambda i: service.register(
+            "Buyer", "Bench Buyer", "9876543210", "Pune", f"bench{scale}_{i}", "password"
+        ),
+        'find_farmers': lambda i: service.match_counterparties("buyer", rng.choice(generator.buyers)),
+        'find_buyers': lambda i: service.match_counterparties("farmer", rng.choice(generator.farmers)),
+        'search_listings': lambda i: service.search_listings(
+            product=rng.choice(DEFAULT_PRODUCTS), min_quantity=500.0, max_price=40.0
+        ),
+        'show_my_contracts': lambda i: service.contracts_for("farmer", rng.choice(generator.farmers)['username']),
+        'contract_summary': lambda i: service.contract_summary("buyer", rng.choice(generator.buyers)['username']),
+        'create_contract': create_contract,
+        'update_contract_status': accept_contract
+    }
+
+def record_memory(service, sample=10000):
+    """Bytes per product and contract as plain dicts versus compact records"""
+    products = [product for farmer in service.users.farmers for product in farmer['products']][:sample]
+    contracts = list(service.contracts)[:sample]
+    report = {}
+    for kind, record_type, records in (('product', Product, products), ('contract', Contract, contracts)):
+        if not records:
+            continue
+        tracemalloc.start()
+        rows = [record.as_dict() for record in records]
+        dict_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        copies = [record_type(**row) for row in rows]
+        record_bytes = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        del rows, copies
+        report[kind] = {
+            'records': len(records),
+            'dict_bytes': dict_bytes / len(records),
+            'record_bytes': record_bytes / len(records),
+            'reduction': 1 - record_bytes / dict_bytes
+        }
+    return report
+
+def start_virtual_display():
+    """Start Xvfb when no display is available; returns the process or None"""
+    if os.environ.get('DISPLAY'):
+        return None
+    if not shutil.which('Xvfb'):
+        raise RuntimeError("no DISPLAY and Xvfb is not installed")
+    process = subprocess.Popen(['Xvfb', ':99', '-screen', '0', '1280x1024x24'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = ':99'
+    time.sleep(0.5)
+    return process
+
+def ui_operations(app, generator, scale):
+    """Widget-building timings through ContractFarmingPlatform itself"""
+    rng = random.Random(scale)
+    root = app.root
+    
+    def wait_for_tasks():
+        while app.tasks.pending:
+            root.update()
+            time.sleep(0.001)
+    
+    # Screens load their data in the background, so each view waits for it to be shown
+    def session(user_type, user):
+        app.current_user = user
+        app.user_type = user_type
+        app.show_dashboard()
+        wait_for_tasks()
+        root.update()
+    
+    def as_buyer(view):
+        def run(i):
+            session("buyer", rng.choice(generator.buyers))
+            view()
+            wait_for_tasks()
+            root.update()
+        return run
+    
+    def as_farmer(view):
+        def run(i):
+            session("farmer", rng.choice(generator.farmers))
+            view()
+            wait_for_tasks()
+            root.update()
+        return run
+    
+    def login(i):
+        app.service.hasher.clear_cache()
+        app.show_login_screen()
+        app.user_type_var.set("Farmer")
+        app.username_entry.insert(0, f"farmer{rng.randrange(scale)}")
+        app.password_entry.insert(0, "password")
+        app.login()
+        wait_for_tasks()
+        root.update()
+    
+    def register(i):
+        app.show_login_screen()
+        app.user_type_var.set("Buyer")
+        for entry, value in ((app.reg_name, "UI Buyer"), (app.reg_contact, "9876543210"),
+                             (app.reg_location, "Pune"), (app.reg_username, f"ui{scale}_{i}"),
+                             (app.reg_password, "password")):
+            entry.insert(0, value)
+        app.register()
+        wait_for_tasks()
+        root.update()
+    
+    def create_contract(i):
+        session("buyer", generator.buyers[0])
+        app.propose_contract(generator.farmers[0])
+        app.contract_product.set(next(iter(app.proposal_products)))
+        app.contract_quantity.insert(0, "1")
+        app.contract_price.insert(0, "10")
+        app.contract_delivery.insert(0, "2025-12-01")
+        app.contract_payment.current(0)
+        app.create_contract(generator.farmers[0])
+        wait_for_tasks()
+        root.update()
+        
+    return {
+        'ui_login': login,
+        'ui_register': register,
+        'ui_find_farmers': as_buyer(app.find_farmers),
+        'ui_find_buyers': as_farmer(app.find_buyers),
+        'ui_show_my_contracts': as_farmer(app.show_my_contracts),
+        'ui_create_contract': create_contract
+    }
+
+def run(args):
+    service = FarmService(args.db)
+    generator = DatasetGenerator(args.seed)
+    app = None
+    display = None
+    if args.ui:
+        display = start_virtual_display()
+        import tkinter as tk
+        from T027 import ContractFarmingPlatform
+        root = tk.Tk()
+        app = ContractFarmingPlatform(root, service=service)
+        # Keep toasts from piling up between timed runs
+        app.notifications.duration_ms = 0
+        
+    results = []
+    try:
+        for scale in args.scales:
+            populate_start = time.perf_counter()
+            generator.populate(
+                service, scale, args.products_per_farmer,
+                max(1, int(scale * args.buyer_ratio)), int(scale * args.contracts_per_farmer)
+            )
+            service.flush()
+            print(f"scale {scale}: dataset ready in {time.perf_counter() - populate_start:.2f}s")
+            
+            memory = record_memory(service)
+            for kind, usage in memory.items():
+                results.append({'scale': scale, 'operation': f"{kind}_memory", **usage})
+                print(f"  {kind + ' record':<24} {usage['record_bytes']:7.0f} B vs {usage['dict_bytes']:7.0f} B "
+                      f"as dict ({usage['reduction']:.0%} smaller)")
+            
+            operations = core_operations(service, generator, scale)
+            if app:
+                operations.update(ui_operations(app, generator, scale))
+            for name, operation in operations.items():
+                summary = measure(operation, args.repeat)
+                results.append({'scale': scale, 'operation': name, **summary})
+                print(f"  {name:<24} median {summary['median_ms']:9.3f} ms   p95 {summary['p95_ms']:9.3f} ms")
+                service.flush()
+    finally:
+        if app:
+            app.root.destroy()
+        if display:
+            display.terminate()
+        service.close()
+        
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'products_per_farmer': args.products_per_farmer,
+            'buyer_ratio': args.buyer_ratio,
+            'contracts_per_farmer': args.contracts_per_farmer,
+            'repeat': args.repeat,
+            'db': args.db,
+            'ui': args.ui
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FarmConnect operations over synthetic data")
+    parser.add_argument('--scales', type=lambda s: [int(n) for n in s.split(",")], default=[100, 1000, 10000],
+                        help="comma-separated farmer counts, grown in order (default: 100,1000,10000)")
+    parser.add_argument('--products-per-farmer', type=int, default=3)
+    parser.add_argument('--buyer-ratio', type=float, default=1.0, help="buyers per farmer")
+    parser.add_argument('--contracts-per-farmer', type=float, default=5.0)
+    parser.add_argument('--repeat', type=int, default=20, help="timed runs per operation")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', default=None, help="SQLite file to benchmark against (default: in memory)")
+    parser.add_argument('--ui', action='store_true', help="also time widget-building paths (uses Xvfb if needed)")
+    parser.add_argument('--output', default="bench_results.json")
+    try:
+        run(parser.parse_args())
+    except RuntimeError as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2031 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+import bisect
+import csv
+import functools
+import hashlib
+import heapq
+import itertools
+import hmac
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+DEFAULT_PRODUCTS = [
+    "Wheat", "Rice", "Corn", "Soybeans", 
+    "Potatoes", "Tomatoes", "Cotton", "Coffee"
+]
+
+class ConflictError(ValueError):
+    """A record changed since the caller last read it"""
+
+def synchronized(method):
+    """Run a FarmService method while holding the service lock"""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+class PasswordHasher:
+    """Salted key derivation for passwords, with a cache of recent verifications
+    
+    Uses scrypt where the interpreter provides it and PBKDF2-SHA256
+    otherwise. Hashing and verification hold no shared state besides a
+    locked cache, so they can run on worker threads.
+    """
+    SCRYPT_PARAMS = {'n': 2 ** 14, 'r': 8, 'p': 1}
+    PBKDF2_PARAMS = {'iterations': 600000}
+    
+    def __init__(self, algorithm=None, cache_size=256):
+        self.algorithm = algorithm or ('scrypt' if hasattr(hashlib, 'scrypt') else 'pbkdf2_sha256')
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._secret = os.urandom(32)
+    
+    def hash(self, password, salt=None):
+        """Derive credentials for a new password"""
+        params = dict(self.SCRYPT_PARAMS if self.algorithm == 'scrypt' else self.PBKDF2_PARAMS)
+        salt = salt or os.urandom(16)
+        return {
+            'algorithm': self.algorithm,
+            'params': params,
+            'salt': salt.hex(),
+            'hash': self._derive(self.algorithm, params, password, salt).hex()
+        }
+    
+    @staticmethod
+    def _derive(algorithm, params, password, salt):
+        if algorithm == 'scrypt':
+            return hashlib.scrypt(password.encode(), salt=salt, n=params['n'], r=params['r'], p=params['p'],
+                                  maxmem=256 * params['n'] * params['r'], dklen=32)
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, params['iterations'])
+    
+    def verify(self, credentials, password):
+        """Check a password against stored credentials"""
+        if credentials['algorithm'] == 'plain':
+            return hmac.compare_digest(credentials['hash'].encode(), password.encode())
+        
+        # Remember successful checks by a keyed digest, never the password itself
+        key = (credentials['hash'], hmac.new(self._secret, password.encode(), 'sha256').digest())
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return True
+        
+        derived = self._derive(credentials['algorithm'], credentials['params'], password,
+                               bytes.fromhex(credentials['salt']))
+        if not hmac.compare_digest(derived.hex(), credentials['hash']):
+            return False
+        with self._lock:
+            self._cache[key] = True
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return True
+    
+    def clear_cache(self):
+        """Forget remembered verifications, so the next check derives the key again"""
+        with self._lock:
+            self._cache.clear()
+    
+    def needs_rehash(self, credentials):
+        """Whether credentials predate the current algorithm or parameters"""
+        if credentials['algorithm'] != self.algorithm:
+            return True
+        return credentials['params'] != (self.SCRYPT_PARAMS if self.algorithm == 'scrypt' else self.PBKDF2_PARAMS)
+    
+    @staticmethod
+    def encode(credentials):
+        """Serialise credentials as algorithm$params$salt$hash"""
+        params = ",".join(f"{k}={v}" for k, v in credentials['params'].items())
+        return f"{credentials['algorithm']}${params}${credentials['salt']}${credentials['hash']}"
+    
+    @staticmethod
+    def decode(encoded):
+        """Parse stored credentials; anything unrecognised is a legacy plaintext password"""
+        parts = encoded.split("$")
+        if len(parts) == 4 and parts[0] in ('scrypt', 'pbkdf2_sha256'):
+            params = {k: int(v) for k, v in (item.split("=") for item in parts[1].split(",") if item)}
+            return {'algorithm': parts[0], 'params': params, 'salt': parts[2], 'hash': parts[3]}
+        return {'algorithm': 'plain', 'params': {}, 'salt': '', 'hash': encoded}
+
+class Record:
+    """Compact record stored in __slots__ with a dict-style accessor
+    
+    Subclasses keep their stored attributes in __slots__ and list the
+    public fields, including derived or decoded properties, in FIELDS.
+    record['field'] works as it did when records were plain dicts.
+    """
+    __slots__ = ()
+    FIELDS = ()
+    DATE_FORMAT = "%Y-%m-%d"
+    TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+    EPOCH = datetime(1970, 1, 1)
+    
+    def __getitem__(self, field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+    
+    def __setitem__(self, field, value):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+    
+    def __contains__(self, field):
+        return field in self.FIELDS
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()!r})"
+    
+    def get(self, field, default=None):
+        """Return a field's value, or default when it is unknown or unset"""
+        if field not in self.FIELDS:
+            return default
+        return getattr(self, field, default)
+    
+    def keys(self):
+        return iter(self.FIELDS)
+    
+    def as_dict(self):
+        """Return the record as a plain dict"""
+        return {field: getattr(self, field) for field in self.FIELDS}
+    
+    @classmethod
+    def ordinal(cls, value):
+        """Parse a YYYY-MM-DD date into a day ordinal, or None if it does not parse"""
+        if isinstance(value, int):
+            return value
+        try:
+            return datetime.strptime(value.strip(), cls.DATE_FORMAT).toordinal()
+        except ValueError:
+            return None
+    
+    @classmethod
+    def date_value(cls, value):
+        """Return the ordinal for a date, keeping unparseable legacy text as is"""
+        ordinal = cls.ordinal(value)
+        return value if ordinal is None else ordinal
+    
+    @staticmethod
+    def format_date(value):
+        return date.fromordinal(value).isoformat() if isinstance(value, int) else value
+    
+    @classmethod
+    def timestamp(cls, text=None):
+        """Parse a timestamp string, or take the current time, as whole seconds"""
+        moment = datetime.strptime(text, cls.TIMESTAMP_FORMAT) if text else datetime.now()
+        return int((moment - cls.EPOCH).total_seconds())
+    
+    @classmethod
+    def format_timestamp(cls, seconds):
+        return (cls.EPOCH + timedelta(seconds=seconds)).strftime(cls.TIMESTAMP_FORMAT)
+
+class Product(Record):
+    """A farmer's product listing; dates are kept as day ordinals"""
+    __slots__ = ('id', 'name', 'quantity', 'price', '_harvest', '_added')
+    FIELDS = ('id', 'name', 'quantity', 'price', 'harvest_date', 'added_date')
+    
+    def __init__(self, name, quantity, price, harvest_date, added_date=None, id=None):
+        self.id = id
+        self.name = sys.intern(name)
+        self.quantity = quantity
+        self.price = price
+        self._harvest = self.date_value(harvest_date)
+        self._added = self.date_value(added_date) if added_date else date.today().toordinal()
+    
+    @property
+    def harvest_date(self):
+        return self.format_date(self._harvest)
+    
+    @property
+    def harvest_ordinal(self):
+        """Harvest day ordinal, or None for an unparseable legacy date"""
+        return self._harvest if isinstance(self._harvest, int) else None
+    
+    @property
+    def added_date(self):
+        return self.format_date(self._added)
+
+class Contract(Record):
+    """A contract between a farmer and a buyer
+    
+    Party and product names are interned, the delivery date is a day
+    ordinal, timestamps are whole seconds and the total value is derived
+    from quantity and price. version counts status changes so writers
+    can detect that they acted on a stale copy.
+    """
+    __slots__ = ('id', 'farmer', 'buyer', 'product', 'quantity', 'price', '_delivery',
+                 'payment_terms', 'status', '_created', '_updated', 'version')
+    FIELDS = ('id', 'farmer', 'buyer', 'product', 'quantity', 'price', 'total_value',
+              'delivery_date', 'payment_terms', 'status', 'created_at', 'updated_at', 'version')
+    
+    def __init__(self, farmer, buyer, product, quantity, price, delivery_date, payment_terms,
+                 status='Pending', created_at=None, updated_at=None, id=None, total_value=None, version=1):
+        # total_value is accepted so stored rows load directly, but always derived
+        self.id = id
+        self.farmer = sys.intern(farmer)
+        self.buyer = sys.intern(buyer)
+        self.product = sys.intern(product)
+        self.quantity = quantity
+        self.price = price
+        self._delivery = self.date_value(delivery_date)
+        self.payment_terms = sys.intern(payment_terms)
+        self.status = sys.intern(status)
+        self._created = self.timestamp(created_at)
+        self._updated = self.timestamp(updated_at) if updated_at else self._created
+        self.version = version
+    
+    @property
+    def total_value(self):
+        return self.quantity * self.price
+    
+    @property
+    def delivery_date(self):
+        return self.format_date(self._delivery)
+    
+    @property
+    def delivery_ordinal(self):
+        """Delivery day ordinal, or None for an unparseable legacy date"""
+        return self._delivery if isinstance(self._delivery, int) else None
+    
+    @property
+    def created_at(self):
+        return self.format_timestamp(self._created)
+    
+    @property
+    def created_timestamp(self):
+        """Creation time in whole seconds since the epoch"""
+        return self._created
+    
+    @property
+    def updated_at(self):
+        return self.format_timestamp(self._updated)
+    
+    def touch(self):
+        """Record a change: bump the version and set the last-updated time to now"""
+        self.version += 1
+        self._updated = self.timestamp()
+    
+    def rewind(self, version, updated_at):
+        """Undo touch() back to an earlier version and last-updated time"""
+        self.version = version
+        self._updated = self.timestamp(updated_at)
+
+class SQLiteStorage:
+    """SQLite persistence for users, products and contracts
+    
+    Writes are queued and committed in batches of batch_size, or all
+    together inside batch(); reads fetch only the rows a screen asks for.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            username_key TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            user_type TEXT NOT NULL,
+            name TEXT NOT NULL,
+            contact TEXT NOT NULL,
+            location TEXT NOT NULL,
+            password TEXT NOT NULL,
+            registration_date TEXT NOT NULL,
+            interests TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_type ON users (user_type);
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY,
+            farmer_key TEXT NOT NULL,
+            name TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            price REAL NOT NULL,
+            harvest_date TEXT NOT NULL,
+            added_date TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_products_farmer ON products (farmer_key);
+        CREATE INDEX IF NOT EXISTS idx_products_name ON products (name);
+        CREATE TABLE IF NOT EXISTS contracts (
+            id INTEGER PRIMARY KEY,
+            farmer TEXT NOT NULL,
+            buyer TEXT NOT NULL,
+            product TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            price REAL NOT NULL,
+            total_value REAL NOT NULL,
+            delivery_date TEXT NOT NULL,
+            payment_terms TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE INDEX IF NOT EXISTS idx_contracts_farmer ON contracts (farmer);
+        CREATE INDEX IF NOT EXISTS idx_contracts_buyer ON contracts (buyer);
+        CREATE INDEX IF NOT EXISTS idx_contracts_status ON contracts (status);
+        CREATE INDEX IF NOT EXISTS idx_contracts_product ON contracts (product);
+    """
+    USER_FIELDS = ('username', 'name', 'contact', 'location', 'registration_date')
+    PRODUCT_FIELDS = ('id', 'name', 'quantity', 'price', 'harvest_date', 'added_date')
+    CONTRACT_FIELDS = ('id', 'farmer', 'buyer', 'product', 'quantity', 'price', 'total_value',
+                       'delivery_date', 'payment_terms', 'status', 'created_at', 'updated_at', 'version')
+    CONTRACT_INDEXES = ('farmer', 'buyer', 'status', 'product')
+    
+    INSERT_USER = ("INSERT INTO users (username_key, username, user_type, name, contact, location, "
+                   "password, registration_date, interests) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+    INSERT_PRODUCT = ("INSERT INTO products (id, farmer_key, name, quantity, price, harvest_date, added_date) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?)")
+    DELETE_PRODUCT = "DELETE FROM products WHERE id = ?"
+    INSERT_CONTRACT = ("INSERT INTO contracts (id, farmer, buyer, product, quantity, price, total_value, "
+                       "delivery_date, payment_terms, status, created_at, updated_at, version) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+    UPDATE_PASSWORD = "UPDATE users SET password = ? WHERE username_key = ?"
+    UPDATE_CONTRACT_STATUS = "UPDATE contracts SET status = ?, updated_at = ?, version = ? WHERE id = ?"
+    
+    def __init__(self, path="farmconnect.db", batch_size=200):
+        self.path = path
+        self.batch_size = batch_size
+        # Worker threads share the connection under FarmService.lock
+        self.conn = sqlite3.connect(path, cached_statements=64, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self._migrate()
+        self._pending = []
+        self._batching = 0
+    
+    def _migrate(self):
+        # Databases created before buyer interests were stored lack the column
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(users)")}
+        if 'interests' not in columns:
+            with self.conn:
+                self.conn.execute("ALTER TABLE users ADD COLUMN interests TEXT NOT NULL DEFAULT ''")
+        # ... and contracts created before optimistic locking lack a version
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(contracts)")}
+        if 'version' not in columns:
+            with self.conn:
+                self.conn.execute("ALTER TABLE contracts ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    
+    @property
+    def pending(self):
+        """Number of queued writes not yet committed"""
+        return len(self._pending)
+    
+    def _write(self, sql, params):
+        self._pending.append((sql, params))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+    
+    @contextmanager
+    def batch(self):
+        """Commit every write queued in the body in one transaction when it ends
+        
+        Flushes are held back until then, so reads inside the body see the
+        database as it was before it. If the body raises, its writes are
+        discarded.
+        """
+        self.flush()
+        start = len(self._pending)
+        self._batching += 1
+        try:
+            yield
+        except BaseException:
+            del self._pending[start:]
+            raise
+        finally:
+            self._batching -= 1
+        self.flush()
+    
+    def flush(self):
+        """Commit all queued writes in a single transaction"""
+        if not self._pending or self._batching:
+            return
+        pending, self._pending = self._pending, []
+        with self.conn:
+            # Consecutive writes of the same statement go through one executemany call
+            start = 0
+            for i in range(1, len(pending) + 1):
+                if i == len(pending) or pending[i][0] != pending[start][0]:
+                    self.conn.executemany(pending[start][0], [params for _, params in pending[start:i]])
+                    start = i
+    
+    def close(self):
+        """Commit outstanding writes and close the database"""
+        self.flush()
+        self.conn.close()
+    
+    def _query(self, sql, params=()):
+        self.flush()
+        return self.conn.execute(sql, params).fetchall()
+    
+    def stream(self, sql, params=(), size=1000):
+        """Yield query rows a chunk at a time from a separate read-only connection
+        
+        WAL lets the read proceed while other threads keep writing through
+        self.conn. Queued writes must be flushed first to be included.
+        """
+        if self.path == ":memory:":
+            raise ValueError("Cannot stream from an in-memory database")
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+        
+    # Users
+    
+    def save_user(self, user_type, profile):
+        """Queue a new profile"""
+        self._write(self.INSERT_USER, (UserRegistry.key(profile['username']), profile['username'], user_type,
+                                       profile['name'], profile['contact'], profile['location'],
+                                       PasswordHasher.encode(profile['credentials']), profile['registration_date'],
+                                       ",".join(profile.get('interests', []))))
+    
+    def update_credentials(self, profile):
+        """Queue a profile's re-hashed credentials"""
+        self._write(self.UPDATE_PASSWORD, (PasswordHasher.encode(profile['credentials']),
+                                           UserRegistry.key(profile['username'])))
+    
+    def username_exists(self, username_key):
+        """Check whether a username key is taken by any stored user"""
+        return bool(self._query("SELECT 1 FROM users WHERE username_key = ?", (username_key,)))
+    
+    def load_user(self, user_type, username_key):
+        """Fetch one profile, with its products for farmers"""
+        rows = self._query("SELECT * FROM users WHERE username_key = ? AND user_type = ?",
+                           (username_key, user_type))
+        return self._profiles(rows)[0] if rows else None
+    
+    def load_users(self, user_type, exclude=()):
+        """Fetch every profile of a type except the given username keys"""
+        rows = [row for row in self._query("SELECT * FROM users WHERE user_type = ? ORDER BY rowid", (user_type,))
+                if row['username_key'] not in exclude]
+        return self._profiles(rows)
+    
+    def _profiles(self, rows):
+        profiles = [{field: row[field] for field in self.USER_FIELDS} for row in rows]
+        for row, profile in zip(rows, profiles):
+            profile['credentials'] = PasswordHasher.decode(row['password'])
+        farmer_keys = [row['username_key'] for row in rows if row['user_type'] == "Farmer"]
+        products = self.load_products(farmer_keys)
+        for row, profile in zip(rows, profiles):
+            if row['user_type'] == "Farmer":
+                profile['products'] = products.get(row['username_key'], [])
+            else:
+                profile['interests'] = [name for name in row['interests'].split(",") if name]
+        return profiles
+        
+    # Products
+    
+    def next_product_id(self):
+        """Return the first product id not used in the database"""
+        return self._query("SELECT COALESCE(MAX(id), 0) + 1 FROM products")[0][0]
+    
+    def save_product(self, farmer_username, product):
+        """Queue a new product listing"""
+        self._write(self.INSERT_PRODUCT, (product['id'], UserRegistry.key(farmer_username), product['name'],
+                                          product['quantity'], product['price'], product['harvest_date'],
+                                          product['added_date']))
+    
+    def delete_product(self, product_id):
+        """Queue removal of a product listing"""
+        self._write(self.DELETE_PRODUCT, (product_id,))
+    
+    def load_products(self, farmer_keys):
+        """Fetch products grouped by farmer username key"""
+        grouped = {}
+        farmer_keys = list(farmer_keys)
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(farmer_keys), 500):
+            chunk = farmer_keys[start:start + 500]
+            rows = self._query(
+                f"SELECT * FROM products WHERE farmer_key IN ({', '.join('?' * len(chunk))}) ORDER BY id",
+                chunk
+            )
+            for row in rows:
+                grouped.setdefault(row['farmer_key'], []).append(
+                    Product(**{field: row[field] for field in self.PRODUCT_FIELDS})
+                )
+        return grouped
+        
+    # Contracts
+    
+    def next_contract_id(self):
+        """Return the first contract id not used in the database"""
+        return self._query("SELECT COALESCE(MAX(id), 0) + 1 FROM contracts")[0][0]
+    
+    def save_contract(self, contract):
+        """Queue a new contract"""
+        self._write(self.INSERT_CONTRACT, tuple(contract[field] for field in self.CONTRACT_FIELDS))
+    
+    def update_contract_status(self, contract):
+        """Queue a contract's new status and timestamp"""
+        self._write(self.UPDATE_CONTRACT_STATUS, (contract['status'], contract['updated_at'], contract['version'],
+                                                  contract['id']))
+    
+    def load_contract(self, contract_id):
+        """Fetch one contract by id"""
+        rows = self._query("SELECT * FROM contracts WHERE id = ?", (contract_id,))
+        return Contract(**rows[0]) if rows else None
+    
+    def contract_totals(self):
+        """Count, quantity and value of stored contracts per farmer, buyer, product and status"""
+        return self._query("SELECT farmer, buyer, product, status, COUNT(*) AS count, "
+                           "SUM(quantity) AS quantity, SUM(total_value) AS value FROM contracts "
+                           "GROUP BY farmer, buyer, product, status")
+    
+    def contract_prices(self, statuses):
+        """Iterate over product, quantity, price and created_at of stored contracts in the given statuses"""
+        self.flush()
+        marks = ", ".join("?" * len(statuses))
+        return self.conn.execute(f"SELECT product, quantity, price, created_at FROM contracts "
+                                 f"WHERE status IN ({marks})", statuses)
+    
+    def load_contracts(self, field, value):
+        """Fetch the contracts whose indexed field equals value"""
+        if field not in self.CONTRACT_INDEXES:
+            raise ValueError(f"Contracts are not indexed by {field}")
+        return [Contract(**row) for row in self._query(f"SELECT * FROM contracts WHERE {field} = ? ORDER BY id", (value,))]
+
+class UserRegistry:
+    """Farmer and buyer profiles with case-folded username indexes
+    
+    With a storage backend, profiles are written through on insert and
+    loaded from disk on first lookup.
+    """
+    def __init__(self, storage=None):
+        self.storage = storage
+        self.farmers = []
+        self.buyers = []
+        self._index = {"Farmer": {}, "Buyer": {}}
+        self._complete = {"Farmer": storage is None, "Buyer": storage is None}
+        self._next_product_id = storage.next_product_id() if storage else 1
+        self._listeners = []
+    
+    def subscribe(self, listener):
+        """Register a RegistryListener for profile and product changes"""
+        self._listeners.append(listener)
+    
+    @staticmethod
+    def key(username):
+        """Normalise a username for index lookups"""
+        return username.strip().casefold()
+    
+    def users(self, user_type):
+        """Return the profile list for a user type, loading it on first use"""
+        if not self._complete[user_type]:
+            self._cache(user_type, self.storage.load_users(user_type, exclude=self._index[user_type]))
+            self._complete[user_type] = True
+        return self.farmers if user_type == "Farmer" else self.buyers
+    
+    def _cache(self, user_type, profiles):
+        for profile in profiles:
+            self._index[user_type][self.key(profile['username'])] = profile
+        (self.farmers if user_type == "Farmer" else self.buyers).extend(profiles)
+        for listener in self._listeners:
+            for profile in profiles:
+                listener.user_added(user_type, profile)
+    
+    def exists(self, username):
+        """Check whether a username is taken by any farmer or buyer"""
+        key = self.key(username)
+        if any(key in index for index in self._index.values()):
+            return True
+        if all(self._complete.values()):
+            return False
+        return self.storage.username_exists(key)
+    
+    def get(self, user_type, username):
+        """Look up a profile by username"""
+        key = self.key(username)
+        user = self._index[user_type].get(key)
+        if user is None and not self._complete[user_type]:
+            user = self.storage.load_user(user_type, key)
+            if user:
+                self._cache(user_type, [user])
+        return user
+    
+    def find(self, user_type, username):
+        """Return the profile whose username matches exactly"""
+        user = self.get(user_type, username)
+        if user and user['username'] == username:
+            return user
+        return None
+    
+    def update_credentials(self, profile, credentials):
+        """Replace a profile's stored password hash"""
+        profile['credentials'] = credentials
+        if self.storage:
+            self.storage.update_credentials(profile)
+    
+    def add(self, user_type, profile):
+        """Register a single profile"""
+        if self.exists(profile['username']):
+            raise ValueError("Username already exists")
+        self._cache(user_type, [profile])
+        if self.storage:
+            self.storage.save_user(user_type, profile)
+        return profile
+    
+    def add_many(self, user_type, profiles):
+        """Register several profiles at once, all or nothing"""
+        profiles = list(profiles)
+        batch = {}
+        for profile in profiles:
+            key = self.key(profile['username'])
+            if key in batch or self.exists(key):
+                raise ValueError(f"Username already exists: {profile['username']}")
+            batch[key] = profile
+        self._cache(user_type, profiles)
+        if self.storage:
+            for profile in profiles:
+                self.storage.save_user(user_type, profile)
+        return profiles
+    
+    def add_product(self, farmer, product):
+        """Attach a new product listing to a farmer"""
+        product['id'] = self._next_product_id
+        self._next_product_id += 1
+        farmer['products'].append(product)
+        if self.storage:
+            self.storage.save_product(farmer['username'], product)
+        for listener in self._listeners:
+            listener.product_added(farmer, product)
+        return product
+    
+    def remove_product(self, farmer, product):
+        """Remove a product listing from a farmer"""
+        farmer['products'].remove(product)
+        if self.storage:
+            self.storage.delete_product(product['id'])
+        for listener in self._listeners:
+            listener.product_removed(farmer, product)
+
+class RegistryListener:
+    """Receives UserRegistry changes to keep derived indexes current"""
+    def user_added(self, user_type, profile):
+        pass
+    
+    def product_added(self, farmer, product):
+        pass
+    
+    def product_removed(self, farmer, product):
+        pass
+
+class MatchmakingEngine(RegistryListener):
+    """Ranks farmers and buyers against each other by the products they share
+    
+    Inverted indexes map each product to the farmers offering it (with
+    their total quantity and best price) and to the buyers interested in
+    it, so a query only touches the postings for the products involved.
+    A variety is offered under its own name and its base product's, so
+    interest in "Rice" matches "Rice (Basmati)".
+    """
+    def __init__(self, registry, limit=500, catalog=None):
+        self.registry = registry
+        self.limit = limit
+        self.catalog = catalog or Catalog()
+        self._offers = {}
+        self._interests = {}
+        registry.subscribe(self)
+        for profile in registry.farmers:
+            self.user_added("Farmer", profile)
+        for profile in registry.buyers:
+            self.user_added("Buyer", profile)
+    
+    def user_added(self, user_type, profile):
+        if user_type == "Farmer":
+            for name in self._offered(profile):
+                self._index_offer(profile, name)
+        else:
+            key = UserRegistry.key(profile['username'])
+            for name in profile['interests']:
+                self._interests.setdefault(name, {})[key] = profile
+    
+    def product_added(self, farmer, product):
+        for name in self.catalog.keys(product['name']):
+            self._index_offer(farmer, name)
+    
+    def product_removed(self, farmer, product):
+        for name in self.catalog.keys(product['name']):
+            self._index_offer(farmer, name)
+    
+    def _offered(self, farmer):
+        return {name for product in farmer['products'] for name in self.catalog.keys(product['name'])}
+    
+    def _index_offer(self, farmer, name):
+        key = UserRegistry.key(farmer['username'])
+        listings = [product for product in farmer['products'] if name in self.catalog.keys(product['name'])]
+        offers = self._offers.setdefault(name, {})
+        if listings:
+            offers[key] = {
+                'profile': farmer,
+                'quantity': sum(product['quantity'] for product in listings),
+                'price': min(product['price'] for product in listings)
+            }
+        else:
+            offers.pop(key, None)
+            if not offers:
+                del self._offers[name]
+    
+    def match_farmers(self, buyer, products=None, k=None):
+        """Rank farmers offering the buyer's interests, best first
+        
+        Farmers are ordered by how many wanted products they offer, then
+        same location, lower average price and larger available quantity.
+        """
+        self.registry.users("Farmer")
+        candidates = {}
+        for name in set(products or buyer['interests']):
+            for key, offer in self._offers.get(name, {}).items():
+                candidate = candidates.setdefault(
+                    key, {'profile': offer['profile'], 'overlap': 0, 'quantity': 0.0, 'price': 0.0}
+                )
+                candidate['overlap'] += 1
+                candidate['quantity'] += offer['quantity']
+                candidate['price'] += offer['price']
+        location = buyer['location'].casefold()
+        ranked = heapq.nsmallest(k or self.limit, candidates.values(), key=lambda c: (
+            -c['overlap'],
+            c['profile']['location'].casefold() != location,
+            c['price'] / c['overlap'],
+            -c['quantity']
+        ))
+        return [candidate['profile'] for candidate in ranked]
+    
+    def match_buyers(self, farmer, k=None):
+        """Rank buyers interested in the farmer's products, best first"""
+        self.registry.users("Buyer")
+        candidates = {}
+        for name in self._offered(farmer):
+            for key, profile in self._interests.get(name, {}).items():
+                candidate = candidates.setdefault(key, {'profile': profile, 'overlap': 0})
+                candidate['overlap'] += 1
+        location = farmer['location'].casefold()
+        ranked = heapq.nsmallest(k or self.limit, candidates.values(), key=lambda c: (
+            -c['overlap'],
+            c['profile']['location'].casefold() != location
+        ))
+        return [candidate['profile'] for candidate in ranked]
+
+class ListingIndex(RegistryListener):
+    """Per-product listings sorted by price and by quantity
+    
+    Range filters are answered by bisecting whichever sorted list gives
+    the smaller slice, and a location filter only visits the price lists
+    kept for matching locations. Searching a base product such as "Rice"
+    covers its varieties' lists too. The per-list results are merged
+    lazily in price order, so a search with a limit stops after one page
+    instead of sorting every match. Recent query results are cached
+    until a listing for the queried product changes.
+    """
+    def __init__(self, registry, cache_size=256, catalog=None):
+        self.registry = registry
+        self.cache_size = cache_size
+        self.catalog = catalog or Catalog()
+        self._listings = {}
+        self._names = {}
+        self._by_price = {}
+        self._by_quantity = {}
+        self._by_location = {}
+        self._cache = OrderedDict()
+        registry.subscribe(self)
+        for profile in registry.farmers:
+            self.user_added("Farmer", profile)
+    
+    def user_added(self, user_type, profile):
+        if user_type == "Farmer":
+            for product in profile['products']:
+                self.product_added(profile, product)
+    
+    def product_added(self, farmer, product):
+        self._listings[product['id']] = (farmer, product, product.harvest_ordinal)
+        bisect.insort(self._by_price.setdefault(product['name'], []), (product['price'], product['id']))
+        bisect.insort(self._by_quantity.setdefault(product['name'], []), (product['quantity'], product['id']))
+        bisect.insort(self._by_location.setdefault(farmer['location'].casefold(), {}).setdefault(product['name'], []),
+                      (product['price'], product['id']))
+        for key in self.catalog.keys(product['name']):
+            self._names.setdefault(key, set()).add(product['name'])
+        self._invalidate(product['name'])
+    
+    def product_removed(self, farmer, product):
+        if self._listings.pop(product['id'], None) is None:
+            return
+        location = farmer['location'].casefold()
+        for index, value in ((self._by_price, product['price']), (self._by_quantity, product['quantity']),
+                             (self._by_location[location], product['price'])):
+            entries = index[product['name']]
+            del entries[bisect.bisect_left(entries, (value, product['id']))]
+            if not entries:
+                del index[product['name']]
+        if not self._by_location[location]:
+            del self._by_location[location]
+        if product['name'] not in self._by_price:
+            for key in self.catalog.keys(product['name']):
+                self._names[key].discard(product['name'])
+                if not self._names[key]:
+                    del self._names[key]
+        self._invalidate(product['name'])
+    
+    def _invalidate(self, name):
+        names = (None,) + self.catalog.keys(name)
+        for key in [key for key in self._cache if key[0] in names]:
+            del self._cache[key]
+    
+    def search(self, product=None, location=None, min_price=None, max_price=None,
+               min_quantity=None, harvest_from=None, harvest_to=None, limit=None):
+        """Return (farmer, product) listings matching every filter, cheapest first
+        
+        Harvest bounds are day ordinals; location is a case-insensitive
+        substring of the farmer's location. With a limit, only that many
+        of the cheapest matches are returned.
+        """
+        self.registry.users("Farmer")
+        location = location.casefold() if location else None
+        key = (product, location, min_price, max_price, min_quantity, harvest_from, harvest_to, limit)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        
+        names = self._names.get(product, ()) if product else None
+        if location:
+            sources = [self._price_range(prices, min_price, max_price)
+                       for place, by_name in self._by_location.items() if location in place
+                       for name, prices in by_name.items() if names is None or name in names]
+        else:
+            names = list(self._by_price if names is None else names)
+            total = sum(len(self._by_price[name]) for name in names)
+            # A limited search expects each product to supply its share of the results
+            sources = [self._search_product(name, min_price, max_price, min_quantity,
+                                            None if limit is None else limit * len(self._by_price[name]) / total)
+                       for name in names]
+        
+        listings = []
+        for _, listing_id in heapq.merge(*sources):
+            farmer, item, harvest = self._listings[listing_id]
+            if min_quantity is not None and item['quantity'] < min_quantity:
+                continue
+            if harvest_from is not None or harvest_to is not None:
+                if harvest is None:
+                    continue
+                if harvest_from is not None and harvest < harvest_from:
+                    continue
+                if harvest_to is not None and harvest > harvest_to:
+                    continue
+            listings.append((farmer, item))
+            if len(listings) == limit:
+                break
+            
+        self._cache[key] = listings
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return listings
+    
+    @staticmethod
+    def _price_range(prices, min_price, max_price):
+        """Iterate the (price, listing id) entries within the price bounds without copying"""
+        low = bisect.bisect_left(prices, (min_price,)) if min_price is not None else 0
+        high = bisect.bisect_right(prices, (max_price, math.inf)) if max_price is not None else len(prices)
+        return (prices[i] for i in range(low, high))
+    
+    def _search_product(self, name, min_price, max_price, min_quantity, share):
+        prices = self._by_price.get(name, [])
+        quantities = self._by_quantity.get(name, [])
+        low = bisect.bisect_left(prices, (min_price,)) if min_price is not None else 0
+        high = bisect.bisect_right(prices, (max_price, math.inf)) if max_price is not None else len(prices)
+        start = bisect.bisect_left(quantities, (min_quantity,)) if min_quantity is not None else 0
+        
+        # Stream the price range in order unless walking it would visit more listings than the
+        # quantity range holds; then sort just its matches. Supplying share results takes a
+        # walk of about share / (fraction of listings meeting min_quantity).
+        walk = high - low
+        if share is not None and len(quantities) > start:
+            walk = min(walk, share * len(prices) / (len(quantities) - start))
+        if walk <= len(quantities) - start:
+            return (prices[i] for i in range(low, high))
+        matches = []
+        for i in range(start, len(quantities)):
+            listing_id = quantities[i][1]
+            price = self._listings[listing_id][1].price
+            if (min_price is None or price >= min_price) and (max_price is None or price <= max_price):
+                matches.append((price, listing_id))
+        matches.sort()
+        return matches
+
+class TrigramIndex(RegistryListener):
+    """Typo-tolerant profile search over name, username and location
+    
+    Each field of each profile is a document in a trigram inverted index
+    whose postings list document ids in insertion order, so they stay
+    sorted. A query counts shared trigrams starting from its rarest ones;
+    trigrams too common to be worth scanning only add to the candidates
+    already found. A profile scores the best Jaccard similarity of any of
+    its fields.
+    """
+    FIELDS = ('name', 'username', 'location')
+    COMMON = 5000
+    MIN_SCORE = 0.2
+    
+    def __init__(self, registry):
+        self.registry = registry
+        self._profiles = {"Farmer": [], "Buyer": []}
+        self._sizes = {"Farmer": [], "Buyer": []}
+        self._postings = {"Farmer": {}, "Buyer": {}}
+        registry.subscribe(self)
+        for profile in registry.farmers:
+            self.user_added("Farmer", profile)
+        for profile in registry.buyers:
+            self.user_added("Buyer", profile)
+    
+    @staticmethod
+    def trigrams(text):
+        """Distinct case-folded trigrams of text, padded so word starts count"""
+        text = " ".join(text.casefold().split())
+        if not text:
+            return set()
+        padded = f"  {text} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+    
+    def user_added(self, user_type, profile):
+        self._profiles[user_type].append(profile)
+        sizes = self._sizes[user_type]
+        postings = self._postings[user_type]
+        for field in self.FIELDS:
+            grams = self.trigrams(profile.get(field) or "")
+            document = len(sizes)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(document)
+    
+    def search(self, user_type, query, k=10, cancelled=None):
+        """Return up to k (score, profile) pairs most like query, best first
+        
+        Stops early and returns [] once cancelled(), if given, is true.
+        """
+        self.registry.users(user_type)
+        grams = self.trigrams(query)
+        postings = self._postings[user_type]
+        shared = {}
+        for posting in sorted((postings.get(gram, ()) for gram in grams), key=len):
+            if cancelled and cancelled():
+                return []
+            if len(posting) <= self.COMMON or not shared:
+                for document in posting:
+                    shared[document] = shared.get(document, 0) + 1
+            else:
+                for document in shared:
+                    i = bisect.bisect_left(posting, document)
+                    if i < len(posting) and posting[i] == document:
+                        shared[document] += 1
+        
+        sizes = self._sizes[user_type]
+        best = {}
+        for document, count in shared.items():
+            score = count / (len(grams) + sizes[document] - count)
+            slot = document // len(self.FIELDS)
+            if score >= self.MIN_SCORE and score > best.get(slot, 0.0):
+                best[slot] = score
+        profiles = self._profiles[user_type]
+        return [(score, profiles[slot]) for slot, score in heapq.nlargest(k, best.items(), key=lambda item: item[1])]
+
+class Gazetteer:
+    """Offline place name to (latitude, longitude) lookup
+    
+    Places come from a CSV file with place, state, latitude and longitude
+    columns. Locations match case-insensitively on the whole text, then on
+    each comma-separated part, so "Nashik, Maharashtra" resolves too.
+    """
+    PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.csv")
+    
+    def __init__(self, places=None):
+        self.places = places or {}
+    
+    @classmethod
+    def load(cls, path=None):
+        """Read a gazetteer CSV, the bundled one by default; a missing file gives an empty gazetteer"""
+        places = {}
+        path = path or cls.PATH
+        if os.path.exists(path):
+            with open(path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    point = (float(row['latitude']), float(row['longitude']))
+                    places[row['place'].strip().casefold()] = point
+                    places[f"{row['place']}, {row['state']}".casefold()] = point
+        return cls(places)
+    
+    def resolve(self, location):
+        """Return (latitude, longitude) for a free-text location, or None if it is not known"""
+        text = " ".join(location.split()).casefold()
+        point = self.places.get(text)
+        if point is None:
+            for part in text.split(","):
+                point = self.places.get(part.strip())
+                if point is not None:
+                    break
+        return point
+
+class Catalog:
+    """Products with their category, variety and unit, completed by prefix
+    
+    Entries come from a CSV file with category, product, variety and unit
+    columns; a variety is named "Product (Variety)". The prefix index is a
+    sorted list holding every word-start suffix of each name, plus the name
+    behind its category, so "basm" finds "Rice (Basmati)" and "pulses"
+    lists the pulses. A completion is one bisect and a walk over its matches.
+    """
+    PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.csv")
+    
+    def __init__(self, items=None):
+        self.items = items or [{'category': "", 'product': name, 'variety': "", 'unit': "kg", 'name': name}
+                               for name in DEFAULT_PRODUCTS]
+        self._by_name = {item['name'].casefold(): item for item in self.items}
+        self._keys = []
+        for position, item in enumerate(self.items):
+            words = self.normalise(item['name']).split()
+            self._keys.extend((" ".join(words[i:]), position) for i in range(len(words)))
+            if item['category']:
+                self._keys.append((self.normalise(f"{item['category']} {item['name']}"), position))
+        self._keys.sort()
+        self._names = sorted((item['name'] for item in self.items), key=str.casefold)
+    
+    @classmethod
+    def load(cls, path=None):
+        """Read a catalog CSV, the bundled one by default; a missing file gives DEFAULT_PRODUCTS"""
+        items = []
+        path = path or cls.PATH
+        if os.path.exists(path):
+            with open(path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    product, variety = row['product'].strip(), row['variety'].strip()
+                    items.append({
+                        'category': row['category'].strip(), 'product': product, 'variety': variety,
+                        'unit': row['unit'].strip() or "kg", 'name': f"{product} ({variety})" if variety else product
+                    })
+        return cls(items)
+    
+    @staticmethod
+    def normalise(text):
+        return " ".join(text.casefold().replace("(", " ").replace(")", " ").split())
+    
+    def find(self, name):
+        """Return the entry for a product name, ignoring case, or None"""
+        return self._by_name.get(" ".join(name.split()).casefold())
+    
+    def keys(self, name):
+        """Names a listing of name is found under: its own, then its base product's for a variety"""
+        item = self._by_name.get(name.casefold())
+        return (name, item['product']) if item and item['variety'] else (name,)
+    
+    def complete(self, prefix, limit=20):
+        """Return up to limit product names with a word starting with prefix, all names when it is empty"""
+        prefix = self.normalise(prefix)
+        if not prefix:
+            return self._names[:limit]
+        names = []
+        seen = set()
+        for i in range(bisect.bisect_left(self._keys, (prefix,)), len(self._keys)):
+            key, position = self._keys[i]
+            if not key.startswith(prefix) or len(names) == limit:
+                break
+            if position not in seen:
+                seen.add(position)
+                names.append(self.items[position]['name'])
+        return names
+
+class GeoIndex(RegistryListener):
+    """Farmers and buyers bucketed by location on a latitude/longitude grid
+    
+    Locations are resolved against a Gazetteer as profiles are added.
+    Radius queries scan only the cells overlapping the circle's bounding
+    box; nearest-k queries walk rings of cells outwards and stop once no
+    unvisited cell can hold anything closer than the k-th match.
+    """
+    CELL_DEGREES = 0.5
+    EARTH_RADIUS_KM = 6371.0
+    
+    def __init__(self, registry, gazetteer):
+        self.registry = registry
+        self.gazetteer = gazetteer
+        self._cells = {"Farmer": {}, "Buyer": {}}
+        self._extent = {"Farmer": None, "Buyer": None}
+        registry.subscribe(self)
+        for profile in registry.farmers:
+            self.user_added("Farmer", profile)
+        for profile in registry.buyers:
+            self.user_added("Buyer", profile)
+    
+    def user_added(self, user_type, profile):
+        point = self.gazetteer.resolve(profile['location'])
+        if point is None:
+            return
+        row, col = cell = self._cell(*point)
+        self._cells[user_type].setdefault(cell, []).append((point, profile))
+        extent = self._extent[user_type] or (row, row, col, col, 0.0)
+        self._extent[user_type] = (min(extent[0], row), max(extent[1], row),
+                                   min(extent[2], col), max(extent[3], col), max(extent[4], abs(point[0])))
+    
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.CELL_DEGREES), math.floor(longitude / self.CELL_DEGREES)
+    
+    @classmethod
+    def distance(cls, a, b):
+        """Great-circle distance in km between two (latitude, longitude) points"""
+        lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+        h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        return 2 * cls.EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+    
+    def _scan(self, user_type, point, rows, cols):
+        cells = self._cells[user_type]
+        for row in rows:
+            for col in cols:
+                for other, profile in cells.get((row, col), ()):
+                    yield self.distance(point, other), profile
+    
+    def within(self, user_type, point, radius_km=None):
+        """Return (distance, profile) for every located user within radius_km of point, nearest first"""
+        self.registry.users(user_type)
+        extent = self._extent[user_type]
+        if extent is None:
+            return []
+        min_row, max_row, min_col, max_col, _ = extent
+        if radius_km is not None:
+            row, col = self._cell(*point)
+            degrees = math.degrees(radius_km / self.EARTH_RADIUS_KM)
+            widest = math.cos(math.radians(min(89.0, abs(point[0]) + degrees)))
+            row_span = math.ceil(degrees / self.CELL_DEGREES)
+            col_span = math.ceil(degrees / widest / self.CELL_DEGREES)
+            min_row, max_row = max(min_row, row - row_span), min(max_row, row + row_span)
+            min_col, max_col = max(min_col, col - col_span), min(max_col, col + col_span)
+        matches = [(distance, profile) for distance, profile in
+                   self._scan(user_type, point, range(min_row, max_row + 1), range(min_col, max_col + 1))
+                   if radius_km is None or distance <= radius_km]
+        matches.sort(key=lambda match: match[0])
+        return matches
+    
+    def _ring(self, user_type, point, ring):
+        row, col = self._cell(*point)
+        min_row, max_row, min_col, max_col, _ = self._extent[user_type]
+        cols = range(max(min_col, col - ring), min(max_col, col + ring) + 1)
+        for r in range(max(min_row, row - ring), min(max_row, row + ring) + 1):
+            if abs(r - row) == ring:
+                yield from self._scan(user_type, point, (r,), cols)
+            else:
+                yield from self._scan(user_type, point, (r,),
+                                      [c for c in (col - ring, col + ring) if min_col <= c <= max_col])
+    
+    def _beyond(self, point, ring, latitude):
+        """Lower bound on the distance from point to any cell outside rings 0 to ring"""
+        degrees = math.radians(ring * self.CELL_DEGREES)
+        across_rows = self.EARTH_RADIUS_KM * degrees
+        across_cols = 2 * self.EARTH_RADIUS_KM * math.asin(
+            math.cos(math.radians(latitude)) * math.sin(min(degrees, math.pi) / 2))
+        return min(across_rows, across_cols)
+    
+    def nearest(self, user_type, point, k, radius_km=None):
+        """Return up to k (distance, profile) pairs nearest to point, optionally within radius_km"""
+        self.registry.users(user_type)
+        extent = self._extent[user_type]
+        if extent is None or k <= 0:
+            return []
+        row, col = self._cell(*point)
+        min_row, max_row, min_col, max_col, max_latitude = extent
+        last_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        latitude = min(89.0, max(abs(point[0]), max_latitude))
+        best = []
+        order = itertools.count()
+        for ring in range(last_ring + 1):
+            for distance, profile in self._ring(user_type, point, ring):
+                if radius_km is not None and distance > radius_km:
+                    continue
+                entry = (-distance, next(order), profile)
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, entry)
+            bound = self._beyond(point, ring, latitude)
+            if radius_km is not None and bound > radius_km:
+                break
+            if len(best) == k and bound >= -best[0][0]:
+                break
+        return [(-distance, profile) for distance, _, profile in sorted(best, reverse=True)]
+
+class ContractStore:
+    """Contracts indexed by id, farmer, buyer, status and product
+    
+    With a storage backend, contracts are written through on insert and
+    status change, and each index bucket is loaded from disk on first use.
+    Each party's contracts are also kept sorted by delivery date for
+    range lookups.
+    """
+    INDEXED_FIELDS = ('farmer', 'buyer', 'status', 'product')
+    PARTIES = ('farmer', 'buyer')
+    
+    def __init__(self, storage=None):
+        self.storage = storage
+        self.contracts = []
+        self._by_id = {}
+        self._indexes = {field: {} for field in self.INDEXED_FIELDS}
+        self._deliveries = {party: {} for party in self.PARTIES}
+        self._loaded = set()
+        self._next_id = storage.next_contract_id() if storage else 1
+        self._listeners = []
+    
+    def __len__(self):
+        return len(self._by_id)
+    
+    def subscribe(self, listener):
+        """Register a ContractListener for new contracts and status changes"""
+        self._listeners.append(listener)
+    
+    def __iter__(self):
+        return iter(self.contracts)
+    
+    def allocate_id(self):
+        """Reserve the next contract id"""
+        contract_id = self._next_id
+        self._next_id += 1
+        return contract_id
+    
+    def _index(self, contract):
+        for field in self.INDEXED_FIELDS:
+            self._indexes[field].setdefault(contract[field], {})[contract['id']] = contract
+        if contract.delivery_ordinal is not None:
+            for party in self.PARTIES:
+                bisect.insort(self._deliveries[party].setdefault(contract[party], []),
+                              (contract.delivery_ordinal, contract['id']))
+    
+    def _unindex(self, contract, field):
+        bucket = self._indexes[field].get(contract[field])
+        if bucket is not None:
+            bucket.pop(contract['id'], None)
+            if not bucket:
+                del self._indexes[field][contract[field]]
+    
+    def _cache(self, contract):
+        self._by_id[contract['id']] = contract
+        self.contracts.append(contract)
+        self._index(contract)
+    
+    def add(self, contract):
+        """Store a contract, allocating an id if it has none"""
+        if contract.get('id') is None:
+            contract['id'] = self.allocate_id()
+        elif contract['id'] in self._by_id:
+            raise ValueError(f"Contract #{contract['id']} already exists")
+        else:
+            self._next_id = max(self._next_id, contract['id'] + 1)
+        self._cache(contract)
+        if self.storage:
+            self.storage.save_contract(contract)
+        for listener in self._listeners:
+            listener.contract_added(contract)
+        return contract
+    
+    def get(self, contract_id):
+        """Look up a contract by id"""
+        contract = self._by_id.get(contract_id)
+        if contract is None and self.storage:
+            contract = self.storage.load_contract(contract_id)
+            if contract:
+                self._cache(contract)
+        return contract
+    
+    def _load(self, field, value):
+        if self.storage and (field, value) not in self._loaded:
+            for contract in self.storage.load_contracts(field, value):
+                if contract['id'] not in self._by_id:
+                    self._cache(contract)
+            self._loaded.add((field, value))
+    
+    def find(self, field, value):
+        """Return contracts whose indexed field equals value"""
+        self._load(field, value)
+        return list(self._indexes[field].get(value, {}).values())
+    
+    def due_between(self, user_type, username, start, end):
+        """Return a party's contracts delivering from start to end ordinals inclusive, soonest first"""
+        party = 'farmer' if user_type.lower() == "farmer" else 'buyer'
+        self._load(party, username)
+        deliveries = self._deliveries[party].get(username, [])
+        lo = bisect.bisect_left(deliveries, (start,))
+        hi = bisect.bisect_left(deliveries, (end + 1,))
+        return [self._by_id[contract_id] for _, contract_id in deliveries[lo:hi]]
+    
+    def for_user(self, user_type, username):
+        """Return the contracts a farmer or buyer is party to"""
+        return self.find('farmer' if user_type.lower() == "farmer" else 'buyer', username)
+    
+    def update_status(self, contract_id, status, expected_version=None):
+        """Change a contract's status and keep the status index current
+        
+        With expected_version, raise ConflictError unless the contract is
+        still at that version.
+        """
+        contract = self.get(contract_id)
+        if contract is None:
+            return None
+        self.check_version(contract, expected_version)
+        previous = contract['status']
+        self._set_status(contract, status)
+        contract.touch()
+        if self.storage:
+            self.storage.update_contract_status(contract)
+        self._status_changed(contract, previous)
+        return contract
+    
+    @staticmethod
+    def check_version(contract, expected_version):
+        """Raise ConflictError unless expected_version is None or the contract's version"""
+        if expected_version is not None and contract['version'] != expected_version:
+            raise ConflictError(f"Contract #{contract['id']} was changed by someone else; please review it again")
+    
+    def restore_status(self, contract, status, version, updated_at):
+        """Put back a status change whose write was never committed"""
+        previous = contract['status']
+        self._set_status(contract, status)
+        contract.rewind(version, updated_at)
+        self._status_changed(contract, previous)
+    
+    def _set_status(self, contract, status):
+        if contract['status'] != status:
+            self._unindex(contract, 'status')
+            contract['status'] = status
+            self._indexes['status'].setdefault(status, {})[contract['id']] = contract
+    
+    def _status_changed(self, contract, previous):
+        if previous != contract['status']:
+            for listener in self._listeners:
+                listener.status_changed(contract, previous)
+
+class ContractListener:
+    """Receives ContractStore changes to keep derived aggregates current"""
+    def contract_added(self, contract):
+        pass
+    
+    def status_changed(self, contract, previous):
+        pass
+
+class ContractAnalytics(ContractListener):
+    """Contract counts, quantities and values kept current as contracts change
+    
+    Totals are keyed by status, by product and by each party, each split
+    by status, so a contract event adjusts a fixed handful of counters.
+    They are seeded once from storage with a GROUP BY query rather than
+    by loading contracts; rebuild() recomputes them only to verify.
+    """
+    OUTSTANDING = ('Accepted', 'Delivered')
+    
+    def __init__(self, store):
+        self.store = store
+        self._totals, self._products = self.rebuild()
+        store.subscribe(self)
+    
+    def rebuild(self):
+        """Compute fresh (totals, products) from the stored or in-memory contracts"""
+        totals = {}
+        products = {}
+        if self.store.storage:
+            groups = [(row['farmer'], row['buyer'], row['product'], row['status'],
+                       row['count'], row['quantity'], row['value'])
+                      for row in self.store.storage.contract_totals()]
+        else:
+            groups = [(c['farmer'], c['buyer'], c['product'], c['status'], 1, c['quantity'], c['total_value'])
+                      for c in self.store]
+        for farmer, buyer, product, status, count, quantity, value in groups:
+            self._apply(totals, products, farmer, buyer, product, status, count, quantity, value)
+        return totals, products
+    
+    @staticmethod
+    def _apply(totals, products, farmer, buyer, product, status, count, quantity, value):
+        for key in (('status', status), ('product', product, status),
+                    ('farmer', farmer, status), ('buyer', buyer, status),
+                    ('farmer', farmer, product, status), ('buyer', buyer, product, status)):
+            entry = totals.setdefault(key, [0, 0.0, 0.0])
+            entry[0] += count
+            entry[1] += quantity
+            entry[2] += value
+        products.setdefault(('farmer', farmer), set()).add(product)
+        products.setdefault(('buyer', buyer), set()).add(product)
+    
+    def _adjust(self, contract, status, sign):
+        self._apply(self._totals, self._products, contract['farmer'], contract['buyer'], contract['product'],
+                    status, sign, sign * contract['quantity'], sign * contract['total_value'])
+    
+    def contract_added(self, contract):
+        self._adjust(contract, contract['status'], 1)
+    
+    def status_changed(self, contract, previous):
+        self._adjust(contract, previous, -1)
+        self._adjust(contract, contract['status'], 1)
+    
+    def _entry(self, *key):
+        count, quantity, value = self._totals.get(key, (0, 0.0, 0.0))
+        return {'count': count, 'quantity': quantity, 'value': value}
+    
+    def summary(self, user_type=None, username=None):
+        """Totals for one party, or for every contract when no party is given
+        
+        Returns count and value overall, per status and per product (not
+        counting rejected contracts), plus the outstanding value of
+        accepted and delivered contracts awaiting payment.
+        """
+        scope = () if username is None else ('farmer' if user_type.lower() == "farmer" else 'buyer', username)
+        if scope:
+            names = self._products.get(scope, ())
+        else:
+            names = {key[1] for key in self._totals if key[0] == 'product'}
+        by_status = {status: self._entry(*(scope or ('status',)), status) for status in FarmService.STATUSES}
+        by_product = {}
+        for name in sorted(names):
+            entries = [self._entry(*(scope or ('product',)), name, status)
+                       for status in FarmService.STATUSES if status != 'Rejected']
+            total = {field: sum(entry[field] for entry in entries) for field in ('count', 'quantity', 'value')}
+            if total['count']:
+                by_product[name] = total
+        return {
+            'count': sum(entry['count'] for entry in by_status.values()),
+            'value': sum(entry['value'] for entry in by_status.values()),
+            'by_status': by_status,
+            'by_product': by_product,
+            'outstanding': sum(by_status[status]['value'] for status in self.OUTSTANDING)
+        }
+    
+    def verify(self):
+        """Rebuild from scratch and return the keys whose totals disagree"""
+        totals, _ = self.rebuild()
+        mismatched = []
+        for key in set(totals) | set(self._totals):
+            expected = totals.get(key, (0, 0.0, 0.0))
+            actual = self._totals.get(key, (0, 0.0, 0.0))
+            if expected[0] != actual[0] or not all(
+                math.isclose(e, a, rel_tol=1e-9, abs_tol=1e-6) for e, a in zip(expected[1:], actual[1:])
+            ):
+                mismatched.append(key)
+        return mismatched
+
+class PriceStatistics(RegistryListener, ContractListener):
+    """Per-product price distribution over listings and agreed contracts
+    
+    Each product keeps one sorted list of listing and agreed contract
+    prices, so the median and percentiles are read off by position, and
+    per-day quantity and value totals of agreed contracts for the volume
+    weighted average and trend. Listing and contract events adjust these
+    in place; nothing is recomputed over the history.
+    """
+    AGREED = ('Accepted', 'Delivered', 'Paid')
+    TREND_DAYS = 30
+    DAY_SECONDS = 86400
+    
+    def __init__(self, registry, store):
+        self.registry = registry
+        self._prices = {}
+        self._counts = {}
+        self._volume = {}
+        self._daily = {}
+        registry.subscribe(self)
+        store.subscribe(self)
+        for profile in registry.farmers:
+            self.user_added("Farmer", profile)
+        if store.storage:
+            for row in store.storage.contract_prices(self.AGREED):
+                self._agree(row['product'], row['quantity'], row['price'], Record.timestamp(row['created_at']), 1)
+        else:
+            for contract in store:
+                self.contract_added(contract)
+    
+    def _price(self, name, price, sign):
+        prices = self._prices.setdefault(name, [])
+        if sign > 0:
+            bisect.insort(prices, price)
+        else:
+            del prices[bisect.bisect_left(prices, price)]
+    
+    def _listing(self, product, sign):
+        self._price(product['name'], product['price'], sign)
+        self._counts.setdefault(product['name'], [0, 0])[0] += sign
+    
+    def _agree(self, name, quantity, price, created, sign):
+        self._price(name, price, sign)
+        self._counts.setdefault(name, [0, 0])[1] += sign
+        for entry in (self._volume.setdefault(name, [0.0, 0.0]),
+                      self._daily.setdefault(name, {}).setdefault(created // self.DAY_SECONDS, [0.0, 0.0])):
+            entry[0] += sign * quantity
+            entry[1] += sign * quantity * price
+    
+    def _contract(self, contract, sign):
+        self._agree(contract['product'], contract['quantity'], contract['price'], contract.created_timestamp, sign)
+    
+    def user_added(self, user_type, profile):
+        if user_type == "Farmer":
+            for product in profile['products']:
+                self._listing(product, 1)
+    
+    def product_added(self, farmer, product):
+        self._listing(product, 1)
+    
+    def product_removed(self, farmer, product):
+        self._listing(product, -1)
+    
+    def contract_added(self, contract):
+        if contract['status'] in self.AGREED:
+            self._contract(contract, 1)
+    
+    def status_changed(self, contract, previous):
+        agreed = contract['status'] in self.AGREED
+        if agreed != (previous in self.AGREED):
+            self._contract(contract, 1 if agreed else -1)
+    
+    @staticmethod
+    def _percentile(prices, q):
+        position = q * (len(prices) - 1)
+        low = int(position)
+        high = min(low + 1, len(prices) - 1)
+        return prices[low] + (prices[high] - prices[low]) * (position - low)
+    
+    def _vwap(self, daily, first, last):
+        quantity = value = 0.0
+        for day in range(first, last + 1):
+            entry = daily.get(day)
+            if entry:
+                quantity += entry[0]
+                value += entry[1]
+        return value / quantity if quantity > 0 else None
+    
+    def stats(self, name, now=None):
+        """Price statistics for a product, or None when it has no prices yet
+        
+        Percentiles cover current listings and agreed contracts; the
+        volume-weighted average covers agreed contracts. trend is the
+        fractional change of that average over the last TREND_DAYS
+        against the TREND_DAYS before, or None without both.
+        """
+        self.registry.users("Farmer")
+        prices = self._prices.get(name)
+        if not prices:
+            return None
+        listings, contracts = self._counts[name]
+        quantity, value = self._volume.get(name, (0.0, 0.0))
+        
+        today = (now or Record.timestamp()) // self.DAY_SECONDS
+        daily = self._daily.get(name, {})
+        recent = self._vwap(daily, today - self.TREND_DAYS + 1, today)
+        earlier = self._vwap(daily, today - 2 * self.TREND_DAYS + 1, today - self.TREND_DAYS)
+        return {
+            'listings': listings,
+            'contracts': contracts,
+            'min': prices[0],
+            'p25': self._percentile(prices, 0.25),
+            'median': self._percentile(prices, 0.5),
+            'p75': self._percentile(prices, 0.75),
+            'max': prices[-1],
+            'vwap': value / quantity if quantity > 0 else None,
+            'trend': recent / earlier - 1 if recent and earlier else None
+        }
+
+class FarmService:
+    """Headless FarmConnect core owning users, products and contracts
+    
+    All business rules live here so they can run without a Tk display.
+    Rejected input raises ValueError with a message fit to show the user.
+    Public methods hold a re-entrant lock, so the service may be shared
+    between the Tk thread and background tasks.
+    """
+    STATUSES = ('Pending', 'Accepted', 'Rejected', 'Delivered', 'Paid')
+    OPEN_STATUSES = ('Pending', 'Accepted')
+    # The statuses a contract must be in for a batch to move it to each status
+    TRANSITIONS = {'Accepted': ('Pending',), 'Rejected': ('Pending',), 'Delivered': ('Accepted',), 'Paid': ('Delivered',)}
+    
+    def __init__(self, db_path=None, hasher=None, gazetteer=None, catalog=None):
+        self.storage = SQLiteStorage(db_path) if db_path else None
+        self.hasher = hasher or PasswordHasher()
+        self.users = UserRegistry(self.storage)
+        self.contracts = ContractStore(self.storage)
+        self.analytics = ContractAnalytics(self.contracts)
+        self.catalog = catalog or Catalog.load()
+        self.matchmaking = MatchmakingEngine(self.users, catalog=self.catalog)
+        self.listings = ListingIndex(self.users, catalog=self.catalog)
+        self.prices = PriceStatistics(self.users, self.contracts)
+        self.geo = GeoIndex(self.users, gazetteer or Gazetteer.load())
+        self.names = TrigramIndex(self.users)
+        self.lock = threading.RLock()
+    
+    @staticmethod
+    def role(user_type):
+        """Normalise a user type to Farmer or Buyer"""
+        return "Farmer" if user_type.lower() == "farmer" else "Buyer"
+    
+    def validate_contact(self, contact):
+        """Validate phone number format"""
+        return re.match(r'^[0-9]{10,15}$', contact)
+    
+    def validate_password(self, password):
+        """Validate password strength"""
+        return len(password) >= 6
+    
+    # Users
+    
+    @synchronized
+    def validate_registration(self, name, contact, location, username, password):
+        """Check registration fields, returning them stripped"""
+        fields = {
+            'name': name.strip(),
+            'contact': contact.strip(),
+            'location': location.strip(),
+            'username': username.strip(),
+            'password': password
+        }
+        
+        if not all(fields.values()):
+            missing = [k for k, v in fields.items() if not v]
+            raise ValueError(f"Missing fields: {', '.join(missing)}")
+        
+        if not self.validate_contact(fields['contact']):
+            raise ValueError("Invalid contact number (10-15 digits)")
+        
+        if not self.validate_password(fields['password']):
+            raise ValueError("Password must be at least 6 characters")
+        
+        if self.users.exists(fields['username']):
+            raise ValueError("Username already exists")
+        
+        return fields
+    
+    def register(self, user_type, name, contact, location, username, password, interests=(), credentials=None):
+        """Validate and store a new farmer or buyer profile
+        
+        The password is hashed without holding the service lock. Pass
+        credentials already derived with self.hasher to skip hashing.
+        """
+        fields = self.validate_registration(name, contact, location, username, password)
+        interests = self.validate_interests(interests)
+        password = fields.pop('password')
+        credentials = credentials or self.hasher.hash(password)
+        
+        user_type = self.role(user_type)
+        user_profile = {
+            **fields,
+            'credentials': credentials,
+            'products' if user_type == "Farmer" else 'interests': [],
+            'registration_date': datetime.now().strftime("%Y-%m-%d")
+        }
+        if user_type == "Buyer":
+            user_profile['interests'] = interests
+        
+        with self.lock:
+            return self.users.add(user_type, user_profile)
+    
+    def validate_interests(self, interests):
+        """Return buyer interests as catalog product names, without blanks or repeats"""
+        names = []
+        for interest in interests:
+            if not interest.strip():
+                continue
+            item = self.catalog.find(interest)
+            if item is None:
+                raise ValueError(f"{interest.strip()} is not in the product catalog")
+            names.append(item['name'])
+        return list(dict.fromkeys(names))
+    
+    @synchronized
+    def find_user(self, user_type, username):
+        """Look up a profile by its exact username"""
+        return self.users.find(self.role(user_type), username)
+    
+    def check_password(self, user, password):
+        """Verify a password; safe to call from a worker thread
+        
+        Returns (valid, credentials), where credentials are freshly derived
+        when the stored ones are outdated and should be replaced.
+        """
+        if not self.hasher.verify(user['credentials'], password):
+            return False, None
+        if self.hasher.needs_rehash(user['credentials']):
+            return True, self.hasher.hash(password)
+        return True, None
+    
+    @synchronized
+    def complete_login(self, user, credentials=None):
+        """Store upgraded credentials after a successful check"""
+        if credentials:
+            self.users.update_credentials(user, credentials)
+        return user
+    
+    def login(self, user_type, username, password):
+        """Return the profile for valid credentials, otherwise None
+        
+        The password check runs without the service lock, so a login on a
+        worker thread does not hold up other callers.
+        """
+        user = self.find_user(user_type, username)
+        if user is None:
+            return None
+        valid, credentials = self.check_password(user, password)
+        return self.complete_login(user, credentials) if valid else None
+    
+    @synchronized
+    def directory(self, user_type):
+        """Return every registered farmer or buyer"""
+        return self.users.users(self.role(user_type))
+    
+    @synchronized
+    def search_users(self, user_type, query, k=10, cancelled=None):
+        """Fuzzy-match farmers or buyers by name, username or location, see TrigramIndex.search"""
+        return self.names.search(self.role(user_type), query, k, cancelled)
+    
+    @synchronized
+    def match_counterparties(self, user_type, user, k=None):
+        """Rank the buyers for a farmer, or the farmers for a buyer"""
+        if self.role(user_type) == "Farmer":
+            return self.matchmaking.match_buyers(user, k=k)
+        return self.matchmaking.match_farmers(user, k=k)
+    
+    def locate(self, location):
+        """Resolve a free-text location to (latitude, longitude), or None if it is not in the gazetteer"""
+        return self.geo.gazetteer.resolve(location)
+    
+    @synchronized
+    def nearby_counterparties(self, user_type, user, radius_km=None, k=None):
+        """Return (distance in km, profile) for the buyers near a farmer or farmers near a buyer
+        
+        Nearest first, limited to radius_km and to the k nearest when
+        given. Empty when the user's own location is not in the gazetteer.
+        """
+        point = self.locate(user['location'])
+        if point is None:
+            return []
+        other = "Buyer" if self.role(user_type) == "Farmer" else "Farmer"
+        if k:
+            return self.geo.nearest(other, point, k, radius_km)
+        return self.geo.within(other, point, radius_km)
+    
+    # Products
+    
+    @synchronized
+    def add_product(self, farmer, name, quantity, price, harvest_date):
+        """Validate and list a product for a farmer"""
+        if not all((name, quantity, price, harvest_date)):
+            raise ValueError("All fields are required")
+        
+        if quantity <= 0 or price <= 0:
+            raise ValueError("Quantity and price must be positive numbers")
+        
+        harvest = Record.ordinal(harvest_date)
+        if harvest is None:
+            raise ValueError("Harvest date must be a valid date (YYYY-MM-DD)")
+        
+        item = self.catalog.find(name)
+        if item is None:
+            raise ValueError(f"{name} is not in the product catalog")
+        return self.users.add_product(farmer, Product(item['name'], quantity, price, harvest))
+    
+    @synchronized
+    def remove_product(self, farmer, product):
+        """Withdraw one of a farmer's product listings"""
+        self.users.remove_product(farmer, product)
+    
+    def complete_products(self, prefix, limit=20):
+        """Catalog product names matching what has been typed, see Catalog.complete"""
+        return self.catalog.complete(prefix, limit)
+    
+    def catalog_item(self, name):
+        """Return a product's catalog entry with its category, variety and unit, or None"""
+        return self.catalog.find(name)
+    
+    @synchronized
+    def search_listings(self, **filters):
+        """Search product listings, see ListingIndex.search"""
+        return self.listings.search(**filters)
+    
+    @synchronized
+    def price_stats(self, products):
+        """Map each product name to its price statistics, see PriceStatistics.stats"""
+        return {name: self.prices.stats(name) for name in products}
+    
+    # Contracts
+    
+    def validate_terms(self, quantity, price, delivery_date, payment_terms):
+        """Check contract terms, returning the delivery date as an ordinal"""
+        if quantity <= 0 or price <= 0:
+            raise ValueError("Quantity and price must be positive numbers")
+        
+        if not delivery_date or not payment_terms:
+            raise ValueError("All fields are required")
+        
+        delivery = Record.ordinal(delivery_date)
+        if delivery is None:
+            raise ValueError("Delivery date must be a valid date (YYYY-MM-DD)")
+        return delivery
+    
+    @synchronized
+    def create_contract(self, user_type, user, counterparty, product, quantity, price,
+                        delivery_date, payment_terms):
+        """Validate and store a contract proposal between user and counterparty"""
+        delivery = self.validate_terms(quantity, price, delivery_date, payment_terms)
+        
+        if quantity > product['quantity']:
+            raise ValueError(f"Quantity cannot exceed available {product['quantity']} kg")
+        
+        is_farmer = self.role(user_type) == "Farmer"
+        contract = Contract(
+            id=self.contracts.allocate_id(),
+            farmer=user['username'] if is_farmer else counterparty['username'],
+            buyer=counterparty['username'] if is_farmer else user['username'],
+            product=product['name'],
+            quantity=quantity,
+            price=price,
+            delivery_date=delivery,
+            payment_terms=payment_terms
+        )
+        return self.contracts.add(contract)
+    
+    @synchronized
+    def import_contract(self, farmer, buyer, product, quantity, price, delivery_date, payment_terms,
+                        status='Pending', created_at=None):
+        """Store an existing contract, such as one from an accounting export, under a new id"""
+        delivery = self.validate_terms(quantity, price, delivery_date, payment_terms)
+        if status not in self.STATUSES:
+            raise ValueError(f"Unknown contract status: {status}")
+        if self.users.find("Farmer", farmer) is None:
+            raise ValueError(f"Unknown farmer: {farmer}")
+        if self.users.find("Buyer", buyer) is None:
+            raise ValueError(f"Unknown buyer: {buyer}")
+        if not product:
+            raise ValueError("Product is required")
+        if created_at:
+            try:
+                Record.timestamp(created_at)
+            except ValueError:
+                raise ValueError("Created time must look like YYYY-MM-DD HH:MM:SS") from None
+        
+        return self.contracts.add(Contract(
+            id=self.contracts.allocate_id(), farmer=farmer, buyer=buyer, product=product,
+            quantity=quantity, price=price, delivery_date=delivery, payment_terms=payment_terms,
+            status=status, created_at=created_at
+        ))
+    
+    @synchronized
+    def contracts_for(self, user_type, username):
+        """Return the contracts a farmer or buyer is party to"""
+        return self.contracts.for_user(user_type, username)
+    
+    @synchronized
+    def upcoming_deliveries(self, user_type, username, days, today=None):
+        """Return a party's open contracts due within the next days, soonest first"""
+        start = (today or date.today()).toordinal()
+        return [contract for contract in self.contracts.due_between(user_type, username, start, start + days)
+                if contract['status'] in self.OPEN_STATUSES]
+    
+    @synchronized
+    def contract_summary(self, user_type, username):
+        """Dashboard totals for a party, see ContractAnalytics.summary"""
+        return self.analytics.summary(user_type, username)
+    
+    @synchronized
+    def get_contract(self, contract_id):
+        """Look up a contract by id"""
+        return self.contracts.get(contract_id)
+    
+    @synchronized
+    def get_contracts(self, contract_ids):
+        """Look up several contracts by id, None for any that do not exist"""
+        return [self.contracts.get(contract_id) for contract_id in contract_ids]
+    
+    def check_transition(self, contract, status):
+        """Raise ValueError unless TRANSITIONS lets the contract move to status"""
+        if status not in self.STATUSES:
+            raise ValueError(f"Unknown contract status: {status}")
+        if contract['status'] not in self.TRANSITIONS.get(status, ()):
+            raise ValueError(f"Contract #{contract['id']} is {contract['status']} and cannot be marked {status}")
+    
+    @synchronized
+    def update_contract_status(self, contract_id, status, expected_version=None):
+        """Move a contract to a new status, see ContractStore.update_status
+        
+        A stale expected_version is reported as a conflict before the
+        transition is checked, as the caller's view of the status is stale too.
+        """
+        contract = self.contracts.get(contract_id)
+        if contract is not None:
+            self.contracts.check_version(contract, expected_version)
+            self.check_transition(contract, status)
+        return self.contracts.update_status(contract_id, status, expected_version)
+    
+    def make_payment(self, contract_id, expected_version=None):
+        """Simulate payment processing and mark a delivered contract as paid"""
+        return self.update_contract_status(contract_id, "Paid", expected_version)
+    
+    @synchronized
+    def update_contract_statuses(self, contracts, status):
+        """Move several contracts to a status and commit them in one transaction
+        
+        contracts are (contract_id, expected_version) pairs, the version
+        may be None. Contracts that are missing, changed since that version
+        or not in a status TRANSITIONS allows are left alone. Returns
+        (updated contracts, [(contract_id, reason)] for the rest). If the
+        commit fails, no contract is changed.
+        """
+        if status not in self.STATUSES:
+            raise ValueError(f"Unknown contract status: {status}")
+        updated = []
+        failed = []
+        before = []
+        try:
+            with self.batch():
+                for contract_id, expected_version in contracts:
+                    contract = self.contracts.get(contract_id)
+                    if contract is None:
+                        failed.append((contract_id, f"Contract #{contract_id} not found"))
+                        continue
+                    state = (contract['status'], contract['version'], contract['updated_at'])
+                    try:
+                        self.contracts.check_version(contract, expected_version)
+                        self.check_transition(contract, status)
+                        updated.append(self.contracts.update_status(contract_id, status, expected_version))
+                        before.append(state)
+                    except ValueError as e:
+                        failed.append((contract_id, str(e)))
+        except BaseException:
+            for contract, state in zip(reversed(updated), reversed(before)):
+                self.contracts.restore_status(contract, *state)
+            raise
+        return updated, failed
+    
+    def make_payments(self, contracts):
+        """Pay several delivered contracts at once, see update_contract_statuses"""
+        return self.update_contract_statuses(contracts, "Paid")
+    
+    # Bulk export
+    
+    def iter_users(self):
+        """Yield (user_type, profile) for every user, streaming from storage when there is one"""
+        if self.storage:
+            with self.lock:
+                self.storage.flush()
+            for row in self.storage.stream("SELECT * FROM users ORDER BY rowid"):
+                profile = {field: row[field] for field in SQLiteStorage.USER_FIELDS}
+                profile['interests'] = [name for name in row['interests'].split(",") if name]
+                yield row['user_type'], profile
+            return
+        with self.lock:
+            users = [("Farmer", p) for p in self.users.farmers] + [("Buyer", p) for p in self.users.buyers]
+        yield from users
+    
+    def iter_products(self):
+        """Yield (farmer username, product) for every listing"""
+        if self.storage:
+            with self.lock:
+                self.storage.flush()
+            for row in self.storage.stream("SELECT users.username AS farmer, products.* FROM products "
+                                           "JOIN users ON users.username_key = products.farmer_key "
+                                           "ORDER BY products.id"):
+                yield row['farmer'], Product(**{field: row[field] for field in SQLiteStorage.PRODUCT_FIELDS})
+            return
+        with self.lock:
+            products = [(farmer['username'], product) for farmer in self.users.farmers
+                        for product in farmer['products']]
+        yield from products
+    
+    def iter_contracts(self):
+        """Yield every contract in id order"""
+        if self.storage:
+            with self.lock:
+                self.storage.flush()
+            for row in self.storage.stream("SELECT * FROM contracts ORDER BY id"):
+                yield Contract(**row)
+            return
+        with self.lock:
+            contracts = list(self.contracts)
+        yield from contracts
+    
+    # Persistence
+    
+    @contextmanager
+    def batch(self):
+        """Hold the lock and commit everything written in the body in one transaction, see SQLiteStorage.batch"""
+        with self.lock:
+            if self.storage:
+                with self.storage.batch():
+                    yield
+            else:
+                yield
+    
+    @synchronized
+    def flush(self):
+        """Commit queued writes"""
+        if self.storage:
+            self.storage.flush()
+    
+    @synchronized
+    def close(self):
+        """Commit queued writes and release the database"""
+        if self.storage:
+            self.storage.close()
@@ -0,0 +1,255 @@
+import argparse
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from farm_core import Contract, FarmService, Product
+
+USER_COLUMNS = ('user_type', 'username', 'name', 'contact', 'location', 'registration_date', 'interests')
+PRODUCT_COLUMNS = ('farmer',) + Product.FIELDS
+CONTRACT_COLUMNS = Contract.FIELDS
+# Multi-valued CSV cells, such as buyer interests, are separated by semicolons
+LIST_SEPARATOR = ";"
+
+def read_records(path):
+    """Yield (line number, row) from a CSV file with a header row or a JSON lines file
+    
+    Rows are dicts, or None for a JSON line that does not hold an object.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+
+def write_records(path, columns, rows):
+    """Write dict rows to CSV or JSON lines as they are produced; returns the row count"""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({column: LIST_SEPARATOR.join(row[column]) if isinstance(row.get(column), list)
+                                 else row.get(column) for column in columns})
+                count += 1
+        else:
+            for row in rows:
+                f.write(json.dumps({column: row.get(column) for column in columns}) + "\n")
+                count += 1
+    return count
+
+def export_users(service, path):
+    """Export every profile, without credentials"""
+    return write_records(path, USER_COLUMNS, (
+        {**profile, 'user_type': user_type} for user_type, profile in service.iter_users()
+    ))
+
+def export_products(service, path):
+    """Export every product listing with its farmer's username"""
+    return write_records(path, PRODUCT_COLUMNS, (
+        {**product.as_dict(), 'farmer': farmer} for farmer, product in service.iter_products()
+    ))
+
+def export_contracts(service, path):
+    """Export every contract, for accounting"""
+    return write_records(path, CONTRACT_COLUMNS, (contract.as_dict() for contract in service.iter_contracts()))
+
+class BulkImporter:
+    """Streams users, products or contracts from CSV or JSON lines into a FarmService
+    
+    Rows pass the same checks as the interactive forms. Valid rows are
+    stored a batch at a time inside one FarmService.batch(), which holds
+    the lock and commits the batch as a single transaction with one
+    executemany per run of the same statement. Rejected rows are counted,
+    the first MAX_ERRORS are kept in the report, and all of them go to
+    errors_path as they occur.
+    """
+    MAX_ERRORS = 100
+    
+    def __init__(self, service, batch_size=500, errors_path=None, progress=None, cancelled=None):
+        self.service = service
+        self.batch_size = batch_size
+        self.errors_path = errors_path
+        self.progress = progress
+        self.cancelled = cancelled
+        self._errors_file = None
+    
+    def _report(self):
+        return {'rows': 0, 'imported': 0, 'failed': 0, 'errors': [], 'cancelled': False}
+    
+    def _batches(self, path, report):
+        records = read_records(path)
+        while True:
+            if self.cancelled and self.cancelled():
+                report['cancelled'] = True
+                return
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                return
+            report['rows'] += len(batch)
+            valid = []
+            for line, row in batch:
+                if row is None:
+                    self._reject(report, line, "Not a JSON object")
+                else:
+                    valid.append((line, row))
+            yield valid
+    
+    def _reject(self, report, line, error):
+        report['failed'] += 1
+        if len(report['errors']) < self.MAX_ERRORS:
+            report['errors'].append((line, str(error)))
+        if self.errors_path:
+            if self._errors_file is None:
+                self._errors_file = open(self.errors_path, 'w', newline='', encoding='utf-8')
+                self._errors_writer = csv.writer(self._errors_file)
+                self._errors_writer.writerow(('line', 'error'))
+            self._errors_writer.writerow((line, str(error)))
+    
+    def _progress(self, report):
+        if self.progress:
+            self.progress(report['rows'])
+    
+    def _run(self, path, batches):
+        report = self._report()
+        try:
+            for batch in self._batches(path, report):
+                batches(batch, report)
+                self._progress(report)
+        finally:
+            if self._errors_file is not None:
+                self._errors_file.close()
+                self._errors_file = None
+        return report
+    
+    @staticmethod
+    def _text(row, field):
+        value = row.get(field)
+        return "" if value is None else str(value).strip()
+    
+    @staticmethod
+    def _number(row, field):
+        try:
+            return float(row.get(field))
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number") from None
+    
+    @staticmethod
+    def _list(row, field):
+        value = row.get(field) or []
+        if isinstance(value, str):
+            return value.split(LIST_SEPARATOR)
+        if not isinstance(value, list):
+            raise ValueError(f"{field} must be a list or {LIST_SEPARATOR}-separated text")
+        return [str(item) for item in value]
+    
+    def import_users(self, path):
+        """Register farmers and buyers; columns as USER_COLUMNS plus password"""
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as hashers:
+            def store(batch, report):
+                candidates = []
+                for line, row in batch:
+                    try:
+                        user_type = self._text(row, 'user_type').title()
+                        if user_type not in ("Farmer", "Buyer"):
+                            raise ValueError("user_type must be Farmer or Buyer")
+                        fields = self.service.validate_registration(
+                            *(self._text(row, field) for field in ('name', 'contact', 'location', 'username')),
+                            self._text(row, 'password')
+                        )
+                        candidates.append((line, user_type, fields, self.service.validate_interests(self._list(row, 'interests'))))
+                    except ValueError as e:
+                        self._reject(report, line, e)
+                # Key derivation dominates; hashlib releases the GIL so it scales across threads
+                hashes = list(hashers.map(self.service.hasher.hash,
+                                          [fields['password'] for _, _, fields, _ in candidates]))
+                with self.service.batch():
+                    for (line, user_type, fields, interests), credentials in zip(candidates, hashes):
+                        try:
+                            self.service.register(user_type, **fields, interests=interests, credentials=credentials)
+                            report['imported'] += 1
+                        except ValueError as e:
+                            self._reject(report, line, e)
+            return self._run(path, store)
+    
+    def import_products(self, path):
+        """List products for existing farmers; columns farmer, name, quantity, price, harvest_date"""
+        def store(batch, report):
+            with self.service.batch():
+                for line, row in batch:
+                    try:
+                        farmer = self.service.find_user("Farmer", self._text(row, 'farmer'))
+                        if farmer is None:
+                            raise ValueError(f"Unknown farmer: {self._text(row, 'farmer')}")
+                        self.service.add_product(
+                            farmer, self._text(row, 'name'), self._number(row, 'quantity'),
+                            self._number(row, 'price'), self._text(row, 'harvest_date')
+                        )
+                        report['imported'] += 1
+                    except ValueError as e:
+                        self._reject(report, line, e)
+        return self._run(path, store)
+    
+    def import_contracts(self, path):
+        """Store contracts between existing users; columns as CONTRACT_COLUMNS, ids are reassigned"""
+        def store(batch, report):
+            with self.service.batch():
+                for line, row in batch:
+                    try:
+                        self.service.import_contract(
+                            self._text(row, 'farmer'), self._text(row, 'buyer'), self._text(row, 'product'),
+                            self._number(row, 'quantity'), self._number(row, 'price'),
+                            self._text(row, 'delivery_date'), self._text(row, 'payment_terms'),
+                            status=self._text(row, 'status') or 'Pending',
+                            created_at=self._text(row, 'created_at') or None
+                        )
+                        report['imported'] += 1
+                    except ValueError as e:
+                        self._reject(report, line, e)
+        return self._run(path, store)
+
+IMPORTS = {'users': BulkImporter.import_users, 'products': BulkImporter.import_products,
+           'contracts': BulkImporter.import_contracts}
+EXPORTS = {'users': export_users, 'products': export_products, 'contracts': export_contracts}
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export FarmConnect data as CSV or JSON lines")
+    parser.add_argument('action', choices=('import', 'export'))
+    parser.add_argument('kind', choices=tuple(IMPORTS))
+    parser.add_argument('path', help="a .csv file, anything else is read and written as JSON lines")
+    parser.add_argument('--db', default="farmconnect.db")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--errors', help="write every rejected row's line and reason to this CSV file")
+    args = parser.parse_args()
+    
+    service = FarmService(args.db)
+    try:
+        if args.action == 'export':
+            print(f"Exported {EXPORTS[args.kind](service, args.path)} {args.kind}")
+            return
+        importer = BulkImporter(service, args.batch_size, args.errors,
+                                progress=lambda rows: print(f"  {rows} rows read", end="\r"))
+        report = IMPORTS[args.kind](importer, args.path)
+        if report['rows']:
+            # End the progress line so the summary does not overwrite it
+            print()
+        print(f"Imported {report['imported']} of {report['rows']} {args.kind}, {report['failed']} rejected")
+        for line, error in report['errors']:
+            print(f"  line {line}: {error}")
+    finally:
+        service.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+from farm_bench import LOCATIONS, PAYMENT_TERMS
+from farm_core import DEFAULT_PRODUCTS, FarmService, PasswordHasher
+from farm_metrics import Metrics, TimedLock
+from farm_server import FarmServer, RemoteService
+
+# Relative weights of each action; register starts a registration session, the rest run inside logged-in sessions
+MIXES = {
+    'balanced': {'register': 1, 'add_product': 2, 'search': 2, 'create_contract': 3, 'accept': 2, 'deliver': 2, 'pay': 2},
+    'onboarding': {'register': 6, 'add_product': 4, 'search': 2, 'create_contract': 1, 'accept': 1, 'deliver': 1, 'pay': 1},
+    'trading': {'register': 0, 'add_product': 1, 'search': 1, 'create_contract': 4, 'accept': 3, 'deliver': 3, 'pay': 3}
+}
+ROLE_ACTIONS = {'Farmer': ('add_product', 'deliver'), 'Buyer': ('search', 'create_contract', 'accept', 'pay')}
+
+def parse_mix(text):
+    """A preset name from MIXES, or action=weight pairs separated by commas"""
+    if text in MIXES:
+        return dict(MIXES[text])
+    mix = {action: 0 for action in MIXES['balanced']}
+    for item in text.split(","):
+        action, _, weight = item.partition("=")
+        if action.strip() not in mix:
+            raise argparse.ArgumentTypeError(f"unknown action {action.strip()!r}, expected one of {', '.join(mix)}")
+        mix[action.strip()] = float(weight)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("at least one action needs a positive weight")
+    return mix
+
+class ProfiledServer(FarmServer):
+    """FarmServer that times every request and how long it waits for and holds the service lock"""
+    def __init__(self, service, metrics, **kwargs):
+        super().__init__(service, **kwargs)
+        self.metrics = metrics
+        service.lock = TimedLock(service.lock, metrics)
+    
+    def handle(self, session, line):
+        try:
+            method = str(json.loads(line).get('method'))
+        except (ValueError, AttributeError):
+            method = "invalid"
+        with self.metrics.operation('server', method):
+            return super().handle(session, line)
+
+class ServerThread:
+    """Runs a ProfiledServer on an asyncio loop in a background thread"""
+    def __init__(self, service, metrics, workers):
+        self.server = ProfiledServer(service, metrics, port=0, max_workers=workers)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+    
+    def start(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self.loop).result()
+        return self.server.host, self.server.port
+    
+    def stop(self):
+        async def close():
+            self.server.server.close()
+            await self.server.server.wait_closed()
+            # Stop the periodic flush; the caller closes the service, which commits the rest
+            flushers = [task for task in asyncio.all_tasks()
+                        if task.get_coro().__name__ == '_flush_periodically']
+            for task in flushers:
+                task.cancel()
+            await asyncio.gather(*flushers, return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.server.executor.shutdown(wait=True)
+
+class LoadWorker:
+    """Simulated sessions driving one server from one process
+    
+    Each thread holds one connection and runs sessions on it: either a
+    registration, or a login followed by actions for that role drawn from
+    the mix. The users, listings and contracts a worker creates are the
+    ones its sessions act on, so workers never race each other for the
+    same contract; they still contend for the server's lock.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.metrics = Metrics()
+        self.lock = threading.Lock()
+        self.users = {'Farmer': [], 'Buyer': []}
+        self.listings = []
+        # Contracts waiting on their next step, keyed by the party who takes it
+        self.pending = {}
+        self.accepted = {}
+        self.delivered = {}
+        self._serial = 0
+    
+    def run(self):
+        threads = []
+        for index in range(self.config['threads']):
+            thread = threading.Thread(target=self._thread, args=(index,))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return self.metrics.snapshot()
+    
+    def _share(self, total, index):
+        """This thread's part of a total split across every thread of every process"""
+        slots = self.config['processes'] * self.config['threads']
+        slot = self.config['worker'] * self.config['threads'] + index
+        return total // slots + (slot < total % slots)
+    
+    def _thread(self, index):
+        rng = random.Random(f"{self.config['seed']}/{self.config['worker']}/{index}")
+        service = RemoteService(*self.config['address'])
+        try:
+            # Seed each process with its share of users, farmers with a couple of listings
+            for _ in range(self._share(self.config['farmers'], index)):
+                farmer = self._register(service, rng, "Farmer")
+                if farmer and self._login(service, "Farmer", farmer):
+                    for _ in range(2):
+                        self._step('add_product', service, rng, farmer)
+            for _ in range(self._share(self.config['buyers'], index)):
+                self._register(service, rng, "Buyer")
+                
+            mix = self.config['mix']
+            kinds = ['register', 'Farmer', 'Buyer']
+            weights = [mix['register']] + [sum(mix[action] for action in ROLE_ACTIONS[role]) for role in kinds[1:]]
+            for _ in range(self._share(self.config['sessions'], index)):
+                kind = rng.choices(kinds, weights)[0]
+                with self.lock:
+                    users = list(self.users.get(kind, ()))
+                if kind == 'register' or not users:
+                    self._register(service, rng, kind if kind != 'register' else rng.choice(("Farmer", "Buyer")))
+                    continue
+                user = rng.choice(users)
+                if not self._login(service, kind, user):
+                    continue
+                actions = ROLE_ACTIONS[kind]
+                for _ in range(self.config['actions_per_session']):
+                    self._step(rng.choices(actions, [mix[action] for action in actions])[0], service, rng, user)
+        finally:
+            service.close()
+    
+    def _timed(self, name, func, *args, **kwargs):
+        try:
+            with self.metrics.timer('client', name):
+                return func(*args, **kwargs)
+        except Exception as e:
+            self.metrics.increment('errors', f"{name}: {type(e).__name__}")
+            return None
+    
+    def _register(self, service, rng, user_type):
+        with self.lock:
+            self._serial += 1
+            username = f"load{self.config['worker']}_{self._serial}"
+        profile = self._timed(
+            'register', service.register, user_type, f"{user_type} {username}",
+            "".join(rng.choice("0123456789") for _ in range(10)), rng.choice(LOCATIONS),
+            username, "password", interests=rng.sample(DEFAULT_PRODUCTS, 3)
+        )
+        if profile is not None:
+            with self.lock:
+                self.users[user_type].append(username)
+        return username if profile is not None else None
+    
+    def _login(self, service, user_type, username):
+        return self._timed('login', service.login, user_type, username, "password") is not None
+    
+    def _take(self, queue, user):
+        with self.lock:
+            contracts = queue.get(user)
+            return contracts.pop() if contracts else None
+    
+    def _put(self, queue, user, contract):
+        with self.lock:
+            queue.setdefault(user, []).append(contract)
+    
+    def _step(self, action, service, rng, user):
+        """Run one action as the logged-in user; count it as skipped when there is nothing to act on"""
+        contract = None
+        if action == 'add_product':
+            harvest = (date.today() + timedelta(days=rng.randrange(7, 120))).isoformat()
+            product = self._timed('add_product', service.add_product, {'products': []}, rng.choice(DEFAULT_PRODUCTS),
+                                  float(rng.randrange(100, 5000, 50)), float(rng.randrange(10, 80)), harvest)
+            if product is not None:
+                with self.lock:
+                    self.listings.append((user, product))
+            return
+        if action == 'search':
+            self._timed('search', service.search_listings, product=rng.choice(DEFAULT_PRODUCTS), max_price=50.0)
+            return
+        if action == 'create_contract':
+            with self.lock:
+                listing = rng.choice(self.listings) if self.listings else None
+            if listing is not None:
+                farmer, product = listing
+                delivery = (date.today() + timedelta(days=rng.randrange(14, 180))).isoformat()
+                contract = self._timed('create_contract', service.create_contract, "Buyer", None,
+                                       {'username': farmer}, product, float(rng.randrange(1, 10)), product['price'],
+                                       delivery, rng.choice(PAYMENT_TERMS))
+                if contract is not None:
+                    self._put(self.pending, user, contract)
+                return
+        elif action == 'accept':
+            contract = self._take(self.pending, user)
+            if contract is not None:
+                contract = self._timed('accept', service.update_contract_status, contract['id'], 'Accepted',
+                                       contract['version'])
+                if contract is not None:
+                    self._put(self.accepted, contract['farmer'], contract)
+                return
+        elif action == 'deliver':
+            contract = self._take(self.accepted, user)
+            if contract is not None:
+                contract = self._timed('deliver', service.update_contract_status, contract['id'], 'Delivered',
+                                       contract['version'])
+                if contract is not None:
+                    self._put(self.delivered, contract['buyer'], contract)
+                return
+        elif action == 'pay':
+            contract = self._take(self.delivered, user)
+            if contract is not None:
+                self._timed('pay', service.make_payment, contract['id'], contract['version'])
+                return
+        self.metrics.increment('skipped', action)
+
+def run_worker(config):
+    """Process pool entry point; returns the worker's Metrics snapshot"""
+    return LoadWorker(config).run()
+
+def report(metrics, elapsed, top):
+    """Print client throughput and latency, then the server methods holding the lock longest"""
+    snapshot = metrics.snapshot()
+    client = snapshot['latency'].get('client', {})
+    errors = snapshot['counters'].get('errors', {})
+    total = sum(summary['count'] for summary in client.values())
+    print(f"{total} operations in {elapsed:.1f}s, {total / elapsed:.0f} ops/s")
+    print(f"  {'operation':<16}{'count':>8}{'ops/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for name, summary in sorted(client.items()):
+        failed = sum(count for key, count in errors.items() if key.startswith(f"{name}: "))
+        print(f"  {name:<16}{summary['count']:>8}{summary['count'] / elapsed:>9.1f}{summary['p50_ms']:>10.2f}"
+              f"{summary['p99_ms']:>10.2f}{summary['max_ms']:>10.1f}{failed:>8}")
+    for key, count in sorted(errors.items()):
+        print(f"  error {key} x{count}")
+    skipped = snapshot['counters'].get('skipped', {})
+    if skipped:
+        print("  skipped, nothing to act on: " + ", ".join(f"{name} x{count}" for name, count in sorted(skipped.items())))
+        
+    holds = snapshot['latency'].get('lock_hold', {})
+    waits = snapshot['latency'].get('lock_wait', {})
+    if not holds:
+        return snapshot
+    held = {name: summary['mean_ms'] * summary['count'] for name, summary in holds.items()}
+    total_held = sum(held.values()) or 1.0
+    print(f"Lock contention hotspots (service lock held {sum(held.values()) / 1000 / elapsed:.0%} of the run)")
+    print(f"  {'method':<24}{'held ms':>10}{'share':>8}{'hold p99':>10}{'waited ms':>11}{'wait p99':>10}")
+    for name in sorted(held, key=held.get, reverse=True)[:top]:
+        wait = waits.get(name, {'mean_ms': 0.0, 'count': 0, 'p99_ms': 0.0})
+        print(f"  {name:<24}{held[name]:>10.1f}{held[name] / total_held:>8.0%}{holds[name]['p99_ms']:>10.2f}"
+              f"{wait['mean_ms'] * wait['count']:>11.1f}{wait['p99_ms']:>10.2f}")
+    return snapshot
+
+def run(args):
+    metrics = Metrics()
+    server = None
+    if args.server:
+        host, _, port = args.server.rpartition(":")
+        address = (host or "127.0.0.1", int(port))
+    else:
+        hasher = PasswordHasher()
+        if not args.production_hashing:
+            # Keep key derivation from drowning out the workflow being measured
+            hasher.SCRYPT_PARAMS = {'n': 2 ** 8, 'r': 8, 'p': 1}
+            hasher.PBKDF2_PARAMS = {'iterations': 1000}
+        service = FarmService(args.db, hasher=hasher)
+        server = ServerThread(service, metrics, args.server_workers)
+        address = server.start()
+        
+    configs = [{
+        'worker': worker, 'processes': args.processes, 'threads': args.threads, 'address': address,
+        'seed': args.seed, 'mix': args.mix, 'farmers': args.farmers, 'buyers': args.buyers,
+        'sessions': args.sessions, 'actions_per_session': args.actions_per_session
+    } for worker in range(args.processes)]
+    print(f"{args.processes} processes x {args.threads} sessions against {address[0]}:{address[1]}")
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            for snapshot in pool.map(run_worker, configs):
+                metrics.merge(snapshot)
+        elapsed = time.perf_counter() - start
+    finally:
+        if server:
+            server.stop()
+            service.close()
+            
+    snapshot = report(metrics, elapsed, args.top)
+    with open(args.output, 'w') as f:
+        json.dump({
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'elapsed_s': elapsed,
+                **{key: value for key, value in vars(args).items() if key != 'output'}
+            },
+            'metrics': snapshot
+        }, f, indent=2)
+    print(f"Results written to {args.output}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the FarmConnect contract workflow from many concurrent sessions")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=8, help="concurrent sessions per process, one connection each")
+    parser.add_argument('--farmers', type=int, default=1000, help="farmers registered before the timed sessions")
+    parser.add_argument('--buyers', type=int, default=1000, help="buyers registered before the timed sessions")
+    parser.add_argument('--sessions', type=int, default=5000, help="sessions in total across every process")
+    parser.add_argument('--actions-per-session', type=int, default=5)
+    parser.add_argument('--mix', type=parse_mix, default=MIXES['balanced'],
+                        help=f"workload preset ({', '.join(MIXES)}) or weights like register=1,create_contract=3")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--server', metavar="HOST:PORT",
+                        help="load a running FarmConnect server instead of one started here (no lock profile)")
+    parser.add_argument('--server-workers', type=int, default=8, help="request threads of the server started here")
+    parser.add_argument('--db', default=None, help="SQLite file for the server started here (default: in memory)")
+    parser.add_argument('--production-hashing', action='store_true',
+                        help="hash passwords at full cost instead of a cheap setting")
+    parser.add_argument('--top', type=int, default=10, help="lock hotspots to list")
+    parser.add_argument('--output', default="load_results.json")
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+from contextlib import contextmanager
+from datetime import datetime
+import bisect
+import functools
+import json
+import threading
+import time
+
+class LatencyHistogram:
+    """Latency distribution in log-linear buckets from 0.05 ms to about 26 s
+    
+    Each doubling is split into 16 buckets about 4.4% wide, so memory is
+    constant however many samples are added. Percentiles interpolate
+    linearly within the bucket they fall in, capped at the maximum.
+    """
+    BOUNDS_MS = tuple(0.05 * 2 ** (i / 16) for i in range(19 * 16 + 1))
+    
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    def add(self, ms):
+        self.buckets[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+    
+    def merge(self, summary):
+        """Add the samples behind another histogram's summary(), such as one from a worker process"""
+        for bound, n in summary['buckets']:
+            self.buckets[len(self.BOUNDS_MS) if bound is None else bisect.bisect_left(self.BOUNDS_MS, bound)] += n
+        self.count += summary['count']
+        self.total_ms += summary['mean_ms'] * summary['count']
+        self.max_ms = max(self.max_ms, summary['max_ms'])
+    
+    def percentile(self, q):
+        """Estimate the q-th quantile (0-1) in milliseconds"""
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, n in zip(self.BOUNDS_MS, self.buckets):
+            if n and seen + n >= rank:
+                return min(lower + (bound - lower) * (rank - seen) / n, self.max_ms)
+            seen += n
+            lower = bound
+        return self.max_ms
+    
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max_ms,
+            'buckets': [[bound, n] for bound, n in zip(self.BOUNDS_MS + (None,), self.buckets) if n]
+        }
+
+class Metrics:
+    """Latency histograms and counters grouped by category, safe to share between threads"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+    
+    def reset(self):
+        """Discard everything recorded so far"""
+        with self._lock:
+            self.started = time.time()
+            self._latencies = {}
+            self._counters = {}
+    
+    def record(self, category, name, ms):
+        """Add one latency sample in milliseconds"""
+        with self._lock:
+            histogram = self._latencies.setdefault(category, {}).get(name)
+            if histogram is None:
+                histogram = self._latencies[category][name] = LatencyHistogram()
+            histogram.add(ms)
+    
+    def increment(self, category, name, delta=1):
+        with self._lock:
+            counters = self._counters.setdefault(category, {})
+            counters[name] = counters.get(name, 0) + delta
+    
+    @contextmanager
+    def timer(self, category, name):
+        """Time the body of a with statement"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(category, name, (time.perf_counter() - start) * 1000)
+    
+    @contextmanager
+    def operation(self, category, name):
+        """Time the body like timer(), labelling TimedLock samples taken inside it with name"""
+        previous = getattr(self._local, 'operation', None)
+        self._local.operation = name
+        try:
+            with self.timer(category, name):
+                yield
+        finally:
+            self._local.operation = previous
+    
+    def current_operation(self):
+        return getattr(self._local, 'operation', None) or "other"
+    
+    def timed(self, category, name, func):
+        """Wrap func so every call is recorded under category and name"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(category, name, (time.perf_counter() - start) * 1000)
+        return wrapper
+    
+    def instrument(self, obj, category):
+        """Time every public method of obj by shadowing it on the instance
+        
+        Methods are picked from the class, so properties are never evaluated.
+        """
+        for name in dir(type(obj)):
+            attribute = getattr(type(obj), name, None)
+            if name.startswith('_') or not callable(attribute) or isinstance(attribute, type):
+                continue
+            setattr(obj, name, self.timed(category, name, getattr(obj, name)))
+        return obj
+    
+    def snapshot(self):
+        """Return everything recorded so far as plain data"""
+        with self._lock:
+            return {
+                'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                'uptime_s': time.time() - self.started,
+                'latency': {category: {name: histogram.summary() for name, histogram in series.items()}
+                            for category, series in self._latencies.items()},
+                'counters': {category: dict(counters) for category, counters in self._counters.items()}
+            }
+    
+    def merge(self, snapshot):
+        """Fold in another Metrics' snapshot()"""
+        with self._lock:
+            for category, series in snapshot['latency'].items():
+                for name, summary in series.items():
+                    histogram = self._latencies.setdefault(category, {}).get(name)
+                    if histogram is None:
+                        histogram = self._latencies[category][name] = LatencyHistogram()
+                    histogram.merge(summary)
+            for category, counters in snapshot['counters'].items():
+                totals = self._counters.setdefault(category, {})
+                for name, value in counters.items():
+                    totals[name] = totals.get(name, 0) + value
+    
+    def dump(self, path):
+        """Write a snapshot to a JSON file"""
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+class TimedLock:
+    """Lock wrapper recording how long each outermost acquire waited and held the lock
+    
+    Samples go to the 'lock_wait' and 'lock_hold' categories under the
+    Metrics operation running on the acquiring thread. Re-entrant
+    acquires of an RLock are passed through untimed.
+    """
+    def __init__(self, lock, metrics):
+        self._lock = lock
+        self.metrics = metrics
+        self._local = threading.local()
+    
+    def acquire(self, blocking=True, timeout=-1):
+        depth = getattr(self._local, 'depth', 0)
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._local.depth = depth + 1
+            if not depth:
+                self._local.acquired = time.perf_counter()
+                self.metrics.record('lock_wait', self.metrics.current_operation(),
+                                    (self._local.acquired - start) * 1000)
+        return acquired
+    
+    def release(self):
+        self._local.depth -= 1
+        if not self._local.depth:
+            self.metrics.record('lock_hold', self.metrics.current_operation(),
+                                (time.perf_counter() - self._local.acquired) * 1000)
+        self._lock.release()
+    
+    def __enter__(self):
+        return self.acquire()
+    
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,552 @@
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from farm_core import Catalog, ConflictError, Contract, FarmService, Product, Record
+
+# Error types that cross the wire, most specific first
+ERRORS = (ConflictError, PermissionError, LookupError, ValueError)
+
+def public_profile(profile):
+    """Copy a profile without its credentials, with products as plain dicts"""
+    data = {field: value for field, value in profile.items() if field != 'credentials'}
+    if 'products' in data:
+        data['products'] = [product.as_dict() for product in data['products']]
+    return data
+
+def encode(value):
+    if isinstance(value, Record):
+        return value.as_dict()
+    raise TypeError(f"{type(value).__name__} is not JSON serialisable")
+
+class FarmServer:
+    """Serves a FarmService to many clients as JSON lines over TCP
+    
+    Each request is one line {"id", "method", "params"} answered by one
+    line {"id", "result"} or {"id", "error": {"type", "message"}}.
+    Connections stay open between requests and clients may pipeline:
+    requests on a connection are handled and answered in the order they
+    arrive. Service calls run on a thread pool, where FarmService's lock
+    keeps them consistent. Logging in binds the connection to that user.
+    """
+    IDLE_TIMEOUT = 300
+    FLUSH_INTERVAL = 0.5
+    LINE_LIMIT = 1 << 20
+    # Slow password hashing must not hold the service lock
+    UNLOCKED = ('register', 'login', 'locate', 'catalog', 'complete_products', 'catalog_item')
+    ROLE_STATUSES = {'Farmer': ('Delivered',), 'Buyer': ('Accepted', 'Rejected')}
+    # JSON types each parameter may take; None only where the handler defaults to None
+    NUMBER = (int, float)
+    PARAM_TYPES = {
+        'user_type': str, 'name': str, 'contact': str, 'location': str, 'username': str,
+        'password': str, 'query': str, 'prefix': str, 'product': str, 'counterparty': str,
+        'status': str, 'payment_terms': str, 'harvest_date': (str, int), 'delivery_date': (str, int),
+        'k': int, 'limit': int, 'days': int, 'product_id': int, 'contract_id': int,
+        'expected_version': int, 'harvest_from': int, 'harvest_to': int,
+        'radius_km': NUMBER, 'quantity': NUMBER, 'price': NUMBER,
+        'min_price': NUMBER, 'max_price': NUMBER, 'min_quantity': NUMBER,
+        'interests': list, 'products': list, 'contracts': list
+    }
+    LIST_ITEMS = {'interests': str, 'products': str}
+    
+    def __init__(self, service, host="127.0.0.1", port=8765, max_workers=8):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="farm-server")
+        self.server = None
+    
+    async def start(self):
+        """Start listening; with port 0 the chosen port is stored in self.port"""
+        self.server = await asyncio.start_server(self._serve, self.host, self.port, limit=self.LINE_LIMIT)
+        self.port = self.server.sockets[0].getsockname()[1]
+        asyncio.get_running_loop().create_task(self._flush_periodically())
+        return self.server
+    
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+    
+    async def _flush_periodically(self):
+        # Writes are batched like the Tk client's delayed save
+        loop = asyncio.get_running_loop()
+        while self.server.is_serving():
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            await loop.run_in_executor(self.executor, self.service.flush)
+    
+    async def _serve(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        session = {'user_type': None, 'user': None}
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.IDLE_TIMEOUT)
+                if not line:
+                    break
+                writer.write(await loop.run_in_executor(self.executor, self.handle, session, line))
+                await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            # Idle, dropped or sent a line over LINE_LIMIT
+            pass
+        finally:
+            writer.close()
+    
+    def handle(self, session, line):
+        """Run one request line and return the encoded response line"""
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Bad request")
+            request_id = request.get('id')
+            method = request.get('method')
+            params = request.get('params')
+            if params is None:
+                params = {}
+            if not isinstance(method, str) or not isinstance(params, dict):
+                raise ValueError("Bad request")
+            handler = getattr(self, f"api_{method}", None)
+            if handler is None:
+                raise LookupError(f"Unknown method: {method}")
+            self._check_params(handler, session, params)
+            if method in self.UNLOCKED:
+                result = handler(session, **params)
+            else:
+                with self.service.lock:
+                    result = handler(session, **params)
+            response = {'id': request_id, 'result': result}
+        except ERRORS as e:
+            response = self._error(request_id, e)
+        except Exception as e:
+            traceback.print_exc()
+            response = {'id': request_id, 'error': {'type': 'ServerError', 'message': "Internal server error"}}
+        return (json.dumps(response, default=encode) + "\n").encode()
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _signature(handler):
+        return inspect.signature(handler)
+    
+    def _check_params(self, handler, session, params):
+        """Raise ValueError unless params name the handler's arguments with values of the right types"""
+        signature = self._signature(handler)
+        try:
+            signature.bind(session, **params)
+        except TypeError as e:
+            raise ValueError(f"Bad parameters: {e}") from None
+        for name, value in params.items():
+            if value is None and signature.parameters[name].default is None:
+                continue
+            if not self._has_type(value, self.PARAM_TYPES[name]):
+                raise ValueError(f"Bad parameters: {name} has the wrong type")
+            if name in self.LIST_ITEMS and not all(isinstance(item, self.LIST_ITEMS[name]) for item in value):
+                raise ValueError(f"Bad parameters: {name} has items of the wrong type")
+            if name == 'contracts' and not all(
+                isinstance(item, list) and len(item) == 2 and self._has_type(item[0], int)
+                and (item[1] is None or self._has_type(item[1], int)) for item in value
+            ):
+                raise ValueError("Bad parameters: contracts must be [contract_id, expected_version] pairs")
+    
+    @staticmethod
+    def _has_type(value, types):
+        # JSON true and false decode to bool, which is an int subclass
+        return isinstance(value, types) and not isinstance(value, bool)
+    
+    @staticmethod
+    def _error(request_id, error):
+        name = next(cls.__name__ for cls in ERRORS if isinstance(error, cls))
+        return {'id': request_id, 'error': {'type': name, 'message': str(error)}}
+    
+    def _user(self, session, user_type=None):
+        if session['user'] is None:
+            raise PermissionError("Please log in first")
+        if user_type and session['user_type'] != user_type:
+            raise PermissionError(f"Only {user_type.lower()}s can do that")
+        return session['user']
+    
+    def _product(self, farmer, product_id):
+        for product in farmer['products']:
+            if product['id'] == product_id:
+                return product
+        raise LookupError(f"Product #{product_id} not found")
+    
+    def _contract(self, session, contract_id):
+        user = self._user(session)
+        contract = self.service.get_contract(contract_id)
+        if contract is None or contract[session['user_type'].lower()] != user['username']:
+            raise LookupError(f"Contract #{contract_id} not found")
+        return contract
+        
+    # Users
+    
+    
+    def api_register(self, session, user_type, name, contact, location, username, password, interests=()):
+        return public_profile(self.service.register(
+            user_type, name, contact, location, username, password, interests=interests
+        ))
+    
+    def api_login(self, session, user_type, username, password):
+        user = self.service.login(user_type, username, password)
+        session['user'] = user
+        session['user_type'] = self.service.role(user_type) if user else None
+        return public_profile(user) if user else None
+    
+    def api_logout(self, session):
+        session['user'] = session['user_type'] = None
+    
+    def api_directory(self, session, user_type):
+        self._user(session)
+        return [public_profile(profile) for profile in self.service.directory(user_type)]
+    
+    def api_search_users(self, session, user_type, query, k=10):
+        self._user(session)
+        return [[score, public_profile(profile)] for score, profile in
+                self.service.search_users(user_type, query, k)]
+    
+    def api_match_counterparties(self, session, k=None):
+        user = self._user(session)
+        return [public_profile(profile) for profile in
+                self.service.match_counterparties(session['user_type'], user, k=k)]
+    
+    def api_locate(self, session, location):
+        self._user(session)
+        return self.service.locate(location)
+    
+    def api_nearby_counterparties(self, session, radius_km=None, k=None):
+        user = self._user(session)
+        return [[distance, public_profile(profile)] for distance, profile in
+                self.service.nearby_counterparties(session['user_type'], user, radius_km, k)]
+                
+    # Products
+    
+    def api_catalog(self, session):
+        self._user(session)
+        return self.service.catalog.items
+    
+    def api_complete_products(self, session, prefix, limit=20):
+        self._user(session)
+        return self.service.complete_products(prefix, limit)
+    
+    def api_catalog_item(self, session, name):
+        self._user(session)
+        return self.service.catalog_item(name)
+    
+    def api_add_product(self, session, name, quantity, price, harvest_date):
+        return self.service.add_product(self._user(session, "Farmer"), name, quantity, price, harvest_date)
+    
+    def api_remove_product(self, session, product_id):
+        farmer = self._user(session, "Farmer")
+        self.service.remove_product(farmer, self._product(farmer, product_id))
+    
+    def api_search_listings(self, session, product=None, location=None, min_price=None, max_price=None,
+                            min_quantity=None, harvest_from=None, harvest_to=None, limit=None):
+        self._user(session)
+        listings = self.service.search_listings(
+            product=product, location=location, min_price=min_price, max_price=max_price,
+            min_quantity=min_quantity, harvest_from=harvest_from, harvest_to=harvest_to, limit=limit
+        )
+        farmers = {farmer['username']: farmer for farmer, _ in listings}
+        return {
+            'farmers': [public_profile(farmer) for farmer in farmers.values()],
+            'listings': [[farmer['username'], product['id']] for farmer, product in listings]
+        }
+        
+    def api_price_stats(self, session, products):
+        self._user(session)
+        return self.service.price_stats(products)
+        
+    # Contracts
+    
+    def api_create_contract(self, session, counterparty, product_id, quantity, price, delivery_date, payment_terms):
+        user = self._user(session)
+        is_farmer = session['user_type'] == "Farmer"
+        other = self.service.find_user("Buyer" if is_farmer else "Farmer", counterparty)
+        if other is None:
+            raise LookupError(f"No such user: {counterparty}")
+        product = self._product(user if is_farmer else other, product_id)
+        return self.service.create_contract(session['user_type'], user, other, product,
+                                            quantity, price, delivery_date, payment_terms)
+    
+    def api_contracts_for(self, session):
+        user = self._user(session)
+        return self.service.contracts_for(session['user_type'], user['username'])
+    
+    def api_get_contract(self, session, contract_id):
+        try:
+            return self._contract(session, contract_id)
+        except LookupError:
+            return None
+    
+    def api_update_contract_status(self, session, contract_id, status, expected_version=None):
+        self._contract(session, contract_id)
+        if status not in self.ROLE_STATUSES[session['user_type']]:
+            raise PermissionError(f"{session['user_type']}s cannot mark contracts {status}")
+        return self.service.update_contract_status(contract_id, status, expected_version)
+    
+    def api_make_payment(self, session, contract_id, expected_version=None):
+        self._user(session, "Buyer")
+        self._contract(session, contract_id)
+        return self.service.make_payment(contract_id, expected_version)
+    
+    def _batch(self, session, contracts, apply):
+        owned = []
+        failed = []
+        for contract_id, expected_version in contracts:
+            try:
+                self._contract(session, contract_id)
+                owned.append((contract_id, expected_version))
+            except LookupError as e:
+                failed.append((contract_id, str(e)))
+        updated, rejected = apply(owned)
+        return {'updated': updated, 'failed': failed + rejected}
+    
+    def api_update_contract_statuses(self, session, contracts, status):
+        self._user(session)
+        if status not in self.ROLE_STATUSES[session['user_type']]:
+            raise PermissionError(f"{session['user_type']}s cannot mark contracts {status}")
+        return self._batch(session, contracts, lambda owned: self.service.update_contract_statuses(owned, status))
+    
+    def api_make_payments(self, session, contracts):
+        self._user(session, "Buyer")
+        return self._batch(session, contracts, self.service.make_payments)
+    
+    def api_contract_summary(self, session):
+        user = self._user(session)
+        return self.service.contract_summary(session['user_type'], user['username'])
+    
+    def api_upcoming_deliveries(self, session, days):
+        user = self._user(session)
+        return self.service.upcoming_deliveries(session['user_type'], user['username'], days)
+
+class RemoteService:
+    """FarmService stand-in that forwards calls to a FarmServer
+    
+    Keeps one keep-alive connection, shared between threads under a lock.
+    pipeline() writes a batch of requests before reading any response.
+    Profiles, products and contracts come back in the shapes FarmService
+    returns, so ContractFarmingPlatform can run against either. The
+    catalog is static, so login() fetches it once and completions are
+    answered locally.
+    """
+    storage = None
+    role = staticmethod(FarmService.role)
+    validate_contact = FarmService.validate_contact
+    validate_password = FarmService.validate_password
+    
+    def __init__(self, host="127.0.0.1", port=8765, timeout=30):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock = None
+        self._stream = None
+        self._next_id = 0
+        self._catalog = None
+    
+    def _connect(self):
+        self._sock = socket.create_connection(self.address, self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = self._sock.makefile('rwb')
+    
+    def _disconnect(self):
+        if self._sock is not None:
+            self._stream.close()
+            self._sock.close()
+        self._sock = self._stream = None
+    
+    def pipeline(self, calls):
+        """Send (method, params) calls in one batch and return their results in order
+        
+        Every response is read before the first error, if any, is raised.
+        """
+        with self._lock:
+            try:
+                if self._stream is None:
+                    self._connect()
+                for method, params in calls:
+                    self._next_id += 1
+                    request = {'id': self._next_id, 'method': method, 'params': params}
+                    self._stream.write(json.dumps(request).encode() + b"\n")
+                self._stream.flush()
+                responses = []
+                for _ in calls:
+                    line = self._stream.readline()
+                    if not line:
+                        raise ConnectionError("connection closed")
+                    responses.append(json.loads(line))
+            except (OSError, ValueError) as e:
+                self._disconnect()
+                raise ConnectionError(f"Lost connection to the FarmConnect server: {e}") from e
+                
+        errors = [self._error(response['error']) for response in responses if 'error' in response]
+        if errors:
+            raise errors[0]
+        return [response['result'] for response in responses]
+    
+    def call(self, method, **params):
+        """Make a single request and return its result"""
+        return self.pipeline([(method, params)])[0]
+    
+    @staticmethod
+    def _error(error):
+        for cls in ERRORS:
+            if cls.__name__ == error['type']:
+                return cls(error['message'])
+        return RuntimeError(error['message'])
+    
+    @staticmethod
+    def _profile(data):
+        if data and 'products' in data:
+            data['products'] = [Product(**product) for product in data['products']]
+        return data
+    
+    @staticmethod
+    def _contract(data):
+        return Contract(**data) if data else None
+        
+    # Users
+    
+    def register(self, user_type, name, contact, location, username, password, interests=(), credentials=None):
+        """Register on the server; credentials are always derived there"""
+        return self._profile(self.call('register', user_type=user_type, name=name, contact=contact,
+                                       location=location, username=username, password=password,
+                                       interests=list(interests)))
+    
+    def login(self, user_type, username, password):
+        """Sign this connection in, returning the profile or None"""
+        profile = self._profile(self.call('login', user_type=user_type, username=username, password=password))
+        if profile is not None and self._catalog is None:
+            # Login runs off the Tk thread, so the catalog is fetched here rather than on first keystroke
+            self._catalog = Catalog(self.call('catalog'))
+        return profile
+    
+    def directory(self, user_type):
+        return [self._profile(profile) for profile in self.call('directory', user_type=user_type)]
+    
+    def search_users(self, user_type, query, k=10, cancelled=None):
+        # The server answers a query in one step, so a stale one is simply discarded by the caller
+        return [(score, self._profile(profile)) for score, profile in
+                self.call('search_users', user_type=user_type, query=query, k=k)]
+    
+    def match_counterparties(self, user_type, user, k=None):
+        return [self._profile(profile) for profile in self.call('match_counterparties', k=k)]
+    
+    def locate(self, location):
+        point = self.call('locate', location=location)
+        return tuple(point) if point else None
+    
+    def nearby_counterparties(self, user_type, user, radius_km=None, k=None):
+        return [(distance, self._profile(profile)) for distance, profile in
+                self.call('nearby_counterparties', radius_km=radius_km, k=k)]
+        
+    # Products
+    
+    def complete_products(self, prefix, limit=20):
+        if self._catalog is None:
+            return self.call('complete_products', prefix=prefix, limit=limit)
+        return self._catalog.complete(prefix, limit)
+    
+    def catalog_item(self, name):
+        if self._catalog is None:
+            return self.call('catalog_item', name=name)
+        return self._catalog.find(name)
+    
+    def add_product(self, farmer, name, quantity, price, harvest_date):
+        product = Product(**self.call('add_product', name=name, quantity=quantity, price=price,
+                                      harvest_date=harvest_date))
+        farmer['products'].append(product)
+        return product
+    
+    def remove_product(self, farmer, product):
+        self.call('remove_product', product_id=product['id'])
+        farmer['products'].remove(product)
+    
+    def search_listings(self, **filters):
+        result = self.call('search_listings', **filters)
+        farmers = {farmer['username']: self._profile(farmer) for farmer in result['farmers']}
+        products = {(username, product['id']): product
+                    for username, farmer in farmers.items() for product in farmer['products']}
+        return [(farmers[username], products[username, product_id])
+                for username, product_id in result['listings']]
+    
+    def price_stats(self, products):
+        return self.call('price_stats', products=list(products))
+                
+    # Contracts
+    
+    def create_contract(self, user_type, user, counterparty, product, quantity, price,
+                        delivery_date, payment_terms):
+        return self._contract(self.call(
+            'create_contract', counterparty=counterparty['username'], product_id=product['id'],
+            quantity=quantity, price=price, delivery_date=delivery_date, payment_terms=payment_terms
+        ))
+    
+    def contracts_for(self, user_type, username):
+        return [self._contract(contract) for contract in self.call('contracts_for')]
+    
+    def upcoming_deliveries(self, user_type, username, days, today=None):
+        return [self._contract(contract) for contract in self.call('upcoming_deliveries', days=days)]
+    
+    def contract_summary(self, user_type, username):
+        return self.call('contract_summary')
+    
+    def get_contract(self, contract_id):
+        return self._contract(self.call('get_contract', contract_id=contract_id))
+    
+    def get_contracts(self, contract_ids):
+        """Fetch several contracts in one pipelined batch"""
+        results = self.pipeline([('get_contract', {'contract_id': contract_id}) for contract_id in contract_ids])
+        return [self._contract(contract) for contract in results]
+    
+    def update_contract_status(self, contract_id, status, expected_version=None):
+        return self._contract(self.call('update_contract_status', contract_id=contract_id, status=status,
+                                        expected_version=expected_version))
+    
+    def make_payment(self, contract_id, expected_version=None):
+        return self._contract(self.call('make_payment', contract_id=contract_id,
+                                        expected_version=expected_version))
+    
+    def _batch(self, result):
+        return ([self._contract(contract) for contract in result['updated']],
+                [tuple(failure) for failure in result['failed']])
+    
+    def update_contract_statuses(self, contracts, status):
+        return self._batch(self.call('update_contract_statuses', contracts=list(contracts), status=status))
+    
+    def make_payments(self, contracts):
+        return self._batch(self.call('make_payments', contracts=list(contracts)))
+                                        
+    # Persistence
+    
+    def flush(self):
+        """Nothing to do; the server commits its own writes"""
+    
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve FarmConnect data to several clients")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--db', default="farmconnect.db")
+    args = parser.parse_args()
+    
+    service = FarmService(args.db)
+    server = FarmServer(service, args.host, args.port)
+    print(f"FarmConnect server on {args.host}:{args.port}, data in {args.db}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown(wait=True)
+        service.close()
+
+if __name__ == "__main__":
+    main()